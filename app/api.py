@@ -1,21 +1,37 @@
 """FastAPI routers for public and admin functionality."""
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from datetime import date, datetime, timezone
+from typing import Literal
 
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+from .changes import ChangesExpiredError
+from .export import csv_chunks, ndjson_chunks
+from .feed import ChangeFeed
+from .freshness import OnDemandRefresher
+from .media import MediaFetchError
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_app_metrics
 from .models import (
     AdminOperationResponse,
+    CategoryReport,
     CategorySummary,
     Creative,
+    CreativeChange,
+    CreativeCluster,
+    MetaRateLimitStatus,
     Publisher,
     PublisherCreateRequest,
     PublisherUpdateRequest,
+    RefreshSchedulerStatus,
 )
 from .services import AdminService, CategoryService, CreativeService
 
 
 def get_category_service(request: Request) -> CategoryService:
-    return CategoryService(request.app.state.repository)
+    return CategoryService(request.app.state.repository, request.app.state.category_summary_cache)
 
 
 def get_admin_service(request: Request) -> AdminService:
@@ -23,16 +39,51 @@ def get_admin_service(request: Request) -> AdminService:
 
 
 def get_creative_service(request: Request) -> CreativeService:
-    return CreativeService(request.app.state.repository, request.app.state.meta_client)
+    return CreativeService(request.app.state.repository, request.app.state.meta_client, request.app.state.settings)
+
+
+def get_on_demand_refresher(request: Request) -> OnDemandRefresher:
+    return request.app.state.on_demand_refresher
 
 
 public_router = APIRouter(prefix="/api", tags=["public"])
 admin_router = APIRouter(prefix="/api/admin", tags=["admin"])
+metrics_router = APIRouter(tags=["metrics"])
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison function (RFC 9110, 13.1.2).
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def _parse_fields(fields: str | None) -> set[str] | None:
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - Creative.model_fields.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+        )
+    return requested
 
 
 @public_router.get("/categories", response_model=list[CategorySummary])
-async def list_categories(service: CategoryService = Depends(get_category_service)) -> list[CategorySummary]:
-    return service.list_category_summaries()
+async def list_categories(
+    request: Request,
+    service: CategoryService = Depends(get_category_service),
+) -> Response:
+    body, etag = service.category_summaries_payload()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @public_router.get(
@@ -47,15 +98,230 @@ async def list_publishers_for_category(
     return repository.list_publishers_by_category(category_id)
 
 
+@public_router.get("/categories/{category_id}/report", response_model=CategoryReport)
+async def category_report(
+    category_id: str,
+    start: date | None = Query(None, description="First day of the report (UTC); defaults to 29 days before end."),
+    end: date | None = Query(None, description="Last day of the report (UTC); defaults to today."),
+    publisher_id: str | None = Query(None, description="Only this publisher's creatives."),
+    service: CategoryService = Depends(get_category_service),
+) -> CategoryReport:
+    """Daily active, new and ended creatives, platform mix and spend of a category's publishers."""
+
+    try:
+        return service.get_report(category_id, start=start, end=end, publisher_id=publisher_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+
+
 @public_router.get(
     "/categories/{category_id}/ads",
-    response_model=list[Creative],
+    response_model=list[Creative] | list[CreativeCluster],
 )
 async def list_ads_for_category(
     category_id: str,
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of creatives to return."),
+    cursor: str | None = Query(None, description="Opaque cursor from the previous page's X-Next-Cursor header."),
+    fields: str | None = Query(None, description="Comma separated creative fields to include."),
+    platform: str | None = Query(None, description="Only creatives delivered on this platform."),
+    publisher_id: str | None = Query(None, description="Only creatives of this publisher."),
+    start_time: datetime | None = Query(None, description="Only creatives active at or after this time."),
+    end_time: datetime | None = Query(None, description="Only creatives active at or before this time."),
+    open_slots: bool = Query(False, description="Only creatives that are still running."),
+    fresh: bool = Query(False, description="Refresh stale publishers from Meta before answering."),
+    group_by: Literal["cluster"] | None = Query(
+        None,
+        description="`cluster` returns one entry per cluster of near-duplicate creatives instead of every creative.",
+    ),
     service: CreativeService = Depends(get_creative_service),
-) -> list[Creative]:
-    return service.get_cached_creatives_for_category(category_id)
+    refresher: OnDemandRefresher = Depends(get_on_demand_refresher),
+) -> Response:
+    include = _parse_fields(fields)
+    if fresh:
+        publishers = request.app.state.repository.list_publishers_by_category(category_id)
+        await refresher.ensure_fresh(
+            publisher.id for publisher in publishers if publisher_id is None or publisher.id == publisher_id
+        )
+    # Full creatives are served from cached encodings; only projections go
+    # through model serialization.
+    if group_by == "cluster":
+        get_page = service.get_cluster_page
+    else:
+        get_page = service.get_creative_page_json if include is None else service.get_creative_page
+    try:
+        page, next_cursor = get_page(
+            category_id,
+            limit=limit,
+            cursor=cursor,
+            publisher_id=publisher_id,
+            platform=platform,
+            start_time=start_time,
+            end_time=end_time,
+            open_slots=open_slots,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+
+    headers = {}
+    if next_cursor is not None:
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        headers = {"X-Next-Cursor": next_cursor, "Link": f'<{next_url}>; rel="next"'}
+    if group_by == "cluster":
+        projection = {"cluster_id": True, "size": True, "creative": include if include is not None else True}
+        content = [cluster.model_dump(mode="json", include=projection) for cluster in page]
+        return JSONResponse(content=content, headers=headers)
+    if include is not None:
+        content = [creative.model_dump(mode="json", include=include) for creative in page]
+        return JSONResponse(content=content, headers=headers)
+    return Response(content=page, media_type="application/json", headers=headers)
+
+
+@public_router.get(
+    "/categories/{category_id}/ads/search",
+    response_model=list[Creative],
+)
+async def search_ads_for_category(
+    category_id: str,
+    q: str = Query(..., min_length=1, description="Search terms; each term also matches as a prefix."),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of creatives to return."),
+    offset: int = Query(0, ge=0, le=10_000, description="Number of ranked results to skip."),
+    service: CreativeService = Depends(get_creative_service),
+) -> Response:
+    body, total = service.search_creatives_json(category_id, q, limit=limit, offset=offset)
+    return Response(content=body, media_type="application/json", headers={"X-Total-Count": str(total)})
+
+
+@public_router.get(
+    "/categories/{category_id}/ads/changes",
+    response_model=list[CreativeChange],
+    responses={410: {"description": "The change log no longer reaches back to `since`; reload the ads instead."}},
+)
+async def list_ad_changes_for_category(
+    category_id: str,
+    since: int | None = Query(
+        None,
+        ge=0,
+        description="Log position from the previous X-Change-Seq header; omit to only get the current position.",
+    ),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of changes to return."),
+    service: CreativeService = Depends(get_creative_service),
+) -> Response:
+    """Inserted, updated and ended creatives of the category, in log order."""
+
+    try:
+        changes, position = service.get_changes(category_id, since=since, limit=limit)
+    except ChangesExpiredError as exc:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail=str(exc)) from exc
+    content = [change.model_dump(mode="json") for change in changes]
+    return JSONResponse(content=content, headers={"X-Change-Seq": str(position)})
+
+
+@public_router.get(
+    "/categories/{category_id}/ads/stream",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"text/event-stream": {}},
+            "description": (
+                "Server-Sent Events named after the change kind, with a CreativeChange as data and its "
+                "position as ID. A `reset` event means changes were missed: reload the ads and reconnect."
+            ),
+        }
+    },
+)
+async def stream_ad_changes_for_category(
+    category_id: str,
+    request: Request,
+    since: int | None = Query(None, ge=0, description="Replay changes after this log position first."),
+    last_event_id: int | None = Header(None, ge=0, description="Sent by EventSource when it reconnects."),
+) -> StreamingResponse:
+    feed: ChangeFeed = request.app.state.change_feed
+    position = since if since is not None else last_event_id
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(feed.stream(category_id, position), media_type="text/event-stream", headers=headers)
+
+
+@public_router.get(
+    "/creatives/{creative_id}/snapshot",
+    response_class=RedirectResponse,
+    status_code=status.HTTP_302_FOUND,
+)
+async def creative_snapshot(creative_id: str, request: Request) -> RedirectResponse:
+    """Redirect to the locally cached copy of the creative's snapshot, fetching it first if needed."""
+
+    creative = request.app.state.repository.get_creative(creative_id)
+    if creative is None or not creative.snapshot_url:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Snapshot not found")
+    try:
+        digest = await request.app.state.media_cache.fetch(creative.snapshot_url)
+    except MediaFetchError as exc:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(exc)) from exc
+    max_age = request.app.state.settings.media_max_age_seconds
+    return RedirectResponse(
+        str(request.url_for("cached_media", digest=digest)),
+        status_code=status.HTTP_302_FOUND,
+        headers={"Cache-Control": f"public, max-age={max_age}"},
+    )
+
+
+@public_router.get("/media/{digest}", name="cached_media", response_class=FileResponse)
+async def cached_media(digest: str, request: Request) -> Response:
+    """Serve cached media; the URL names the content, so it never changes.
+
+    The content type comes from the upstream host, so browsers are told not
+    to sniff it and to sandbox the blob should it render as a document.
+    """
+
+    media_cache = request.app.state.media_cache
+    etag = f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "X-Content-Type-Options": "nosniff",
+        "Content-Security-Policy": "sandbox",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        if media_cache.get(digest) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media not found")
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # Pinned so eviction cannot unlink the file before it has been sent.
+    found = media_cache.pin(digest)
+    if found is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media not found")
+    path, content_type = found
+    return FileResponse(
+        path, media_type=content_type, headers=headers, background=BackgroundTask(media_cache.unpin, digest)
+    )
+
+
+@public_router.get(
+    "/categories/{category_id}/ads/export",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}, "text/csv": {}},
+            "description": "Creatives of the category, one per line, in creative ID order.",
+        }
+    },
+)
+async def export_ads_for_category(
+    category_id: str,
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Export encoding."),
+    since: datetime | None = Query(None, description="Only creatives inserted or changed after this time."),
+    service: CreativeService = Depends(get_creative_service),
+) -> StreamingResponse:
+    started_at = datetime.now(timezone.utc)
+    batches = service.iter_creatives_for_category(category_id, since=since)
+    # Clients pass the watermark back as ``since`` for their next incremental pull.
+    headers = {"X-Export-Watermark": started_at.isoformat()}
+    # Starlette iterates plain iterators in its threadpool, so encoding a
+    # large export does not hold up the event loop. Repository reads are safe
+    # from any thread.
+    if format == "csv":
+        headers["Content-Disposition"] = f'attachment; filename="{category_id}.csv"'
+        return StreamingResponse(csv_chunks(batches), media_type="text/csv", headers=headers)
+    return StreamingResponse(ndjson_chunks(batches), media_type="application/x-ndjson", headers=headers)
 
 
 @admin_router.post("/publishers", response_model=AdminOperationResponse, status_code=status.HTTP_201_CREATED)
@@ -99,3 +365,18 @@ async def archive_publisher(
         return service.archive_publisher(publisher_id)
     except ValueError as exc:  # pragma: no cover - defensive guard
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
+
+
+@admin_router.get("/refresh/status", response_model=RefreshSchedulerStatus)
+async def refresh_status(request: Request) -> RefreshSchedulerStatus:
+    return request.app.state.refresh_scheduler.status()
+
+
+@admin_router.get("/meta/rate-limit", response_model=MetaRateLimitStatus)
+async def meta_rate_limit_status(request: Request) -> MetaRateLimitStatus:
+    return request.app.state.meta_client.rate_limit_status()
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(render_app_metrics(request.app.state), media_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,112 @@
+"""Bounded per-category logs of creative changes."""
+from __future__ import annotations
+
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from .models import CreativeChange
+from .records import CreativeRecord
+
+# Changes kept per category; older ones can no longer be caught up on.
+CHANGE_LOG_CAPACITY = 10_000
+
+# (seq, kind, record as written)
+LogEntry = Tuple[int, str, CreativeRecord]
+
+
+class ChangesExpiredError(LookupError):
+    """Raised when changes after the requested position were already dropped."""
+
+
+class ChangeLog:
+    """Ring buffers of recent creative changes, one per category.
+
+    Every change gets the next sequence number of the log, so positions are
+    comparable across categories and a client only has to remember the last
+    one it saw. A change is appended to the log of each category its
+    publisher belonged to when it was written. Each buffer keeps the last
+    ``capacity`` changes and remembers the newest position it dropped, so a
+    reader resuming from before it is told instead of silently missing
+    changes. Entries hold the stored records, which are immutable, so the
+    log adds no copies of creatives. Positions ahead of the log come from an
+    earlier process and are treated the same way.
+    """
+
+    def __init__(self, capacity: int = CHANGE_LOG_CAPACITY) -> None:
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._seq = 0
+        # Positions before this one were numbered by an earlier log, see resume().
+        self._floor = 0
+        self._logs: Dict[str, Deque[LogEntry]] = {}
+        self._dropped: Dict[str, int] = {}
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def resume(self, seq: int) -> None:
+        """Continue the numbering of an earlier log that reached position ``seq``.
+
+        Its changes are not carried over: readers resuming from before
+        ``seq`` get :class:`ChangesExpiredError`.
+        """
+
+        with self._lock:
+            if seq > self._seq:
+                self._seq = self._floor = seq
+
+    def extend(self, changes: Iterable[Tuple[str, CreativeRecord, Iterable[str]]]) -> None:
+        """Append ``(kind, record, category_ids)`` changes in order."""
+
+        with self._lock:
+            for kind, record, category_ids in changes:
+                self._seq += 1
+                for category_id in category_ids:
+                    log = self._logs.get(category_id)
+                    if log is None:
+                        log = self._logs[category_id] = deque(maxlen=self.capacity)
+                    if len(log) == self.capacity:
+                        self._dropped[category_id] = log[0][0]
+                    log.append((self._seq, kind, record))
+
+    def since(self, category_id: str, after: Optional[int], limit: int) -> Tuple[List[CreativeChange], int]:
+        """Return up to ``limit`` changes after ``after`` and the position to resume from.
+
+        Without ``after`` no changes are returned, only the current position.
+        Raises :class:`ChangesExpiredError` when changes after ``after`` were
+        dropped, or when ``after`` is ahead of the log.
+        """
+
+        with self._lock:
+            latest = self._seq
+            if after is None:
+                return [], latest
+            if after > latest:
+                raise ChangesExpiredError(f"Position {after} is ahead of the change log ({latest})")
+            if after < max(self._dropped.get(category_id, 0), self._floor):
+                raise ChangesExpiredError(f"Changes after {after} are no longer available")
+            log = self._logs.get(category_id, ())
+            # Sequence numbers increase along the buffer; skip what was seen.
+            low, high = 0, len(log)
+            while low < high:
+                middle = (low + high) // 2
+                if log[middle][0] <= after:
+                    low = middle + 1
+                else:
+                    high = middle
+            entries = [log[index] for index in range(low, min(low + limit, len(log)))]
+        changes = [
+            CreativeChange.model_construct(
+                seq=seq,
+                kind=kind,
+                changed_at=datetime.fromtimestamp(record.updated_at, timezone.utc),
+                creative=record.to_model(),
+            )
+            for seq, kind, record in entries
+        ]
+        if len(changes) == limit:
+            return changes, changes[-1].seq
+        return changes, max(after, latest)
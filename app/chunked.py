@@ -0,0 +1,159 @@
+"""Sorted maps stored in bounded chunks, for cheap copy-on-write."""
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from typing import Generic, Iterator, List, Optional, Set, Tuple, TypeVar
+
+V = TypeVar("V")
+
+# A chunk is split in two once it holds more keys than this.
+MAX_CHUNK_SIZE = 512
+
+_MISSING = object()
+
+
+class ChunkedMap(Generic[V]):
+    """Map from string keys to values, iterated in key order.
+
+    Keys and values live in parallel sorted chunks of at most
+    ``MAX_CHUNK_SIZE`` entries, found by bisecting the first key of every
+    chunk. :meth:`copy` copies only that chunk directory, so a copy shares
+    every chunk with the original. :meth:`set` and :meth:`discard` copy the
+    chunk they change the first time, recording it in the ``owned`` set of
+    object IDs passed by the caller (the same bookkeeping
+    :class:`~app.repository._SnapshotWriter` uses for its containers). A
+    change to a copy therefore costs O(size / MAX_CHUNK_SIZE + MAX_CHUNK_SIZE)
+    rather than O(size). Only copies the caller owns may be changed.
+    """
+
+    __slots__ = ("_firsts", "_keys", "_values", "_size")
+
+    def __init__(self) -> None:
+        self._firsts: List[str] = []
+        self._keys: List[List[str]] = []
+        self._values: List[List[V]] = []
+        self._size = 0
+
+    def copy(self) -> "ChunkedMap[V]":
+        other: ChunkedMap[V] = ChunkedMap()
+        other._firsts = list(self._firsts)
+        other._keys = list(self._keys)
+        other._values = list(self._values)
+        other._size = self._size
+        return other
+
+    @classmethod
+    def from_sorted(cls, keys: List[str], values: List[V]) -> "ChunkedMap[V]":
+        """Build a map from parallel lists, ``keys`` sorted and unique.
+
+        Chunks are filled to half of ``MAX_CHUNK_SIZE``, the size a split
+        leaves, so the first inserts do not split them again.
+        """
+
+        other: ChunkedMap[V] = cls()
+        step = MAX_CHUNK_SIZE // 2
+        other._keys = [keys[start : start + step] for start in range(0, len(keys), step)]
+        other._values = [values[start : start + step] for start in range(0, len(values), step)]
+        other._firsts = [chunk[0] for chunk in other._keys]
+        other._size = len(keys)
+        return other
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _find(self, key: str) -> Tuple[int, int]:
+        """Return ``(chunk, position)`` of ``key``, or ``(-1, -1)`` when absent."""
+
+        chunk = bisect_right(self._firsts, key) - 1
+        if chunk >= 0:
+            keys = self._keys[chunk]
+            position = bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                return chunk, position
+        return -1, -1
+
+    def get(self, key: str, default: Optional[V] = None) -> Optional[V]:
+        chunk, position = self._find(key)
+        return self._values[chunk][position] if chunk >= 0 else default
+
+    def __getitem__(self, key: str) -> V:
+        value = self.get(key, _MISSING)  # type: ignore[arg-type]
+        if value is _MISSING:
+            raise KeyError(key)
+        return value  # type: ignore[return-value]
+
+    def __contains__(self, key: str) -> bool:
+        return self._find(key)[0] >= 0
+
+    def keys(self) -> Iterator[str]:
+        for keys in self._keys:
+            yield from keys
+
+    def values(self) -> Iterator[V]:
+        for values in self._values:
+            yield from values
+
+    def items(self, after: Optional[str] = None) -> Iterator[Tuple[str, V]]:
+        """Yield ``(key, value)`` pairs in key order, starting past ``after``."""
+
+        chunk, position = 0, 0
+        if after is not None and self._keys:
+            chunk = max(bisect_right(self._firsts, after) - 1, 0)
+            position = bisect_right(self._keys[chunk], after)
+        for index in range(chunk, len(self._keys)):
+            keys, values = self._keys[index], self._values[index]
+            for offset in range(position, len(keys)):
+                yield keys[offset], values[offset]
+            position = 0
+
+    def _own_chunk(self, chunk: int, owned: Set[int]) -> Tuple[List[str], List[V]]:
+        keys = self._keys[chunk]
+        if id(keys) not in owned:
+            keys = self._keys[chunk] = list(keys)
+            self._values[chunk] = list(self._values[chunk])
+            owned.add(id(keys))
+        return keys, self._values[chunk]
+
+    def set(self, key: str, value: V, owned: Set[int]) -> None:
+        if not self._keys:
+            keys = [key]
+            self._firsts.append(key)
+            self._keys.append(keys)
+            self._values.append([value])
+            self._size = 1
+            owned.add(id(keys))
+            return
+        chunk = max(bisect_right(self._firsts, key) - 1, 0)
+        keys, values = self._own_chunk(chunk, owned)
+        position = bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            values[position] = value
+            return
+        keys.insert(position, key)
+        values.insert(position, value)
+        self._size += 1
+        if position == 0:
+            self._firsts[chunk] = key
+        if len(keys) > MAX_CHUNK_SIZE:
+            half = len(keys) // 2
+            tail = keys[half:]
+            self._keys.insert(chunk + 1, tail)
+            self._values.insert(chunk + 1, values[half:])
+            self._firsts.insert(chunk + 1, tail[0])
+            del keys[half:], values[half:]
+            owned.add(id(tail))
+
+    def discard(self, key: str, owned: Set[int]) -> bool:
+        """Remove ``key``; return whether it was present."""
+
+        chunk, position = self._find(key)
+        if chunk < 0:
+            return False
+        keys, values = self._own_chunk(chunk, owned)
+        del keys[position], values[position]
+        self._size -= 1
+        if not keys:
+            del self._firsts[chunk], self._keys[chunk], self._values[chunk]
+        elif position == 0:
+            self._firsts[chunk] = keys[0]
+        return True
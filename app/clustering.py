@@ -0,0 +1,316 @@
+"""Near-duplicate clustering of creative copy with MinHash and LSH."""
+from __future__ import annotations
+
+import operator
+import random
+import struct
+import zlib
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from .search import tokenize
+
+# 32 MinHash values split into 16 bands of 2: two creatives whose word-bigram
+# sets have Jaccard similarity s share at least one band with probability
+# 1 - (1 - s**2)**16, i.e. ~0.5 at s = 0.2 and > 0.9 from s = 0.4. Swapping
+# one word of a 20-word ad (a promo code, an amount) keeps s around 0.8.
+NUM_HASHES = 32
+BANDS = 16
+ROWS_PER_BAND = NUM_HASHES // BANDS
+SHINGLE_SIZE = 2
+# Candidates sharing a band join a cluster only above this estimated Jaccard
+# similarity (fraction of equal MinHash values).
+SIMILARITY_THRESHOLD = 0.4
+# A bucket holds at most one creative per cluster and stops growing past this
+# many clusters, which bounds the candidates compared per creative.
+MAX_BUCKET_SIZE = 16
+# Bumped whenever minhash_signature or band_keys change, so stores holding
+# signatures know to recompute them.
+SIGNATURE_VERSION = 2
+
+_HASH_BYTES = 4
+_LOW_BITS = (1 << 32) - 1
+# The k-th hash function of a shingle is ((a_k * crc32(shingle)) mod 2**32)
+# XOR m_k, for odd multipliers a_k and masks m_k fixed by seed. All NUM_HASHES
+# are computed at once on one big integer holding a 64-bit lane per function,
+# the top half of each lane spare for the products and the comparison borrow.
+_LANE_BITS = 64
+_LANES = sum(1 << (_LANE_BITS * index) for index in range(NUM_HASHES))
+_LANE_LOW_BITS = _LANES * _LOW_BITS
+_LANE_GUARDS = _LANES << 32
+_MULTIPLIERS = sum(
+    (random.Random(7 + index).getrandbits(32) | 1) << (_LANE_BITS * index) for index in range(NUM_HASHES)
+)
+_MASKS = sum(random.Random(20240501 + index).getrandbits(32) << (_LANE_BITS * index) for index in range(NUM_HASHES))
+# Over a whole signature read as one integer: the top bit, and the 31 bits
+# below it, of every hash value.
+_VALUE_TOP_BITS = sum(1 << (32 * index + 31) for index in range(NUM_HASHES))
+_VALUE_LOW_BITS = (_VALUE_TOP_BITS >> 31) * ((1 << 31) - 1)
+# A band is ROWS_PER_BAND hash values, i.e. one little-endian 64-bit word of
+# the signature; XOR with a per-band salt keeps equal words of different
+# bands in different buckets.
+_BANDS = struct.Struct(f"<{BANDS}q")
+_BAND_SALTS = [random.Random(1_000_003 + band).getrandbits(64) - (1 << 63) for band in range(BANDS)]
+
+Signature = bytes
+Member = Tuple[str, str]  # (creative_id, publisher_id)
+
+
+def minhash_signature(fields: Iterable[Optional[str]]) -> Optional[Signature]:
+    """MinHash signature of the word shingles of ``fields``.
+
+    Returns ``None`` for copy without any token; such creatives are never
+    clustered. Signatures are deterministic across processes, so they can be
+    persisted; changing the hash functions invalidates persisted ones (see
+    ``SIGNATURE_VERSION``).
+    """
+
+    tokens = [token for field in fields for token in tokenize(field)]
+    if not tokens:
+        return None
+    if len(tokens) < SHINGLE_SIZE:
+        shingles = {" ".join(tokens)}
+    else:
+        shingles = {" ".join(tokens[start : start + SHINGLE_SIZE]) for start in range(len(tokens) - SHINGLE_SIZE + 1)}
+    best = _LANE_LOW_BITS
+    for shingle in shingles:
+        values = (zlib.crc32(shingle.encode()) * _MULTIPLIERS & _LANE_LOW_BITS) ^ _MASKS
+        # The guard bit of a lane survives the subtraction iff best >= value.
+        smaller = ((((best | _LANE_GUARDS) - values) & _LANE_GUARDS) >> 32) * _LOW_BITS
+        best ^= (best ^ values) & smaller
+    # Keep the low _HASH_BYTES of every little-endian lane.
+    return memoryview(best.to_bytes(NUM_HASHES * _LANE_BITS // 8, "little")).cast("I")[::2].tobytes()
+
+
+def band_keys(signature: Signature) -> List[int]:
+    """Stable signed 64-bit LSH bucket keys, one per band."""
+
+    return list(map(operator.xor, _BANDS.unpack(signature), _BAND_SALTS))
+
+
+def similarity(left: Signature, right: Signature) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+
+    differ = int.from_bytes(left, "little") ^ int.from_bytes(right, "little")
+    # The top bit of a 32-bit value ends up set iff any of its bits differ.
+    unequal = (((differ & _VALUE_LOW_BITS) + _VALUE_LOW_BITS) | differ) & _VALUE_TOP_BITS
+    return (NUM_HASHES - unequal.bit_count()) / NUM_HASHES
+
+
+def best_cluster(signature: Signature, candidates: Iterable[Tuple[str, Signature]]) -> Optional[str]:
+    """Cluster of the most similar candidate above the threshold, if any."""
+
+    best: Optional[str] = None
+    best_score = SIMILARITY_THRESHOLD
+    for cluster_id, candidate in candidates:
+        score = similarity(signature, candidate)
+        if score >= best_score:
+            best, best_score = cluster_id, score
+    return best
+
+
+def new_cluster_id(creative_id: str, in_use: Callable[[str], bool]) -> str:
+    """Label a new cluster after the creative founding it."""
+
+    cluster_id, suffix = creative_id, 1
+    while in_use(cluster_id):
+        cluster_id, suffix = f"{creative_id}.{suffix}", suffix + 1
+    return cluster_id
+
+
+class ClusterSnapshot:
+    """Published, read-only cluster membership of a :class:`ClusterIndex`.
+
+    Members are ``(creative_id, publisher_id)`` pairs sorted by creative ID.
+    The map is split into fixed shards so a write batch only copies the
+    shards of the clusters it touches.
+    """
+
+    SHARDS = 256
+
+    __slots__ = ("shards",)
+
+    def __init__(self, shards: Optional[List[Dict[str, List[Member]]]] = None) -> None:
+        self.shards = shards if shards is not None else [{} for _ in range(self.SHARDS)]
+
+    @classmethod
+    def shard_of(cls, cluster_id: str) -> int:
+        return hash(cluster_id) % cls.SHARDS
+
+    def members(self, cluster_id: str) -> List[Member]:
+        return self.shards[self.shard_of(cluster_id)].get(cluster_id, [])
+
+    def __contains__(self, cluster_id: str) -> bool:
+        return cluster_id in self.shards[self.shard_of(cluster_id)]
+
+
+class ClusterIndex:
+    """Incrementally maintained MinHash/LSH clusters.
+
+    :meth:`add` assigns a document to the cluster of its most similar
+    neighbour among the documents sharing an LSH band with it, or founds a
+    new cluster. Nothing is compared all-pairs: each add looks at no more
+    than ``BANDS * MAX_BUCKET_SIZE`` candidates. A bucket keeps one document
+    per cluster, so variants of the same copy add few bucket entries.
+    Clusters are never merged or split after the fact, so a document keeps
+    its cluster until its own copy changes.
+
+    Like :class:`~app.search.InvertedIndex`, membership changes are staged
+    copy-on-write and published by :meth:`commit`; writers must be
+    serialized by the caller.
+    """
+
+    def __init__(self) -> None:
+        # Writer-only state.
+        self._signatures: Dict[str, Signature] = {}
+        self._cluster_of: Dict[str, str] = {}
+        self._buckets: Dict[int, Union[str, List[str]]] = {}
+        self.snapshot = ClusterSnapshot()
+        self._reset_staging()
+
+    def _reset_staging(self) -> None:
+        self._shards = self.snapshot.shards
+        self._owned: Set[int] = set()
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "ClusterIndex":
+        """Index over the containers of a :meth:`state` saved earlier; takes ownership of them."""
+
+        index = cls()
+        index._signatures = state["signatures"]
+        index._cluster_of = state["cluster_of"]
+        index._buckets = state["buckets"]
+        # Shards follow the str hash of this process, so members are placed again.
+        shards = index.snapshot.shards
+        for cluster_id, members in state["members"].items():
+            shards[ClusterSnapshot.shard_of(cluster_id)][cluster_id] = members
+        index._reset_staging()
+        return index
+
+    def state(self) -> Dict[str, Any]:
+        """Committed contents as plain containers, for :mod:`app.snapshot`.
+
+        Call between writes. Published members are shared; the writer-only
+        maps and buckets are copied, so the result stays valid after later
+        writes.
+        """
+
+        return {
+            "signatures": dict(self._signatures),
+            "cluster_of": dict(self._cluster_of),
+            "buckets": {
+                key: bucket if isinstance(bucket, str) else list(bucket) for key, bucket in self._buckets.items()
+            },
+            "members": {cluster_id: members for shard in self.snapshot.shards for cluster_id, members in shard.items()},
+        }
+
+    def __len__(self) -> int:
+        return len(self._cluster_of)
+
+    def cluster_of(self, doc_id: str) -> Optional[str]:
+        return self._cluster_of.get(doc_id)
+
+    def signature(self, doc_id: str) -> Optional[Signature]:
+        return self._signatures.get(doc_id)
+
+    def commit(self) -> ClusterSnapshot:
+        """Publish staged changes and return the new snapshot."""
+
+        if self._owned:
+            self.snapshot = ClusterSnapshot(self._shards)
+        self._reset_staging()
+        return self.snapshot
+
+    def _members(self, cluster_id: str) -> List[Member]:
+        if id(self._shards) not in self._owned:
+            self._shards = list(self._shards)
+            self._owned.add(id(self._shards))
+        index = ClusterSnapshot.shard_of(cluster_id)
+        shard = self._shards[index]
+        if id(shard) not in self._owned:
+            shard = self._shards[index] = dict(shard)
+            self._owned.add(id(shard))
+        members = shard.get(cluster_id)
+        if members is None or id(members) not in self._owned:
+            members = shard[cluster_id] = list(members or ())
+            self._owned.add(id(members))
+        return members
+
+    def _in_use(self, cluster_id: str) -> bool:
+        return cluster_id in self._shards[ClusterSnapshot.shard_of(cluster_id)]
+
+    def add(self, doc_id: str, partition: str, fields: Iterable[Optional[str]]) -> Optional[str]:
+        """Stage ``doc_id`` with the copy in ``fields`` and return its cluster."""
+
+        return self.add_signature(doc_id, partition, minhash_signature(fields))
+
+    def add_signature(self, doc_id: str, partition: str, signature: Optional[Signature]) -> Optional[str]:
+        """Like :meth:`add`, with the copy's :func:`minhash_signature` computed by the caller."""
+
+        if signature is not None and self._signatures.get(doc_id) == signature:
+            cluster_id = self._cluster_of[doc_id]
+            members = self._members(cluster_id)
+            position = _position(members, doc_id)
+            if members[position][1] != partition:
+                members[position] = (doc_id, partition)
+            return cluster_id
+        self.remove(doc_id)
+        if signature is None:
+            return None
+
+        keys = band_keys(signature)
+        candidates: Dict[str, None] = {}
+        for key in keys:
+            bucket = self._buckets.get(key)
+            if isinstance(bucket, str):
+                candidates[bucket] = None
+            elif bucket is not None:
+                candidates.update(dict.fromkeys(bucket))
+        cluster_id = best_cluster(
+            signature, ((self._cluster_of[other], self._signatures[other]) for other in candidates)
+        ) or new_cluster_id(doc_id, self._in_use)
+        self._insert(doc_id, partition, signature, keys, cluster_id)
+        return cluster_id
+
+    def _insert(self, doc_id: str, partition: str, signature: Signature, keys: List[int], cluster_id: str) -> None:
+        self._signatures[doc_id] = signature
+        self._cluster_of[doc_id] = cluster_id
+        for key in keys:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._buckets[key] = doc_id
+            elif isinstance(bucket, str):
+                if self._cluster_of[bucket] != cluster_id:
+                    self._buckets[key] = [bucket, doc_id]
+            elif len(bucket) < MAX_BUCKET_SIZE and all(self._cluster_of[other] != cluster_id for other in bucket):
+                bucket.append(doc_id)
+        members = self._members(cluster_id)
+        members.insert(_position(members, doc_id), (doc_id, partition))
+
+    def remove(self, doc_id: str) -> None:
+        signature = self._signatures.pop(doc_id, None)
+        if signature is None:
+            return
+        cluster_id = self._cluster_of.pop(doc_id)
+        for key in band_keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket == doc_id:
+                del self._buckets[key]
+            elif isinstance(bucket, list) and doc_id in bucket:
+                bucket.remove(doc_id)
+                if len(bucket) == 1:
+                    self._buckets[key] = bucket[0]
+        members = self._members(cluster_id)
+        del members[_position(members, doc_id)]
+        if not members:
+            del self._shards[ClusterSnapshot.shard_of(cluster_id)][cluster_id]
+
+
+def _position(members: List[Member], doc_id: str) -> int:
+    low, high = 0, len(members)
+    while low < high:
+        middle = (low + high) // 2
+        if members[middle][0] < doc_id:
+            low = middle + 1
+        else:
+            high = middle
+    return low
@@ -1,8 +1,10 @@
 """Application configuration utilities."""
 from __future__ import annotations
 
+import json
+import os
 from functools import lru_cache
-from typing import List
+from typing import List, Literal, get_origin
 
 from pydantic import BaseModel, Field
 
@@ -10,6 +12,21 @@ from pydantic import BaseModel, Field
 class Settings(BaseModel):
     """Runtime settings loaded from environment variables."""
 
+    repository_backend: Literal["memory", "sqlite"] = Field(
+        default="memory",
+        description="Storage backend: process-local memory or a SQLite file shared by all workers.",
+    )
+    sqlite_path: str = Field(
+        default="data/livefbads.sqlite3",
+        description="Database file used when repository_backend is 'sqlite'.",
+    )
+    snapshot_path: str | None = Field(
+        default=None,
+        description=(
+            "Binary snapshot of the in-memory repository: loaded instead of the seed data when present "
+            "and rewritten on shutdown."
+        ),
+    )
     meta_access_token: str | None = Field(
         default=None,
         description="Meta Graph API access token used for authenticated requests.",
@@ -22,6 +39,165 @@ class Settings(BaseModel):
         default="https://graph.facebook.com",
         description="Base URL for Meta Graph API requests.",
     )
+    meta_timeout_seconds: float = Field(
+        default=10.0,
+        description="Timeout applied to each Meta Graph API request.",
+    )
+    meta_batch_size: int = Field(
+        default=10,
+        description="Number of publisher page IDs sent per Ad Library query (the API accepts at most 10).",
+    )
+    meta_max_concurrency: int = Field(
+        default=8,
+        description="Maximum number of in-flight Ad Library requests, also used as the connection pool size.",
+    )
+    meta_countries: List[str] = Field(
+        default_factory=lambda: ["US"],
+        description="ad_reached_countries swept by every refresh, one query per country.",
+    )
+    meta_ad_types: List[str] = Field(
+        default_factory=lambda: ["POLITICAL_AND_ISSUE_ADS"],
+        description="ad_type values swept by every refresh, one query per ad type.",
+    )
+    meta_page_size: int = Field(
+        default=500,
+        description="Number of ads requested per Ad Library page.",
+    )
+    meta_rate_limit_per_second: float = Field(
+        default=5.0,
+        description="Sustained Ad Library request rate while reported API usage is low.",
+    )
+    meta_rate_limit_burst: float = Field(
+        default=10.0,
+        description="Number of Ad Library requests that may be sent back to back.",
+    )
+    meta_usage_slowdown_percent: float = Field(
+        default=50.0,
+        description="X-App-Usage / X-Business-Use-Case-Usage percentage above which the request rate is reduced.",
+    )
+    meta_rate_recovery_seconds: float = Field(
+        default=60.0,
+        description="Time a throttled request rate takes to climb back to the full rate while requests succeed.",
+    )
+    meta_max_retries: int = Field(
+        default=4,
+        description="Retries of a throttled, server-failed or timed-out Ad Library request.",
+    )
+    meta_retry_backoff_base_seconds: float = Field(
+        default=1.0,
+        description="Upper bound of the jittered delay before the first retry; doubled on every attempt.",
+    )
+    meta_retry_backoff_max_seconds: float = Field(
+        default=60.0,
+        description="Upper bound for the retry delay.",
+    )
+    meta_retry_budget_ratio: float = Field(
+        default=0.1,
+        description="Retries allowed per Ad Library request, shared across all callers.",
+    )
+    meta_retry_budget_reserve: float = Field(
+        default=10.0,
+        description="Retries available before any request has contributed to the retry budget.",
+    )
+    refresh_enabled: bool = Field(
+        default=True,
+        description="Run the background creative refresh scheduler (requires an access token).",
+    )
+    refresh_interval_seconds: float = Field(
+        default=3600.0,
+        description="Base interval between refreshes of a publisher.",
+    )
+    refresh_hot_interval_seconds: float = Field(
+        default=900.0,
+        description="Interval used for publishers whose creatives changed recently.",
+    )
+    refresh_hot_window_seconds: float = Field(
+        default=86400.0,
+        description="How long after a creative change a publisher keeps the hot interval.",
+    )
+    refresh_jitter_ratio: float = Field(
+        default=0.1,
+        description="Random +/- fraction applied to every refresh interval.",
+    )
+    refresh_stagger_seconds: float = Field(
+        default=300.0,
+        description="Window over which first refreshes of newly seen publishers are spread.",
+    )
+    refresh_max_concurrency: int = Field(
+        default=4,
+        description="Maximum number of refresh batches (of up to meta_batch_size publishers) run at the same time.",
+    )
+    refresh_backoff_base_seconds: float = Field(
+        default=60.0,
+        description="Initial retry delay after a throttled (429) or server (5xx) error.",
+    )
+    refresh_backoff_max_seconds: float = Field(
+        default=3600.0,
+        description="Upper bound for the exponential retry delay.",
+    )
+    refresh_tick_seconds: float = Field(
+        default=5.0,
+        description="How often the scheduler checks for due publishers.",
+    )
+    refresh_full_sweep_seconds: float = Field(
+        default=86400.0,
+        description="How often a query ignores its delivery-date watermark so ended creatives are detected.",
+    )
+    page_scan_limit: int = Field(
+        default=10_000,
+        description=(
+            "Creatives a filtered ads page may examine; past it the page is returned short, "
+            "with a cursor to continue from."
+        ),
+    )
+    fresh_ttl_seconds: float = Field(
+        default=300.0,
+        description="How long a publisher's creatives count as fresh for fresh=true requests.",
+    )
+    fresh_stale_seconds: float = Field(
+        default=3600.0,
+        description="How long past the TTL stale creatives are served while a background refresh runs.",
+    )
+    fresh_wait_seconds: float = Field(
+        default=10.0,
+        description="Maximum time a fresh=true request waits for creatives older than the stale window.",
+    )
+    media_cache_dir: str = Field(
+        default="data/media",
+        description="Directory holding cached creative snapshots, one file per distinct content.",
+    )
+    media_cache_max_bytes: int = Field(
+        default=1 << 30,
+        description="Size above which the least recently used snapshots are deleted.",
+    )
+    media_fetch_concurrency: int = Field(
+        default=4,
+        description="Number of workers fetching snapshots from their origin.",
+    )
+    media_fetch_timeout_seconds: float = Field(
+        default=10.0,
+        description="Timeout applied to each snapshot fetch.",
+    )
+    media_fetch_max_bytes: int = Field(
+        default=20 << 20,
+        description="Size above which a snapshot fetch is abandoned instead of cached.",
+    )
+    media_max_age_seconds: int = Field(
+        default=300,
+        description="Cache lifetime of the redirect from a creative to its cached snapshot.",
+    )
+    change_stream_poll_seconds: float = Field(
+        default=1.0,
+        description="How often the change log of a category with stream subscribers is polled.",
+    )
+    change_stream_buffer: int = Field(
+        default=256,
+        description="Events queued per stream subscriber before it falls back to catching up from the log.",
+    )
+    change_stream_keepalive_seconds: float = Field(
+        default=15.0,
+        description="Idle time after which a change stream sends a keep-alive comment.",
+    )
     default_categories: List[dict] = Field(
         default_factory=list,
         description="Static categories loaded when the repository is initialised.",
@@ -30,6 +206,17 @@ class Settings(BaseModel):
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    """Return cached settings instance."""
+    """Return cached settings instance.
+
+    Every field can be set through an environment variable named after it in
+    upper case, e.g. ``META_ACCESS_TOKEN`` or ``REPOSITORY_BACKEND``. List
+    fields are given as JSON.
+    """
 
-    return Settings()
+    overrides = {}
+    for name, field in Settings.model_fields.items():
+        value = os.environ.get(name.upper())
+        if value is None:
+            continue
+        overrides[name] = json.loads(value) if get_origin(field.annotation) is list else value
+    return Settings(**overrides)
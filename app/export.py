@@ -0,0 +1,38 @@
+"""Streaming encoders for bulk creative exports."""
+from __future__ import annotations
+
+import csv
+import io
+from typing import Iterable, Iterator, List
+
+from .models import Creative
+
+CSV_COLUMNS = tuple(Creative.model_fields)
+
+
+def ndjson_chunks(batches: Iterable[List[Creative]]) -> Iterator[bytes]:
+    """Encode each batch of creatives as newline-delimited JSON."""
+
+    for batch in batches:
+        yield b"".join(creative.model_dump_json().encode() + b"\n" for creative in batch)
+
+
+def csv_chunks(batches: Iterable[List[Creative]]) -> Iterator[bytes]:
+    """Encode batches of creatives as CSV, starting with a header row.
+
+    ``platforms`` is written as a single comma separated cell.
+    """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for batch in batches:
+        for creative in batch:
+            row = creative.model_dump(mode="json")
+            row["platforms"] = ",".join(creative.platforms)
+            writer.writerow(row[column] for column in CSV_COLUMNS)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
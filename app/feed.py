@@ -0,0 +1,158 @@
+"""Server-Sent Events fan-out of category change logs."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from .changes import ChangesExpiredError
+from .config import Settings, get_settings
+from .models import CreativeChange
+from .services import Repository
+
+logger = logging.getLogger(__name__)
+
+# Changes read from the repository per call.
+BATCH_SIZE = 500
+KEEPALIVE = b": keepalive\n\n"
+# Tells the client that changes it has not seen are gone: reload the list
+# and reconnect without a position.
+RESET = b"event: reset\ndata: {}\n\n"
+
+Frame = Tuple[int, bytes]
+
+
+def encode_event(change: CreativeChange) -> bytes:
+    """Encode ``change`` as one SSE event whose ID is its log position."""
+
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (change.seq, change.kind.encode(), change.model_dump_json().encode())
+
+
+class _Subscriber:
+    __slots__ = ("queue", "lagged")
+
+    def __init__(self, buffer: int) -> None:
+        self.queue: asyncio.Queue[Frame] = asyncio.Queue(buffer)
+        self.lagged = False
+
+
+class _Channel:
+    __slots__ = ("cursor", "subscribers", "task")
+
+    def __init__(self, cursor: int) -> None:
+        self.cursor = cursor
+        self.subscribers: Set[_Subscriber] = set()
+        self.task: Optional[asyncio.Task] = None
+
+
+class ChangeFeed:
+    """Streams a category's creative changes to any number of subscribers.
+
+    Each category with subscribers has one poller reading the repository's
+    change log every ``change_stream_poll_seconds``; every new change is
+    encoded once and the same bytes are queued for all of its subscribers.
+    Queues hold at most ``change_stream_buffer`` events. A subscriber whose
+    queue is full is detached instead of slowing the poller down: once it
+    has sent what it buffered, it catches up from the log at its own pace
+    from the last position it sent, then attaches again. A subscriber that
+    falls behind by more than the log keeps gets a ``reset`` event and the
+    stream ends.
+    """
+
+    def __init__(self, repository: Repository, settings: Settings | None = None) -> None:
+        self.repository = repository
+        self.settings = settings or get_settings()
+        self._channels: Dict[str, _Channel] = {}
+
+    async def _changes(self, category_id: str, after: Optional[int] = None) -> Tuple[List[CreativeChange], int]:
+        # Repository calls can block (SQLite), so they run off the event loop.
+        return await asyncio.to_thread(self.repository.creative_changes, category_id, after=after, limit=BATCH_SIZE)
+
+    async def _channel(self, category_id: str) -> _Channel:
+        channel = self._channels.get(category_id)
+        if channel is None:
+            _, cursor = await self._changes(category_id)
+            # Another stream may have started the poller in the meantime.
+            channel = self._channels.get(category_id)
+        if channel is None:
+            channel = self._channels[category_id] = _Channel(cursor)
+            channel.task = asyncio.create_task(self._poll(category_id, channel))
+        return channel
+
+    async def _poll(self, category_id: str, channel: _Channel) -> None:
+        while channel.subscribers:
+            try:
+                changes, cursor = await self._changes(category_id, channel.cursor)
+            except ChangesExpiredError:
+                # The poller itself fell behind: every subscriber catches up
+                # (or resets) on its own.
+                for subscriber in channel.subscribers:
+                    subscriber.lagged = True
+                channel.subscribers.clear()
+                break
+            except Exception:
+                logger.exception("Polling the change log of %s failed", category_id)
+                changes, cursor = [], channel.cursor
+            for change in changes:
+                frame = (change.seq, encode_event(change))
+                for subscriber in list(channel.subscribers):
+                    try:
+                        subscriber.queue.put_nowait(frame)
+                    except asyncio.QueueFull:
+                        subscriber.lagged = True
+                        channel.subscribers.discard(subscriber)
+            channel.cursor = cursor
+            if len(changes) < BATCH_SIZE:
+                await asyncio.sleep(self.settings.change_stream_poll_seconds)
+        if self._channels.get(category_id) is channel:
+            del self._channels[category_id]
+
+    async def stream(self, category_id: str, since: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield SSE events for changes after ``since``, or from now on.
+
+        Comments are sent every ``change_stream_keepalive_seconds`` without
+        changes, so idle connections stay open through proxies.
+        """
+
+        subscriber = _Subscriber(self.settings.change_stream_buffer)
+        channel = await self._channel(category_id)
+        cursor = channel.cursor if since is None else since
+        # Attached before catching up, so nothing between the two is missed.
+        channel.subscribers.add(subscriber)
+        try:
+            yield KEEPALIVE
+            while True:
+                while cursor < channel.cursor:
+                    try:
+                        changes, cursor = await self._changes(category_id, cursor)
+                    except ChangesExpiredError:
+                        yield RESET
+                        return
+                    for change in changes:
+                        yield encode_event(change)
+                while not (subscriber.lagged and subscriber.queue.empty()):
+                    try:
+                        seq, event = await asyncio.wait_for(
+                            subscriber.queue.get(), self.settings.change_stream_keepalive_seconds
+                        )
+                    except asyncio.TimeoutError:
+                        yield KEEPALIVE
+                        continue
+                    # Events already sent while catching up are skipped.
+                    if seq > cursor:
+                        cursor = seq
+                        yield event
+                subscriber.lagged = False
+                channel = await self._channel(category_id)
+                channel.subscribers.add(subscriber)
+        finally:
+            channel.subscribers.discard(subscriber)
+
+    async def aclose(self) -> None:
+        """Stop every poller."""
+
+        tasks = [channel.task for channel in self._channels.values() if channel.task is not None]
+        self._channels.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,111 @@
+"""On-demand creative refreshes with request coalescing and TTL caching."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Set
+
+from .config import Settings, get_settings
+from .meta_client import MetaAdLibraryClient
+from .services import CreativeService, Repository
+
+logger = logging.getLogger(__name__)
+
+
+class OnDemandRefresher:
+    """Refreshes publishers' creatives when a client asks for fresh data.
+
+    Every publisher has a last-refreshed time. A publisher refreshed within
+    ``fresh_ttl_seconds`` is served from the cache as-is. Up to
+    ``fresh_stale_seconds`` past that TTL the cached creatives are still served
+    immediately while a refresh runs in the background (stale-while-revalidate).
+    Older or never refreshed publishers are waited for, up to
+    ``fresh_wait_seconds``; on timeout or failure the cached data is served
+    and the refresh is left to finish on its own.
+
+    Refreshes are single-flight per publisher: a request that needs a
+    publisher already being refreshed joins the in-flight fetch instead of
+    starting another one, so concurrent requests for a category share one
+    round of upstream calls.
+    """
+
+    def __init__(
+        self,
+        repository: Repository,
+        meta_client: MetaAdLibraryClient,
+        settings: Settings | None = None,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.meta_client = meta_client
+        self.settings = settings or get_settings()
+        self.service = CreativeService(repository, meta_client, self.settings)
+        self._clock = clock
+        self._refreshed_at: Dict[str, float] = {}
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    def mark_refreshed(self, publisher_ids: Iterable[str]) -> None:
+        """Record a refresh of ``publisher_ids`` performed elsewhere."""
+
+        now = self._clock()
+        for publisher_id in publisher_ids:
+            self._refreshed_at[publisher_id] = now
+
+    async def ensure_fresh(self, publisher_ids: Iterable[str]) -> None:
+        """Bring ``publisher_ids`` within the freshness policy described above."""
+
+        if not self.meta_client.enabled:
+            return
+        now = self._clock()
+        ttl = self.settings.fresh_ttl_seconds
+        stale_limit = ttl + self.settings.fresh_stale_seconds
+        to_start: List[str] = []
+        wait_for_new = False
+        waiting: Set[asyncio.Task] = set()
+        for publisher_id in dict.fromkeys(publisher_ids):
+            refreshed_at = self._refreshed_at.get(publisher_id)
+            if refreshed_at is not None and now - refreshed_at <= ttl:
+                continue
+            blocking = refreshed_at is None or now - refreshed_at > stale_limit
+            task = self._in_flight.get(publisher_id)
+            if task is None:
+                to_start.append(publisher_id)
+                wait_for_new = wait_for_new or blocking
+            elif blocking:
+                waiting.add(task)
+        if to_start:
+            task = self._start(to_start)
+            if wait_for_new:
+                waiting.add(task)
+        if waiting:
+            # asyncio.wait never cancels the tasks, so a timed-out refresh still
+            # completes and updates the cache for later requests.
+            await asyncio.wait(waiting, timeout=self.settings.fresh_wait_seconds)
+
+    def _start(self, publisher_ids: List[str]) -> asyncio.Task:
+        task = asyncio.create_task(self.service.refresh_creatives_for_publishers(publisher_ids))
+        for publisher_id in publisher_ids:
+            self._in_flight[publisher_id] = task
+        task.add_done_callback(lambda done: self._finish(publisher_ids, done))
+        return task
+
+    def _finish(self, publisher_ids: List[str], task: asyncio.Task) -> None:
+        for publisher_id in publisher_ids:
+            if self._in_flight.get(publisher_id) is task:
+                del self._in_flight[publisher_id]
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            logger.warning("On-demand refresh of %s failed: %s", ", ".join(publisher_ids), exc)
+            return
+        self.mark_refreshed(publisher_ids)
+
+    async def aclose(self) -> None:
+        """Cancel refreshes that are still running."""
+
+        tasks = set(self._in_flight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,27 +1,109 @@
 """Application entrypoint for LiveFBAds FastAPI service."""
 from __future__ import annotations
 
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Any, AsyncIterator
 
 from fastapi import FastAPI
 
-from .api import admin_router, public_router
+from .api import admin_router, metrics_router, public_router
+from .config import Settings, get_settings
+from .feed import ChangeFeed
+from .freshness import OnDemandRefresher
+from .media import MediaCache
 from .meta_client import MetaAdLibraryClient
+from .metrics import MetricsMiddleware
 from .repository import InMemoryRepository
+from .scheduler import RefreshScheduler
+from .services import CategorySummaryCache, Repository
+from .snapshot import SnapshotFormatError
+from .sqlite_repository import SqliteRepository
 
+logger = logging.getLogger(__name__)
 
 SEED_PATH = Path(__file__).resolve().parent.parent / "data" / "seed.json"
 
 
-def create_app() -> FastAPI:
-    repository = InMemoryRepository(SEED_PATH)
-    app = FastAPI(title="LiveFBAds", description="Live ad creative browser for Real Money Gaming publishers")
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    settings: Settings = app.state.settings
+    scheduler: RefreshScheduler = app.state.refresh_scheduler
+    if settings.refresh_enabled and settings.meta_access_token:
+        scheduler.start()
+    try:
+        yield
+    finally:
+        await scheduler.stop()
+        await app.state.change_feed.aclose()
+        await app.state.on_demand_refresher.aclose()
+        await app.state.meta_client.aclose()
+        await app.state.media_cache.aclose()
+        if isinstance(app.state.repository, SqliteRepository):
+            app.state.repository.close()
+        elif settings.snapshot_path and isinstance(app.state.repository, InMemoryRepository):
+            await asyncio.to_thread(app.state.repository.dump_snapshot, Path(settings.snapshot_path))
+
+
+def build_repository(settings: Settings) -> Repository:
+    """Create the repository selected by ``settings.repository_backend``.
+
+    A new SQLite database is seeded on first use; afterwards its contents are
+    reused as-is so restarts are warm. The in-memory backend starts from
+    ``settings.snapshot_path`` when that file exists and falls back to the
+    seed data otherwise.
+    """
+
+    if settings.repository_backend == "sqlite":
+        return SqliteRepository(Path(settings.sqlite_path), seed_path=SEED_PATH)
+    if settings.snapshot_path:
+        snapshot_path = Path(settings.snapshot_path)
+        if snapshot_path.exists():
+            repository = InMemoryRepository()
+            try:
+                repository.load_snapshot(snapshot_path)
+            except SnapshotFormatError:
+                logger.warning("Ignoring unreadable snapshot %s; loading seed data", snapshot_path, exc_info=True)
+            else:
+                return repository
+    return InMemoryRepository(SEED_PATH)
+
+
+def create_app(settings: Settings | None = None, *, repository: Repository | None = None) -> FastAPI:
+    """Build the application; ``repository`` overrides the configured backend."""
+
+    settings = settings or get_settings()
+    repository = repository if repository is not None else build_repository(settings)
+    meta_client = MetaAdLibraryClient(settings)
+    app = FastAPI(
+        title="LiveFBAds",
+        description="Live ad creative browser for Real Money Gaming publishers",
+        lifespan=lifespan,
+    )
+    app.state.settings = settings
     app.state.repository = repository
-    app.state.meta_client = MetaAdLibraryClient()
+    app.state.meta_client = meta_client
+    app.state.category_summary_cache = CategorySummaryCache()
+    app.state.media_cache = MediaCache(settings)
+    app.state.change_feed = ChangeFeed(repository, settings)
+    app.state.on_demand_refresher = OnDemandRefresher(repository, meta_client, settings)
+    app.state.refresh_scheduler = RefreshScheduler(
+        repository, meta_client, settings, on_demand=app.state.on_demand_refresher
+    )
 
     app.include_router(public_router)
     app.include_router(admin_router)
+    app.include_router(metrics_router)
+    app.add_middleware(MetricsMiddleware)
     return app
 
 
-app = create_app()
+def __getattr__(name: str) -> Any:
+    # ``app`` is built on first access (e.g. by ``uvicorn app.main:app``), so
+    # importing this module for ``create_app`` does not load any data.
+    if name == "app":
+        application = globals()["app"] = create_app()
+        return application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
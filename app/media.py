@@ -0,0 +1,263 @@
+"""Local, content-addressed cache for creative snapshot media."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import mimetypes
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from .config import Settings, get_settings
+
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+
+
+class MediaFetchError(Exception):
+    """Raised when a snapshot cannot be fetched from its origin."""
+
+
+class _Blob:
+    __slots__ = ("path", "size", "content_type")
+
+    def __init__(self, path: Path, size: int, content_type: str) -> None:
+        self.path = path
+        self.size = size
+        self.content_type = content_type
+
+
+def _extension(content_type: str) -> str:
+    return mimetypes.guess_extension(content_type.split(";")[0].strip()) or ""
+
+
+class MediaCache:
+    """Fetches snapshot URLs once and keeps their bytes on local disk.
+
+    Blobs are stored under ``media_cache_dir`` named by the BLAKE2b digest of
+    their content, so identical snapshots of different creatives (or of one
+    creative under rotating URLs) occupy a single file. Upstream fetches go
+    through a queue drained by ``media_fetch_concurrency`` worker tasks, and
+    concurrent requests for the same URL share one fetch. Once the stored
+    bytes exceed ``media_cache_max_bytes`` the least recently used blobs are
+    deleted; a blob that is being served (see :meth:`pin`) is only unlinked
+    once the response is done. Downloads are streamed and abandoned past
+    ``media_fetch_max_bytes``. Blobs already on disk are picked up again on
+    start, oldest first; the URL-to-digest map is rebuilt as URLs are
+    requested.
+    """
+
+    def __init__(
+        self,
+        settings: Settings | None = None,
+        *,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.settings = settings or get_settings()
+        self.root = Path(self.settings.media_cache_dir)
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._blobs: "OrderedDict[str, _Blob]" = OrderedDict()
+        self._digests: Dict[str, str] = {}
+        self._urls: Dict[str, Set[str]] = {}
+        self._size = 0
+        # digest -> responses serving it, and evicted blobs waiting for them.
+        self._pins: Dict[str, int] = {}
+        self._evicted: Dict[str, Path] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.upstream_requests = 0
+        self._load()
+
+    def _load(self) -> None:
+        if not self.root.is_dir():
+            return
+        found = []
+        for path in self.root.glob("*/*"):
+            if path.is_file() and not path.name.startswith("."):
+                stat = path.stat()
+                found.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            content_type = mimetypes.guess_type(path.name)[0] or DEFAULT_CONTENT_TYPE
+            self._blobs[path.name.split(".")[0]] = _Blob(path, size, content_type)
+            self._size += size
+        self._evict()
+
+    @property
+    def size(self) -> int:
+        """Bytes currently stored."""
+
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+    def get(self, digest: str) -> Optional[Tuple[Path, str]]:
+        """Return the path and content type of a stored blob, marking it used."""
+
+        blob = self._blobs.get(digest)
+        if blob is None:
+            return None
+        self._blobs.move_to_end(digest)
+        return blob.path, blob.content_type
+
+    def pin(self, digest: str) -> Optional[Tuple[Path, str]]:
+        """Like :meth:`get`, but keeps the file on disk until :meth:`unpin`.
+
+        A blob whose file has disappeared is dropped and reported missing.
+        """
+
+        found = self.get(digest)
+        if found is None:
+            return None
+        if not found[0].is_file():
+            self._discard(digest)
+            return None
+        self._pins[digest] = self._pins.get(digest, 0) + 1
+        return found
+
+    def unpin(self, digest: str) -> None:
+        pins = self._pins.pop(digest, 1) - 1
+        if pins > 0:
+            self._pins[digest] = pins
+            return
+        path = self._evicted.pop(digest, None)
+        if path is not None and digest not in self._blobs:
+            path.unlink(missing_ok=True)
+
+    async def fetch(self, url: str) -> str:
+        """Return the digest of ``url``'s content, fetching it when not cached.
+
+        Raises :class:`MediaFetchError` when the origin cannot be reached or
+        answers with an error.
+        """
+
+        digest = self._digests.get(url)
+        if digest is not None and digest in self._blobs:
+            self._blobs.move_to_end(digest)
+            return digest
+        self._ensure_workers()
+        future = self._in_flight.get(url)
+        if future is None:
+            future = self._in_flight[url] = asyncio.get_running_loop().create_future()
+            assert self._queue is not None
+            await self._queue.put(url)
+        return await asyncio.shield(future)
+
+    def _ensure_workers(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Workers, pending fetches and pooled connections belong to the
+            # loop that created them.
+            self._loop = loop
+            self._in_flight = {}
+            self._client = None
+            self._queue = asyncio.Queue()
+            self._workers = [
+                asyncio.create_task(self._work()) for _ in range(max(1, self.settings.media_fetch_concurrency))
+            ]
+
+    async def _work(self) -> None:
+        assert self._queue is not None
+        while True:
+            url = await self._queue.get()
+            future = self._in_flight[url]
+            try:
+                future.set_result(await self._download(url))
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as exc:
+                future.set_exception(exc)
+                # Mark it retrieved: every waiter may have gone away already.
+                future.exception()
+            finally:
+                del self._in_flight[url]
+                self._queue.task_done()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.settings.media_fetch_timeout_seconds,
+                follow_redirects=True,
+                transport=self._transport,
+            )
+        return self._client
+
+    async def _download(self, url: str) -> str:
+        self.upstream_requests += 1
+        limit = self.settings.media_fetch_max_bytes
+        hasher = hashlib.blake2b(digest_size=20)
+        content = bytearray()
+        try:
+            async with self.client.stream("GET", url) as response:
+                if not response.is_success:
+                    raise MediaFetchError(f"Fetching {url} failed with status {response.status_code}")
+                declared = response.headers.get("content-length", "")
+                if declared.isdigit() and int(declared) > limit:
+                    raise MediaFetchError(f"Fetching {url} failed: {declared} bytes exceed {limit}")
+                async for chunk in response.aiter_bytes():
+                    content += chunk
+                    if len(content) > limit:
+                        raise MediaFetchError(f"Fetching {url} failed: more than {limit} bytes")
+                    hasher.update(chunk)
+                content_type = response.headers.get("content-type", DEFAULT_CONTENT_TYPE)
+        except httpx.TransportError as exc:
+            raise MediaFetchError(f"Fetching {url} failed: {exc}") from exc
+        digest = hasher.hexdigest()
+        if digest not in self._blobs:
+            path = self.root / digest[:2] / f"{digest}{_extension(content_type)}"
+            await asyncio.to_thread(self._write, path, bytes(content))
+            # Another URL with the same content may have been stored meanwhile.
+            if digest not in self._blobs:
+                self._blobs[digest] = _Blob(path, len(content), content_type)
+                self._size += len(content)
+        self._blobs.move_to_end(digest)
+        self._digests[url] = digest
+        self._urls.setdefault(digest, set()).add(url)
+        self._evict()
+        return digest
+
+    @staticmethod
+    def _write(path: Path, content: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write beside the target and rename so readers never see a partial file.
+        handle, temporary = tempfile.mkstemp(dir=path.parent, prefix=".")
+        try:
+            with os.fdopen(handle, "wb") as file:
+                file.write(content)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def _evict(self) -> None:
+        # The most recently used blob is kept even if it alone exceeds the cap.
+        while self._size > self.settings.media_cache_max_bytes and len(self._blobs) > 1:
+            self._discard(next(iter(self._blobs)))
+
+    def _discard(self, digest: str) -> None:
+        blob = self._blobs.pop(digest)
+        self._size -= blob.size
+        for url in self._urls.pop(digest, ()):
+            del self._digests[url]
+        if digest in self._pins:
+            self._evicted[digest] = blob.path
+        else:
+            blob.path.unlink(missing_ok=True)
+
+    async def aclose(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._loop = self._queue = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -1,68 +1,288 @@
 """Meta Graph API client for fetching ad creatives."""
 from __future__ import annotations
 
-from typing import Iterable, List
+import asyncio
+import random
+import time
+from datetime import date, datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
 
 import httpx
 
-from .config import get_settings
-from .models import Creative
+from .config import Settings, get_settings
+from .metrics import META_REQUEST_DURATION, META_REQUESTS
+from .models import Creative, MetaRateLimitStatus
+from .rate_limit import (
+    AdaptiveTokenBucket,
+    RetryBudget,
+    ThrottleMetrics,
+    is_throttle_response,
+    parse_usage,
+    retry_after_seconds,
+)
+
+AD_ARCHIVE_FIELDS = (
+    "id",
+    "page_id",
+    "ad_snapshot_url",
+    "ad_creative_link_title",
+    "ad_creative_body",
+    "ad_creative_link_caption",
+    "publisher_platforms",
+    "ad_delivery_start_time",
+    "ad_delivery_stop_time",
+    "spend",
+    "currency",
+)
+
+
+def _parse_delivery_time(value: Any) -> Optional[datetime]:
+    """Parse an Ad Library delivery date (``YYYY-MM-DD``) as midnight UTC."""
+
+    if not value:
+        return None
+    try:
+        day = date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def _parse_spend(value: Any) -> Optional[float]:
+    """Return the midpoint of an Ad Library spend range.
+
+    Spend is reported as ``{"lower_bound": "100", "upper_bound": "199"}``;
+    the top range has no upper bound, so its lower bound is used.
+    """
+
+    if not isinstance(value, dict):
+        return None
+    try:
+        bounds = [float(value[key]) for key in ("lower_bound", "upper_bound") if value.get(key) not in (None, "")]
+    except (TypeError, ValueError):
+        return None
+    return sum(bounds) / len(bounds) if bounds else None
 
 
 class MetaAdLibraryClient:
-    """Small wrapper around the Meta Ad Library endpoint."""
+    """Async wrapper around the Meta Ad Library endpoint.
+
+    A single ``httpx.AsyncClient`` is kept for the lifetime of the client so
+    connections are pooled across refreshes; call :meth:`aclose` on shutdown.
+
+    Every request, including pagination and retries, first takes a token from
+    an :class:`AdaptiveTokenBucket` that slows down as Meta's usage headers
+    approach the limit. Throttled (429 or Graph rate-limit error codes),
+    server-failed and timed-out requests are retried with exponential backoff
+    and full jitter, as long as the shared :class:`RetryBudget` allows it.
+    """
+
+    def __init__(
+        self,
+        settings: Settings | None = None,
+        *,
+        transport: httpx.AsyncBaseTransport | None = None,
+        rng: random.Random | None = None,
+    ) -> None:
+        self.settings = settings or get_settings()
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore = asyncio.Semaphore(self.settings.meta_max_concurrency)
+        self._rng = rng or random.Random()
+        self.rate_limiter = AdaptiveTokenBucket(
+            self.settings.meta_rate_limit_per_second,
+            self.settings.meta_rate_limit_burst,
+            slowdown_percent=self.settings.meta_usage_slowdown_percent,
+            recovery_seconds=self.settings.meta_rate_recovery_seconds,
+        )
+        self.retry_budget = RetryBudget(
+            self.settings.meta_retry_budget_ratio,
+            self.settings.meta_retry_budget_reserve,
+        )
+        self.metrics = ThrottleMetrics()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether live Ad Library requests can be made (an access token is set)."""
 
-    def __init__(self) -> None:
-        self.settings = get_settings()
+        return bool(self.settings.meta_access_token)
 
-    def _build_client(self) -> httpx.Client:
+    def _build_client(self) -> httpx.AsyncClient:
         headers = {}
         if self.settings.meta_access_token:
             headers["Authorization"] = f"Bearer {self.settings.meta_access_token}"
-        return httpx.Client(base_url=self.settings.meta_ad_library_endpoint, headers=headers, timeout=10.0)
+        limits = httpx.Limits(
+            max_connections=self.settings.meta_max_concurrency,
+            max_keepalive_connections=self.settings.meta_max_concurrency,
+        )
+        return httpx.AsyncClient(
+            base_url=self.settings.meta_ad_library_endpoint,
+            headers=headers,
+            timeout=self.settings.meta_timeout_seconds,
+            limits=limits,
+            transport=self._transport,
+        )
 
-    def fetch_active_creatives(self, publisher_ids: Iterable[str]) -> List[Creative]:
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    def rate_limit_status(self) -> MetaRateLimitStatus:
+        return self.metrics.status(self.rate_limiter, self.retry_budget)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch_active_creatives(self, publisher_ids: Iterable[str]) -> List[Creative]:
         """Fetch active creatives for the provided publisher IDs.
 
+        Publisher IDs are split into batches of ``meta_batch_size`` and every
+        batch is queried for each of ``meta_countries`` and ``meta_ad_types``.
+        The queries run concurrently, bounded by ``meta_max_concurrency``
+        in-flight requests, and every ``paging.next`` cursor is followed. A
+        creative reached in several countries is returned once.
+
         For safety during local development this method returns an empty list when no
         access token is provided. This prevents accidental unauthenticated calls to
         the Meta Graph API while still allowing the application to function with
         cached data.
         """
 
-        publisher_ids = list(publisher_ids)
+        publisher_ids = list(dict.fromkeys(publisher_ids))
         if not publisher_ids:
             return []
         if not self.settings.meta_access_token:
             return []
 
+        batch_size = max(1, self.settings.meta_batch_size)
+        queries = [
+            (publisher_ids[start : start + batch_size], country, ad_type)
+            for start in range(0, len(publisher_ids), batch_size)
+            for country in self.settings.meta_countries
+            for ad_type in self.settings.meta_ad_types
+        ]
+
+        async def fetch(batch: List[str], country: str, ad_type: str) -> List[Creative]:
+            creatives: List[Creative] = []
+            async for page, _ in self.fetch_creative_pages(batch, country=country, ad_type=ad_type):
+                creatives.extend(page)
+            return creatives
+
+        results = await asyncio.gather(*(fetch(*query) for query in queries))
+        unique = {creative.id: creative for batch in results for creative in batch}
+        return list(unique.values())
+
+    async def fetch_creative_pages(
+        self,
+        publisher_ids: Sequence[str],
+        *,
+        country: str,
+        ad_type: str,
+        delivery_date_min: date | None = None,
+        after: str | None = None,
+    ) -> AsyncIterator[Tuple[List[Creative], Optional[str]]]:
+        """Yield the pages of one Ad Library query.
+
+        ``delivery_date_min`` limits the query to ads delivered on or after
+        that date. Each page is yielded with the cursor of the page following
+        it (``None`` after the last page); passing that cursor back as
+        ``after`` resumes the query where it stopped.
+        """
+
         params = {
             "access_token": self.settings.meta_access_token,
-            "search_terms": ",".join(publisher_ids),
-            "ad_reached_countries": "US",
-            "ad_type": "POLITICAL_AND_ISSUE_ADS",
+            "search_page_ids": ",".join(publisher_ids),
+            "ad_reached_countries": country,
+            "ad_type": ad_type,
+            "ad_active_status": "ACTIVE",
+            "fields": ",".join(AD_ARCHIVE_FIELDS),
+            "limit": str(self.settings.meta_page_size),
         }
+        if delivery_date_min is not None:
+            params["ad_delivery_date_min"] = delivery_date_min.isoformat()
+        if after is not None:
+            params["after"] = after
+        payload = await self._get_json(f"/{self.settings.meta_ad_library_version}/ads_archive", params)
+        while True:
+            creatives = [self._parse_creative(item) for item in payload.get("data", [])]
+            paging = payload.get("paging") or {}
+            next_url = paging.get("next")
+            if not next_url:
+                yield creatives, None
+                return
+            # ``paging.next`` is an absolute URL that already carries every query
+            # parameter, including the cursor.
+            cursor = httpx.URL(next_url).params.get("after") or (paging.get("cursors") or {}).get("after")
+            yield creatives, cursor
+            payload = await self._get_json(next_url)
 
-        creatives: List[Creative] = []
-        with self._build_client() as client:
-            response = client.get(f"/{self.settings.meta_ad_library_version}/ads_archive", params=params)
-            response.raise_for_status()
-            payload = response.json()
-        for item in payload.get("data", []):
-            creatives.append(
-                Creative(
-                    id=item.get("id", ""),
-                    publisher_id=item.get("page_id", ""),
-                    snapshot_url=item.get("ad_snapshot_url"),
-                    title=item.get("ad_creative_link_title"),
-                    body=item.get("ad_creative_body"),
-                    call_to_action=item.get("ad_creative_link_caption"),
-                    platforms=item.get("publisher_platforms", []),
-                    spend=None,
-                    currency=None,
-                    start_time=None,
-                    end_time=None,
-                    ad_library_url=item.get("ad_snapshot_url"),
+    async def _get_json(self, url: str, params: Dict[str, str] | None = None) -> Dict[str, Any]:
+        self.retry_budget.record_request()
+        attempt = 0
+        while True:
+            self.metrics.wait_seconds += await self.rate_limiter.acquire()
+            try:
+                async with self._semaphore:
+                    self.metrics.requests += 1
+                    started = time.perf_counter()
+                    try:
+                        response = await self.client.get(url, params=params)
+                    finally:
+                        META_REQUEST_DURATION.observe(time.perf_counter() - started)
+            except httpx.TransportError as exc:
+                META_REQUESTS.labels("transport_error").inc()
+                error: Exception = exc
+            else:
+                META_REQUESTS.labels(str(response.status_code)).inc()
+                usage, regain_seconds = parse_usage(response.headers)
+                self.rate_limiter.observe_usage(usage, regain_seconds)
+                if response.is_success:
+                    self.rate_limiter.succeeded()
+                    return response.json()
+                if is_throttle_response(response):
+                    self.metrics.throttled += 1
+                    # Blocks every caller of the bucket until the retry window passes.
+                    self.rate_limiter.throttled(retry_after_seconds(response))
+                elif response.status_code >= 500:
+                    self.metrics.server_errors += 1
+                else:
+                    response.raise_for_status()
+                error = httpx.HTTPStatusError(
+                    f"Ad Library request failed with status {response.status_code}",
+                    request=response.request,
+                    response=response,
                 )
+
+            if attempt >= self.settings.meta_max_retries:
+                raise error
+            if not self.retry_budget.try_withdraw():
+                self.metrics.retries_denied += 1
+                raise error
+            attempt += 1
+            self.metrics.retries += 1
+            ceiling = min(
+                self.settings.meta_retry_backoff_base_seconds * 2 ** (attempt - 1),
+                self.settings.meta_retry_backoff_max_seconds,
             )
-        return creatives
+            await asyncio.sleep(self._rng.uniform(0, ceiling))
+
+    @staticmethod
+    def _parse_creative(item: Dict[str, Any]) -> Creative:
+        return Creative(
+            id=item.get("id", ""),
+            publisher_id=item.get("page_id", ""),
+            snapshot_url=item.get("ad_snapshot_url"),
+            title=item.get("ad_creative_link_title"),
+            body=item.get("ad_creative_body"),
+            call_to_action=item.get("ad_creative_link_caption"),
+            platforms=item.get("publisher_platforms", []),
+            spend=_parse_spend(item.get("spend")),
+            currency=item.get("currency"),
+            start_time=_parse_delivery_time(item.get("ad_delivery_start_time")),
+            end_time=_parse_delivery_time(item.get("ad_delivery_stop_time")),
+            ad_library_url=item.get("ad_snapshot_url"),
+        )
@@ -0,0 +1,377 @@
+"""Lightweight Prometheus instrumentation.
+
+Metrics are plain counters and fixed-bucket histograms rendered in the
+Prometheus text exposition format (version 0.0.4). Recording a sample is a
+dict lookup and an addition, cheap enough for every request and repository
+call. Updates rely on the GIL rather than locks; a rare lost increment under
+thread contention is an accepted trade-off for the hot path.
+
+Process-wide instruments are module globals registered in :data:`REGISTRY`.
+Values that belong to one application (cache sizes, refresh lag, upstream
+throttling) are computed from ``app.state`` at scrape time, see
+:func:`render_app_metrics`.
+"""
+from __future__ import annotations
+
+import abc
+import functools
+import math
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .models import CreativeChangeSummary
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _header(name: str, kind: str, documentation: str) -> List[str]:
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Labels, Any] = {}
+
+    def labels(self, *values: str) -> Any:
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self) -> Any:
+        """A child holding the values of one label combination."""
+
+    @abc.abstractmethod
+    def render(self) -> List[str]:
+        """The metric's lines in the text exposition format."""
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        lines = _header(self.name, self.kind, self.documentation)
+        for values, child in self._children.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    """Histogram with fixed upper bounds (``le`` buckets)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = _header(self.name, self.kind, self.documentation)
+        bucket_labels = self.labelnames + ("le",)
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                labels = _format_labels(bucket_labels, values + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Ordered collection of metrics rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> List[str]:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return lines
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    metric = Counter(name, documentation, labelnames)
+    REGISTRY.register(metric)
+    return metric
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    metric = Histogram(name, documentation, labelnames, buckets)
+    REGISTRY.register(metric)
+    return metric
+
+
+HTTP_REQUEST_DURATION = histogram(
+    "livefbads_http_request_duration_seconds",
+    "Time spent handling HTTP requests, by route template.",
+    ("method", "route"),
+)
+HTTP_REQUESTS = counter(
+    "livefbads_http_requests_total",
+    "HTTP requests handled, by route template and status code.",
+    ("method", "route", "status"),
+)
+REPOSITORY_OPERATION_DURATION = histogram(
+    "livefbads_repository_operation_duration_seconds",
+    "Time spent in repository operations.",
+    ("backend", "operation"),
+)
+REPOSITORY_SCANNED_CREATIVES = counter(
+    "livefbads_repository_scanned_creatives_total",
+    "Creatives read from an index while answering a repository operation.",
+    ("backend", "operation"),
+)
+REPOSITORY_RETURNED_CREATIVES = counter(
+    "livefbads_repository_returned_creatives_total",
+    "Creatives returned by a repository operation; divide by scanned for the filter hit rate.",
+    ("backend", "operation"),
+)
+CREATIVE_UPSERTS = counter(
+    "livefbads_creative_upserts_total",
+    "Creatives applied by bulk upserts, by outcome (unchanged ones hit the content-hash check).",
+    ("backend", "outcome"),
+)
+CATEGORY_SUMMARY_CACHE = counter(
+    "livefbads_category_summary_cache_total",
+    "Lookups of the serialized category summaries, by result.",
+    ("result",),
+)
+META_REQUEST_DURATION = histogram(
+    "livefbads_meta_request_duration_seconds",
+    "Latency of individual Meta Ad Library HTTP requests.",
+    buckets=UPSTREAM_BUCKETS,
+)
+META_REQUESTS = counter(
+    "livefbads_meta_requests_total",
+    "Meta Ad Library HTTP requests by status code (or transport_error).",
+    ("status",),
+)
+
+
+def timed(metric: Histogram, *labels: str) -> Callable[[F], F]:
+    """Decorate a function to record its wall time in ``metric``."""
+
+    child = metric.labels(*labels)
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def record_scan(backend: str, operation: str, scanned: int, returned: int) -> None:
+    REPOSITORY_SCANNED_CREATIVES.labels(backend, operation).inc(scanned)
+    REPOSITORY_RETURNED_CREATIVES.labels(backend, operation).inc(returned)
+
+
+def record_upserts(backend: str, summary: CreativeChangeSummary) -> None:
+    CREATIVE_UPSERTS.labels(backend, "inserted").inc(len(summary.inserted))
+    CREATIVE_UPSERTS.labels(backend, "updated").inc(len(summary.updated))
+    CREATIVE_UPSERTS.labels(backend, "ended").inc(len(summary.ended))
+    CREATIVE_UPSERTS.labels(backend, "unchanged").inc(summary.unchanged)
+
+
+def _gauge(name: str, documentation: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    lines = _header(name, "gauge", documentation)
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+    return lines
+
+
+def render_app_metrics(state: Any, now: Optional[float] = None) -> str:
+    """Render process-wide metrics plus gauges read from ``app.state``."""
+
+    now = time.time() if now is None else now
+    lines = REGISTRY.render()
+
+    publishers, creatives = state.repository.cache_sizes()
+    lines += _gauge("livefbads_cached_publishers", "Publishers held by the repository.", [({}, publishers)])
+    lines += _gauge("livefbads_cached_creatives", "Creatives held by the repository.", [({}, creatives)])
+
+    media_cache = state.media_cache
+    lines += _gauge("livefbads_media_cache_bytes", "Bytes of cached creative snapshots.", [({}, media_cache.size)])
+    lines += _gauge("livefbads_media_cache_blobs", "Distinct cached creative snapshots.", [({}, len(media_cache))])
+
+    scheduler_status = state.refresh_scheduler.status()
+    lag = [
+        ({"publisher_id": publisher.publisher_id}, now - publisher.last_success.timestamp())
+        for publisher in scheduler_status.publishers
+        if publisher.last_success is not None
+    ]
+    lines += _gauge(
+        "livefbads_refresh_lag_seconds",
+        "Seconds since the last successful scheduled refresh of each publisher.",
+        lag,
+    )
+    failures = [
+        ({"publisher_id": publisher.publisher_id}, publisher.consecutive_failures)
+        for publisher in scheduler_status.publishers
+    ]
+    lines += _gauge(
+        "livefbads_refresh_consecutive_failures",
+        "Consecutive failed scheduled refreshes of each publisher.",
+        failures,
+    )
+
+    throttle = state.meta_client.rate_limit_status()
+    for field, documentation in (
+        ("throttled", "Meta responses that signalled rate limiting."),
+        ("retries", "Meta requests retried after throttling or failure."),
+        ("retries_denied", "Meta retries refused by the global retry budget."),
+        ("wait_seconds", "Time spent waiting on the Meta rate limiter."),
+    ):
+        name = f"livefbads_meta_{field}_total"
+        lines += _header(name, "counter", documentation)
+        lines.append(f"{name} {_format_value(getattr(throttle, field))}")
+    lines += _gauge(
+        "livefbads_meta_rate_limit_per_second",
+        "Current refill rate of the Meta rate limiter.",
+        [({}, throttle.current_rate)],
+    )
+    if throttle.usage_percent is not None:
+        lines += _gauge(
+            "livefbads_meta_usage_percent",
+            "Highest usage percentage last reported by Meta's usage headers.",
+            [({}, throttle.usage_percent)],
+        )
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing HTTP requests per route template.
+
+    The route is read from the scope after routing, so ``/api/categories/x/ads``
+    is recorded as ``/api/categories/{category_id}/ads`` and label cardinality
+    stays bounded. Requests that match no route are grouped as ``unmatched``.
+    Streaming responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUEST_DURATION.labels(method, template).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, template, str(status_code)).inc()
@@ -1,8 +1,8 @@
 """Domain models used by the LiveFBAds application."""
 from __future__ import annotations
 
-from datetime import datetime
-from typing import List, Optional
+from datetime import date, datetime
+from typing import Dict, List, Literal, Optional, Tuple
 
 from pydantic import BaseModel, Field
 
@@ -48,12 +48,87 @@ class Creative(BaseModel):
     )
 
 
+class CreativeCluster(BaseModel):
+    """Near-duplicate creatives represented by the one with the lowest ID."""
+
+    cluster_id: Optional[str] = Field(
+        default=None,
+        description="Stable cluster label; null for creatives without copy, which are never clustered.",
+    )
+    size: int = Field(description="Number of creatives in the cluster matching the request's filters.")
+    creative: Creative
+
+
+class CreativeChangeSummary(BaseModel):
+    """Outcome of a bulk creative upsert."""
+
+    inserted: List[str] = Field(default_factory=list)
+    updated: List[str] = Field(default_factory=list)
+    ended: List[str] = Field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserted or self.updated or self.ended)
+
+
+class CreativeChange(BaseModel):
+    """One entry of a category's creative change log."""
+
+    seq: int = Field(description="Position in the change log; pass the last one seen as `since` to resume after it.")
+    kind: Literal["inserted", "updated", "ended"]
+    changed_at: datetime
+    creative: Creative = Field(description="The creative as written by the change.")
+
+
 class CategorySummary(BaseModel):
     """Response model summarising a category."""
 
     id: str
     name: str
     publisher_count: int
+    creative_count: int = 0
+
+
+class ReportBucket(BaseModel):
+    """Creative activity of one day in a competitor report."""
+
+    date: date
+    active_creatives: int = Field(description="Creatives running at some point of the day.")
+    new_creatives: int = Field(description="Creatives that started delivering on the day.")
+    ended_creatives: int = Field(description="Creatives that stopped delivering on the day.")
+    platforms: Dict[str, int] = Field(
+        default_factory=dict,
+        description="Active creatives per publisher platform; a creative counts once per platform.",
+    )
+    spend: Dict[str, float] = Field(
+        default_factory=dict,
+        description="Reported spend of the day's new creatives per currency, for creatives that report spend.",
+    )
+
+
+class PublisherReportTotals(BaseModel):
+    """One publisher's activity over a report's whole date range."""
+
+    publisher_id: str
+    active_creatives: int = Field(description="Creatives running on the last day of the range.")
+    new_creatives: int
+    ended_creatives: int
+    spend: Dict[str, float] = Field(default_factory=dict)
+
+
+class CategoryReport(BaseModel):
+    """Daily creative activity of a category's publishers."""
+
+    category_id: str
+    start: date
+    end: date
+    days: List[ReportBucket] = Field(default_factory=list)
+    publishers: List[PublisherReportTotals] = Field(default_factory=list)
+    undated_creatives: int = Field(
+        default=0,
+        description="Creatives without a start time, which are left out of the daily buckets.",
+    )
 
 
 class PublisherCreateRequest(BaseModel):
@@ -75,6 +150,65 @@ class PublisherUpdateRequest(BaseModel):
     notes: Optional[str] = None
 
 
+class PublisherRefreshStatus(BaseModel):
+    """Scheduling state of the background refresh for a single publisher."""
+
+    publisher_id: str
+    last_run: Optional[datetime] = None
+    last_success: Optional[datetime] = None
+    last_changed: Optional[datetime] = None
+    next_run: Optional[datetime] = None
+    consecutive_failures: int = 0
+    total_failures: int = 0
+    last_error: Optional[str] = None
+
+
+class RefreshSchedulerStatus(BaseModel):
+    """Response model describing the background refresh scheduler."""
+
+    running: bool
+    last_tick: Optional[datetime] = None
+    publishers: List[PublisherRefreshStatus] = Field(default_factory=list)
+
+
+class RefreshCheckpoint(BaseModel):
+    """Progress of one (publisher, country, ad type) Ad Library query."""
+
+    publisher_id: str
+    country: str
+    ad_type: str
+    delivery_date_min: Optional[date] = Field(
+        default=None,
+        description="ad_delivery_date_min watermark of the next incremental run.",
+    )
+    cursor: Optional[str] = Field(
+        default=None,
+        description="Paging cursor of an interrupted run, resumed by the next run.",
+    )
+    full_sweep_at: Optional[datetime] = Field(
+        default=None,
+        description="When the query last fetched every active creative.",
+    )
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return self.publisher_id, self.country, self.ad_type
+
+
+class MetaRateLimitStatus(BaseModel):
+    """Throttling counters and limiter state of the Meta Ad Library client."""
+
+    requests: int = 0
+    throttled: int = 0
+    retries: int = 0
+    retries_denied: int = 0
+    server_errors: int = 0
+    wait_seconds: float = 0.0
+    current_rate: float
+    usage_percent: Optional[float] = None
+    retry_budget: float
+
+
 class AdminOperationResponse(BaseModel):
     """Standard response returned from admin operations."""
 
@@ -0,0 +1,236 @@
+"""Client-side rate limiting for Meta Graph API calls."""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Mapping, Optional
+
+import httpx
+
+from .models import MetaRateLimitStatus
+
+# Graph API error codes that signal rate limiting. They usually come with HTTP
+# 400 or 403 rather than 429.
+THROTTLE_ERROR_CODES = frozenset({4, 17, 32, 613, *range(80000, 80015)})
+
+
+def _usage_entries(headers: Mapping[str, str]) -> Iterable[Dict[str, Any]]:
+    app_usage = headers.get("x-app-usage")
+    if app_usage:
+        try:
+            yield json.loads(app_usage)
+        except ValueError:
+            pass
+    business_usage = headers.get("x-business-use-case-usage")
+    if business_usage:
+        try:
+            by_business = json.loads(business_usage)
+        except ValueError:
+            return
+        for entries in by_business.values():
+            yield from entries
+
+
+def parse_usage(headers: Mapping[str, str]) -> tuple[Optional[float], float]:
+    """Read Graph API usage headers.
+
+    Returns the highest usage percentage reported by ``X-App-Usage`` and
+    ``X-Business-Use-Case-Usage`` (``None`` when neither is present) and the
+    longest ``estimated_time_to_regain_access`` in seconds.
+    """
+
+    usage: Optional[float] = None
+    regain_seconds = 0.0
+    for entry in _usage_entries(headers):
+        for key in ("call_count", "total_time", "total_cputime"):
+            value = entry.get(key)
+            if isinstance(value, (int, float)):
+                usage = value if usage is None else max(usage, value)
+        regain_minutes = entry.get("estimated_time_to_regain_access")
+        if isinstance(regain_minutes, (int, float)):
+            regain_seconds = max(regain_seconds, regain_minutes * 60.0)
+    return usage, regain_seconds
+
+
+def is_throttle_response(response: httpx.Response) -> bool:
+    """Return True for HTTP 429 or a Graph API rate-limit error payload."""
+
+    if response.status_code == 429:
+        return True
+    if response.status_code not in (400, 403):
+        return False
+    try:
+        error = response.json().get("error") or {}
+    except ValueError:
+        return False
+    return error.get("code") in THROTTLE_ERROR_CODES
+
+
+def retry_after_seconds(response: httpx.Response) -> float:
+    """Seconds the server asked us to wait, from ``Retry-After`` or usage headers."""
+
+    _, regain_seconds = parse_usage(response.headers)
+    try:
+        retry_after = float(response.headers.get("retry-after", 0))
+    except ValueError:
+        retry_after = 0.0
+    return max(retry_after, regain_seconds)
+
+
+class AdaptiveTokenBucket:
+    """Token bucket whose refill rate follows the reported API usage.
+
+    Below ``slowdown_percent`` usage the bucket refills at ``rate`` tokens per
+    second. Above it the rate shrinks linearly down to ``min_rate_ratio`` of
+    ``rate`` at 100% usage. A throttled response halves the current rate and
+    blocks every acquirer until the server's retry window has passed. A later
+    response reporting usage below the threshold restores the configured
+    rate at once; successful responses without usage headers raise it back
+    additively, by ``rate / recovery_seconds`` per second since the retry
+    window ended, up to the rate the last reported usage allows.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        *,
+        slowdown_percent: float = 50.0,
+        min_rate_ratio: float = 0.05,
+        recovery_seconds: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ) -> None:
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.slowdown_percent = slowdown_percent
+        self.min_rate = rate * min_rate_ratio
+        self.recovery_rate = rate / recovery_seconds if recovery_seconds > 0 else float("inf")
+        self.usage_percent: Optional[float] = None
+        self.blocked_until = 0.0
+        # Rate allowed by the last reported usage, which recovery climbs back to.
+        self._usage_rate = rate
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = burst
+        self._updated = clock()
+        self._recovered_at = self._updated
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> float:
+        """Wait for a token and return how long the caller waited."""
+
+        waited = 0.0
+        # The lock hands tokens out in arrival order.
+        async with self._lock:
+            while True:
+                now = self._clock()
+                self._refill(now)
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self._tokens) / self.rate
+                await self._sleep(delay)
+                waited += delay
+
+    def observe_usage(self, usage_percent: Optional[float], regain_seconds: float = 0.0) -> None:
+        """Adapt the refill rate to the usage reported by a response."""
+
+        now = self._clock()
+        self._refill(now)
+        if regain_seconds > 0:
+            self.blocked_until = max(self.blocked_until, now + regain_seconds)
+        if usage_percent is None:
+            return
+        self.usage_percent = usage_percent
+        if usage_percent <= self.slowdown_percent:
+            self.rate = self._usage_rate = self.base_rate
+            return
+        headroom = max(0.0, 100.0 - usage_percent) / (100.0 - self.slowdown_percent)
+        self.rate = self._usage_rate = max(self.min_rate, self.base_rate * headroom)
+
+    def succeeded(self) -> None:
+        """Recover a throttled rate after a successful response."""
+
+        now = self._clock()
+        if now <= self._recovered_at:
+            return
+        if self.rate < self._usage_rate:
+            self._refill(now)
+            self.rate = min(self._usage_rate, self.rate + (now - self._recovered_at) * self.recovery_rate)
+        self._recovered_at = now
+
+    def throttled(self, retry_after: float) -> None:
+        """Back off after a rate-limited response."""
+
+        now = self._clock()
+        self._refill(now)
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._tokens = min(self._tokens, 0.0)
+        if retry_after > 0:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+        self._recovered_at = max(now, self.blocked_until)
+
+
+class RetryBudget:
+    """Caps retries to a fraction of requests across every caller.
+
+    Each first attempt deposits ``ratio`` of a retry and each retry withdraws
+    one, so retries can add at most ``ratio`` extra load on top of a steady
+    request rate. ``reserve`` retries are available before any deposit so
+    that a quiet client can still retry a single failure.
+    """
+
+    def __init__(self, ratio: float, reserve: float) -> None:
+        self.ratio = ratio
+        self.capacity = reserve + 100 * ratio
+        self._balance = float(reserve)
+
+    @property
+    def balance(self) -> float:
+        return self._balance
+
+    def record_request(self) -> None:
+        self._balance = min(self.capacity, self._balance + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        if self._balance < 1:
+            return False
+        self._balance -= 1
+        return True
+
+
+class ThrottleMetrics:
+    """Counters describing outgoing Graph API traffic and throttling."""
+
+    __slots__ = ("requests", "throttled", "retries", "retries_denied", "server_errors", "wait_seconds")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.retries_denied = 0
+        self.server_errors = 0
+        self.wait_seconds = 0.0
+
+    def status(self, bucket: AdaptiveTokenBucket, budget: RetryBudget) -> MetaRateLimitStatus:
+        return MetaRateLimitStatus(
+            requests=self.requests,
+            throttled=self.throttled,
+            retries=self.retries,
+            retries_denied=self.retries_denied,
+            server_errors=self.server_errors,
+            wait_seconds=round(self.wait_seconds, 3),
+            current_rate=bucket.rate,
+            usage_percent=bucket.usage_percent,
+            retry_budget=budget.balance,
+        )
@@ -0,0 +1,207 @@
+"""Compact in-memory storage for cached creatives."""
+from __future__ import annotations
+
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .models import Creative
+
+# Platform lists come from a handful of combinations; every record with the same
+# combination shares one tuple.
+_PLATFORM_TUPLES: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value is not None else None
+
+
+def _intern_platforms(platforms: Iterable[str]) -> Tuple[str, ...]:
+    key = tuple(sys.intern(platform) for platform in platforms)
+    return _PLATFORM_TUPLES.setdefault(key, key)
+
+
+def _split_url(url: Optional[str], creative_id: str) -> Tuple[Optional[str], Optional[str]]:
+    """Split ``url`` around the creative ID into interned ``(head, tail)``.
+
+    Ad Library and snapshot URLs embed the creative ID between a fixed prefix
+    and a suffix shared by a whole refresh (such as the access token), so both
+    parts intern to shared strings. URLs without the ID are kept whole in
+    ``head`` with a ``None`` tail.
+    """
+
+    if url is None or not creative_id:
+        return url, None
+    head, separator, tail = url.partition(creative_id)
+    if not separator:
+        return url, None
+    return sys.intern(head), sys.intern(tail)
+
+
+def _join_url(head: Optional[str], tail: Optional[str], creative_id: str) -> Optional[str]:
+    if tail is None:
+        return head
+    return f"{head}{creative_id}{tail}"
+
+
+class CreativeRecord:
+    """Slotted, interned representation of a cached :class:`Creative`.
+
+    Repeated values (publisher IDs, currencies, calls to action, platform
+    lists and URL prefixes) are shared between records instead of being
+    copied into every pydantic model. Titles and bodies are free text with
+    unbounded cardinality, so they are stored as given. Records expose the same field
+    attributes that filters read (``id``, ``publisher_id``, ``platforms``,
+    ``start_time``, ``end_time``) and are turned back into models with
+    :meth:`to_model` only when they leave the repository.
+
+    Records are never modified once stored: an upsert of changed content
+    replaces the record, which also drops the JSON cached by :meth:`to_json`.
+    """
+
+    __slots__ = (
+        "id",
+        "publisher_id",
+        "title",
+        "body",
+        "call_to_action",
+        "platforms",
+        "spend",
+        "currency",
+        "start_time",
+        "end_time",
+        "snapshot_url_head",
+        "snapshot_url_tail",
+        "ad_library_url_head",
+        "ad_library_url_tail",
+        "content_hash",
+        "updated_at",
+        "cluster_id",
+        "_json",
+    )
+
+    id: str
+    publisher_id: str
+    title: Optional[str]
+    body: Optional[str]
+    call_to_action: Optional[str]
+    platforms: Tuple[str, ...]
+    spend: Optional[float]
+    currency: Optional[str]
+    start_time: Optional[datetime]
+    end_time: Optional[datetime]
+    snapshot_url_head: Optional[str]
+    snapshot_url_tail: Optional[str]
+    ad_library_url_head: Optional[str]
+    ad_library_url_tail: Optional[str]
+    content_hash: str
+    # POSIX timestamp of the last content change.
+    updated_at: float
+    # Near-duplicate cluster assigned when the record was stored.
+    cluster_id: Optional[str]
+    # Serialized response body, filled on first use by :meth:`to_json`.
+    _json: Optional[bytes]
+
+    @classmethod
+    def from_model(
+        cls,
+        creative: Creative,
+        content_hash: str,
+        updated_at: float,
+        cluster_id: Optional[str] = None,
+    ) -> "CreativeRecord":
+        record = cls()
+        record.id = creative.id
+        record.publisher_id = sys.intern(creative.publisher_id)
+        record.title = creative.title
+        record.body = creative.body
+        record.call_to_action = _intern(creative.call_to_action)
+        record.platforms = _intern_platforms(creative.platforms)
+        record.spend = creative.spend
+        record.currency = _intern(creative.currency)
+        record.start_time = creative.start_time
+        record.end_time = creative.end_time
+        record.snapshot_url_head, record.snapshot_url_tail = _split_url(creative.snapshot_url, creative.id)
+        record.ad_library_url_head, record.ad_library_url_tail = _split_url(creative.ad_library_url, creative.id)
+        record.content_hash = content_hash
+        record.updated_at = updated_at
+        record.cluster_id = cluster_id
+        record._json = None
+        return record
+
+    @classmethod
+    def from_row(cls, row: Tuple[Any, ...]) -> "CreativeRecord":
+        """Rebuild a record from the values of :data:`app.snapshot.CREATIVE_COLUMNS`.
+
+        Values are taken as stored, without interning or URL splitting;
+        times are ISO 8601 strings.
+        """
+
+        record = cls()
+        (
+            record.id,
+            record.publisher_id,
+            record.title,
+            record.body,
+            record.call_to_action,
+            record.platforms,
+            record.spend,
+            record.currency,
+            start_time,
+            end_time,
+            record.snapshot_url_head,
+            record.snapshot_url_tail,
+            record.ad_library_url_head,
+            record.ad_library_url_tail,
+            record.content_hash,
+            record.updated_at,
+            record.cluster_id,
+        ) = row
+        record.start_time = datetime.fromisoformat(start_time) if start_time is not None else None
+        record.end_time = datetime.fromisoformat(end_time) if end_time is not None else None
+        record._json = None
+        return record
+
+    @property
+    def snapshot_url(self) -> Optional[str]:
+        return _join_url(self.snapshot_url_head, self.snapshot_url_tail, self.id)
+
+    @property
+    def ad_library_url(self) -> Optional[str]:
+        return _join_url(self.ad_library_url_head, self.ad_library_url_tail, self.id)
+
+    def to_model(self) -> Creative:
+        """Materialize the record as a :class:`Creative` without re-validation."""
+
+        return Creative.model_construct(
+            id=self.id,
+            publisher_id=self.publisher_id,
+            snapshot_url=self.snapshot_url,
+            title=self.title,
+            body=self.body,
+            call_to_action=self.call_to_action,
+            platforms=list(self.platforms),
+            spend=self.spend,
+            currency=self.currency,
+            start_time=self.start_time,
+            end_time=self.end_time,
+            ad_library_url=self.ad_library_url,
+        )
+
+    def to_json(self) -> bytes:
+        """Return the creative encoded as JSON, serializing it at most once.
+
+        The bytes match what FastAPI produces for a ``Creative`` response
+        model. Concurrent first calls may both encode; they store equal bytes.
+        """
+
+        encoded = self._json
+        if encoded is None:
+            encoded = self._json = creative_json(self.to_model())
+        return encoded
+
+
+def creative_json(creative: Creative) -> bytes:
+    """Encode ``creative`` as a JSON object."""
+
+    return creative.model_dump_json().encode()
@@ -0,0 +1,216 @@
+"""Incrementally maintained per-publisher, per-day creative aggregates."""
+from __future__ import annotations
+
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Protocol, Sequence, Set, Tuple
+
+from .models import CategoryReport, PublisherReportTotals, ReportBucket
+
+# (metric, key, day ordinal) -> value. Metrics:
+#   "active"   -- difference array of running creatives: +1 on the start day,
+#                 -1 on the day after the end day; key "".
+#   "platform" -- the same per platform; key is the platform.
+#   "started"  -- creatives starting on the day; key "".
+#   "ended"    -- creatives ending on the day; key "".
+#   "spend"    -- reported spend in cents of creatives starting on the day;
+#                 key is the currency ("" when unknown).
+#   "undated"  -- creatives without a start time; key "", day 0.
+AggregateKey = Tuple[str, str, int]
+# Entries are grouped by ranges of this many days, see CreativeAggregates.
+AGGREGATE_CHUNK_DAYS = 32
+
+
+class _Dated(Protocol):
+    publisher_id: str
+    platforms: Sequence[str]
+    spend: Optional[float]
+    currency: Optional[str]
+    start_time: Optional[datetime]
+    end_time: Optional[datetime]
+
+
+def day_ordinal(value: datetime) -> int:
+    """Ordinal of the UTC calendar day of ``value``; naive values are UTC."""
+
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.toordinal()
+
+
+def contributions(creative: _Dated) -> Iterator[Tuple[AggregateKey, int]]:
+    """Aggregate entries one creative adds; accepts models and stored records."""
+
+    if creative.start_time is None:
+        yield ("undated", "", 0), 1
+        return
+    start = day_ordinal(creative.start_time)
+    yield ("active", "", start), 1
+    yield ("started", "", start), 1
+    for platform in creative.platforms:
+        yield ("platform", platform, start), 1
+    if creative.end_time is not None:
+        # A creative ending before it started still counts on its start day.
+        end = max(day_ordinal(creative.end_time), start)
+        yield ("active", "", end + 1), -1
+        yield ("ended", "", end), 1
+        for platform in creative.platforms:
+            yield ("platform", platform, end + 1), -1
+    if creative.spend is not None:
+        yield ("spend", creative.currency or "", start), round(creative.spend * 100)
+
+
+class CreativeAggregates:
+    """Sparse daily aggregates of one publisher's creatives.
+
+    Values are integers (spend is kept in cents), so adding and removing a
+    creative cancels out exactly and zero entries are dropped. The number of
+    entries grows with the number of distinct (metric, day) buckets, not with
+    the number of creatives. Entries are grouped in chunks of
+    ``AGGREGATE_CHUNK_DAYS`` days: :meth:`copy` shares every chunk and a
+    chunk is copied the first time the copy changes it, so updating a copy
+    for one creative costs O(chunks + entries of the days it touches).
+    """
+
+    __slots__ = ("_chunks", "_owned")
+
+    def __init__(self) -> None:
+        self._chunks: Dict[int, Dict[AggregateKey, int]] = {}
+        self._owned: Set[int] = set()
+
+    def copy(self) -> "CreativeAggregates":
+        other = CreativeAggregates()
+        other._chunks = dict(self._chunks)
+        # Both sides now share every chunk.
+        self._owned = set()
+        return other
+
+    @classmethod
+    def from_state(cls, state: Dict[int, Dict[AggregateKey, int]]) -> "CreativeAggregates":
+        """Aggregates sharing the chunks of a :meth:`state` saved earlier."""
+
+        aggregates = cls()
+        aggregates._chunks = state
+        return aggregates
+
+    def state(self) -> Dict[int, Dict[AggregateKey, int]]:
+        """The chunks as plain containers, for :mod:`app.snapshot`; do not modify."""
+
+        return self._chunks
+
+    def __bool__(self) -> bool:
+        return bool(self._chunks)
+
+    def items(self) -> Iterator[Tuple[AggregateKey, int]]:
+        for chunk in self._chunks.values():
+            yield from chunk.items()
+
+    def add(self, key: AggregateKey, delta: int) -> None:
+        index = key[2] // AGGREGATE_CHUNK_DAYS
+        chunk = self._chunks.get(index)
+        if chunk is None or id(chunk) not in self._owned:
+            chunk = self._chunks[index] = dict(chunk or {})
+            self._owned.add(id(chunk))
+        value = chunk.get(key, 0) + delta
+        if value:
+            chunk[key] = value
+        else:
+            chunk.pop(key, None)
+            if not chunk:
+                del self._chunks[index]
+
+    def apply(self, creative: _Dated, sign: int = 1) -> None:
+        """Add ``creative``'s contributions, or remove them with ``sign=-1``."""
+
+        for key, value in contributions(creative):
+            self.add(key, sign * value)
+
+
+def build_report(
+    category_id: str,
+    aggregates: Iterable[Tuple[str, CreativeAggregates]],
+    start: date,
+    end: date,
+) -> CategoryReport:
+    """Fold per-publisher aggregates into a category report for ``[start, end]``.
+
+    Costs O(aggregate entries of the publishers + days in the range): entries
+    before ``start`` only seed the running difference-array sums.
+    """
+
+    first, last = start.toordinal(), end.toordinal()
+    span = last - first + 1
+    active = [0] * span
+    started = [0] * span
+    ended = [0] * span
+    platforms: Dict[str, List[int]] = {}
+    spend: Dict[str, Dict[int, int]] = {}
+    undated = 0
+    totals: List[PublisherReportTotals] = []
+
+    for publisher_id, publisher in aggregates:
+        running = new = gone = 0
+        publisher_spend: Dict[str, int] = {}
+        for (metric, key, day), value in publisher.items():
+            if metric == "undated":
+                undated += value
+                continue
+            if day > last:
+                continue
+            index = max(day - first, 0)
+            if metric == "active":
+                active[index] += value
+                running += value
+            elif metric == "platform":
+                platforms.setdefault(key, [0] * span)[index] += value
+            elif day < first:
+                continue
+            elif metric == "started":
+                started[index] += value
+                new += value
+            elif metric == "ended":
+                ended[index] += value
+                gone += value
+            elif metric == "spend":
+                by_day = spend.setdefault(key, {})
+                by_day[index] = by_day.get(index, 0) + value
+                publisher_spend[key] = publisher_spend.get(key, 0) + value
+        if running or new or gone or publisher_spend:
+            totals.append(
+                PublisherReportTotals(
+                    publisher_id=publisher_id,
+                    active_creatives=running,
+                    new_creatives=new,
+                    ended_creatives=gone,
+                    spend={currency: cents / 100 for currency, cents in sorted(publisher_spend.items()) if cents},
+                )
+            )
+
+    days: List[ReportBucket] = []
+    running = 0
+    running_platforms = dict.fromkeys(platforms, 0)
+    for index in range(span):
+        running += active[index]
+        for platform, deltas in platforms.items():
+            running_platforms[platform] += deltas[index]
+        days.append(
+            ReportBucket(
+                date=date.fromordinal(first + index),
+                active_creatives=running,
+                new_creatives=started[index],
+                ended_creatives=ended[index],
+                platforms={platform: count for platform, count in sorted(running_platforms.items()) if count},
+                spend={
+                    currency: by_day[index] / 100
+                    for currency, by_day in sorted(spend.items())
+                    if by_day.get(index)
+                },
+            )
+        )
+    return CategoryReport(
+        category_id=category_id,
+        start=start,
+        end=end,
+        days=days,
+        publishers=totals,
+        undated_creatives=undated,
+    )
@@ -1,23 +1,637 @@
 """Repository layer for categories, publishers, and creatives."""
 from __future__ import annotations
 
-from collections import defaultdict
+import hashlib
+import heapq
+import itertools
+import operator
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
 
-from .models import Category, Creative, Publisher
+from .metrics import REPOSITORY_OPERATION_DURATION, record_scan, record_upserts, timed
+from .changes import CHANGE_LOG_CAPACITY, ChangeLog
+from .chunked import ChunkedMap
+from .clustering import ClusterIndex, ClusterSnapshot, Signature, minhash_signature
+from .models import (
+    Category,
+    CategoryReport,
+    Creative,
+    CreativeChange,
+    CreativeChangeSummary,
+    CreativeCluster,
+    Publisher,
+    RefreshCheckpoint,
+)
+from .records import CreativeRecord
+from .reports import CreativeAggregates, build_report
+from .search import IndexSnapshot, InvertedIndex
+from .snapshot import CREATIVE_COLUMNS as SNAPSHOT_COLUMNS, encode_snapshot, gc_paused, read_snapshot, write_snapshot
+
+
+def creative_content_hash(creative: Creative) -> str:
+    """Return a stable digest of every field of ``creative``."""
+
+    return hashlib.blake2b(creative.model_dump_json().encode(), digest_size=16).hexdigest()
+
+
+def _isoformat(value: Optional[datetime | date]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _copy(creative: Creative) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """The fields searched and clustered on."""
+
+    return creative.title, creative.body, creative.call_to_action
+
+
+# Placeholder for a MinHash signature that was not computed in advance.
+_UNSIGNED = object()
+
+# Number of hash shards of the creative owner map.
+OWNER_SHARDS = 1024
+
+
+def _owner_shard(creative_id: str) -> int:
+    return hash(creative_id) % OWNER_SHARDS
+
+
+def _posix(value: datetime) -> float:
+    """POSIX time of ``value``; naive values are UTC."""
+
+    return (value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def _running(record: CreativeRecord, at: float) -> bool:
+    """Whether ``record`` has no end time or ends after the POSIX time ``at``."""
+
+    return record.end_time is None or _posix(record.end_time) > at
+
+
+class _PublisherShard:
+    """Creatives of one publisher, their keyset maps and daily aggregates."""
+
+    __slots__ = ("creatives", "keyset", "running", "aggregates")
+
+    def __init__(
+        self,
+        creatives: Optional[ChunkedMap[CreativeRecord]] = None,
+        keyset: Optional[Dict[str, ChunkedMap[CreativeRecord]]] = None,
+        aggregates: Optional[CreativeAggregates] = None,
+        running: Optional[ChunkedMap[CreativeRecord]] = None,
+    ) -> None:
+        # Every creative of the publisher, ordered by ID.
+        self.creatives = creatives if creatives is not None else ChunkedMap()
+        # The creatives of each platform, ordered by ID.
+        self.keyset = keyset if keyset is not None else {}
+        # The creatives still running when stored (see _running), ordered by ID.
+        self.running = running if running is not None else ChunkedMap()
+        self.aggregates = aggregates if aggregates is not None else CreativeAggregates()
+
+
+class RepositorySnapshot:
+    """Consistent, immutable view of an :class:`InMemoryRepository`.
+
+    Snapshots are never modified once published, so every read method can be
+    called from any thread without locking and several calls on the same
+    snapshot see the same state. Obtain one with
+    :meth:`InMemoryRepository.snapshot`; the repository's own read methods
+    each use the snapshot current at the time of the call.
+    """
+
+    __slots__ = (
+        "categories",
+        "publishers",
+        "category_publishers",
+        "publisher_categories",
+        "shards",
+        "owners",
+        "category_creative_counts",
+        "creative_count",
+        "summary_version",
+        "search",
+        "clusters",
+    )
+
+    def __init__(
+        self,
+        categories: Dict[str, Category],
+        publishers: Dict[str, Publisher],
+        category_publishers: Dict[str, Dict[str, None]],
+        publisher_categories: Dict[str, FrozenSet[str]],
+        shards: Dict[str, _PublisherShard],
+        owners: List[Dict[str, str]],
+        category_creative_counts: Dict[str, int],
+        creative_count: int,
+        summary_version: int,
+        search: IndexSnapshot,
+        clusters: ClusterSnapshot,
+    ) -> None:
+        self.categories = categories
+        self.publishers = publishers
+        # Active publisher IDs per category, as insertion-ordered dicts.
+        self.category_publishers = category_publishers
+        # Categories each active publisher is indexed under.
+        self.publisher_categories = publisher_categories
+        self.shards = shards
+        # creative_id -> publisher_id, split into OWNER_SHARDS hash shards.
+        self.owners = owners
+        # Creative counts per category (publisher counts come from the
+        # category index), maintained incrementally.
+        self.category_creative_counts = category_creative_counts
+        self.creative_count = creative_count
+        self.summary_version = summary_version
+        self.search = search
+        self.clusters = clusters
+
+    @classmethod
+    def empty(cls) -> "RepositorySnapshot":
+        owners: List[Dict[str, str]] = [{} for _ in range(OWNER_SHARDS)]
+        return cls({}, {}, {}, {}, {}, owners, {}, 0, 0, InvertedIndex().snapshot, ClusterSnapshot())
+
+    # ------------------------------------------------------------------
+    # Categories and publishers
+    # ------------------------------------------------------------------
+    def list_categories(self) -> List[Category]:
+        return list(self.categories.values())
+
+    def category_counts(self, category_id: str) -> Tuple[int, int]:
+        """Return ``(publisher_count, creative_count)`` for active publishers."""
+
+        publishers = self.category_publishers.get(category_id)
+        return (len(publishers) if publishers else 0, self.category_creative_counts.get(category_id, 0))
+
+    def cache_sizes(self) -> Tuple[int, int]:
+        """Return ``(publisher_count, creative_count)`` over everything stored."""
+
+        return len(self.publishers), self.creative_count
+
+    def get_publisher(self, publisher_id: str) -> Optional[Publisher]:
+        return self.publishers.get(publisher_id)
+
+    def list_publishers(self, *, include_inactive: bool = False) -> List[Publisher]:
+        if include_inactive:
+            return list(self.publishers.values())
+        return [p for p in self.publishers.values() if p.status == "active"]
+
+    def list_publishers_by_category(self, category_id: str) -> List[Publisher]:
+        publisher_ids = self.category_publishers.get(category_id, {})
+        return [self.publishers[publisher_id] for publisher_id in publisher_ids]
+
+    # ------------------------------------------------------------------
+    # Creatives
+    # ------------------------------------------------------------------
+    def list_creatives_for_publishers(self, publisher_ids: Iterable[str]) -> List[Creative]:
+        creatives: List[Creative] = []
+        for publisher_id in dict.fromkeys(publisher_ids):
+            shard = self.shards.get(publisher_id)
+            if shard is not None:
+                creatives.extend(record.to_model() for record in shard.creatives.values())
+        return creatives
+
+    def get_creative(self, creative_id: str) -> Optional[Creative]:
+        """Look a creative up by ID through the owner map."""
+
+        owner = self.owners[_owner_shard(creative_id)].get(creative_id)
+        return self.shards[owner].creatives[creative_id].to_model() if owner is not None else None
+
+    def content_hash(self, creative_id: str) -> Optional[str]:
+        owner = self.owners[_owner_shard(creative_id)].get(creative_id)
+        return self.shards[owner].creatives[creative_id].content_hash if owner is not None else None
+
+    def list_creatives_by_category(self, category_id: str) -> List[Creative]:
+        return self.list_creatives_for_publishers(self.category_publishers.get(category_id, {}))
+
+    def page_creatives_for_category(
+        self,
+        category_id: str,
+        *,
+        limit: int,
+        after: Optional[str] = None,
+        publisher_id: Optional[str] = None,
+        platform: Optional[str] = None,
+        predicate: Optional[Callable[[CreativeRecord], bool]] = None,
+        max_scanned: Optional[int] = None,
+        open_at: Optional[datetime] = None,
+        changed_since: Optional[datetime] = None,
+    ) -> Tuple[List[Creative], Optional[str]]:
+        """Return one page of a category's creatives ordered by creative ID.
+
+        See :meth:`_page_records` for the meaning of the arguments.
+        """
+
+        page, next_after = self._page_records(
+            category_id,
+            limit=limit,
+            after=after,
+            publisher_id=publisher_id,
+            platform=platform,
+            predicate=predicate,
+            max_scanned=max_scanned,
+            open_at=open_at,
+            changed_since=changed_since,
+        )
+        return [record.to_model() for record in page], next_after
+
+    def page_creative_json_for_category(
+        self,
+        category_id: str,
+        *,
+        limit: int,
+        after: Optional[str] = None,
+        publisher_id: Optional[str] = None,
+        platform: Optional[str] = None,
+        predicate: Optional[Callable[[CreativeRecord], bool]] = None,
+        max_scanned: Optional[int] = None,
+        open_at: Optional[datetime] = None,
+    ) -> Tuple[List[bytes], Optional[str]]:
+        """Like :meth:`page_creatives_for_category`, with JSON-encoded creatives."""
+
+        page, next_after = self._page_records(
+            category_id,
+            limit=limit,
+            after=after,
+            publisher_id=publisher_id,
+            platform=platform,
+            predicate=predicate,
+            max_scanned=max_scanned,
+            open_at=open_at,
+        )
+        return [record.to_json() for record in page], next_after
+
+    def _page_records(
+        self,
+        category_id: str,
+        *,
+        limit: int,
+        after: Optional[str] = None,
+        publisher_id: Optional[str] = None,
+        platform: Optional[str] = None,
+        predicate: Optional[Callable[[CreativeRecord], bool]] = None,
+        max_scanned: Optional[int] = None,
+        open_at: Optional[datetime] = None,
+        changed_since: Optional[datetime] = None,
+    ) -> Tuple[List[CreativeRecord], Optional[str]]:
+        """Return one page of a category's stored records ordered by creative ID.
+
+        ``after`` is the last creative ID of the previous page. Publisher and
+        platform filters select the keyset maps to merge, so a page costs
+        O(page size * log publishers). ``predicate`` and ``changed_since`` (only
+        creatives inserted or modified after it) are evaluated on the merged
+        stream; the predicate receives stored records, which expose the same
+        field attributes as :class:`Creative`. The second element of the result
+        is the ``after`` value for the next page, or ``None`` on the last page.
+        Once ``max_scanned`` records have been looked at, the next record the
+        filters reject ends the page, possibly short or empty, with that
+        record's ID as the ``after`` value, so a selective filter costs at most
+        ``max_scanned + limit`` records per call.
+
+        ``open_at`` keeps only creatives still running at that time (without
+        an end time or ending after it). It reads the shards' ``running`` maps
+        of creatives that were running when stored, or the platform map when
+        that is smaller, so the few creatives that ended since they were
+        stored are the only ones it looks at and rejects.
+        """
+
+        publisher_ids = self.category_publishers.get(category_id, {})
+        if publisher_id is not None:
+            publisher_ids = {publisher_id: None} if publisher_id in publisher_ids else {}
+        streams = []
+        for member_id in publisher_ids:
+            shard = self.shards.get(member_id)
+            if shard is None:
+                continue
+            records = shard.creatives if platform is None else shard.keyset.get(platform)
+            if records and open_at is not None and len(shard.running) < len(records):
+                records = shard.running
+            if records:
+                streams.append(records.items(after))
+
+        since = changed_since.timestamp() if changed_since is not None else None
+        at = _posix(open_at) if open_at is not None else None
+        page: List[CreativeRecord] = []
+        next_after: Optional[str] = None
+        scanned = 0
+        for _, record in heapq.merge(*streams, key=lambda item: item[0]):
+            scanned += 1
+            if (
+                (since is not None and record.updated_at <= since)
+                or (at is not None and not _running(record, at))
+                or (platform is not None and platform not in record.platforms)
+                or (predicate is not None and not predicate(record))
+            ):
+                if max_scanned is not None and scanned >= max_scanned:
+                    next_after = record.id
+                    break
+                continue
+            if len(page) == limit:
+                next_after = page[-1].id
+                break
+            page.append(record)
+        record_scan("memory", "page_creatives_for_category", scanned, len(page))
+        return page, next_after
+
+    def page_clusters_for_category(
+        self,
+        category_id: str,
+        *,
+        limit: int,
+        after: Optional[str] = None,
+        publisher_id: Optional[str] = None,
+        platform: Optional[str] = None,
+        predicate: Optional[Callable[[CreativeRecord], bool]] = None,
+        max_scanned: Optional[int] = None,
+        open_at: Optional[datetime] = None,
+    ) -> Tuple[List[CreativeCluster], Optional[str]]:
+        """Return one page of a category's near-duplicate clusters.
+
+        Takes the same filters as :meth:`page_creatives_for_category`. Each
+        cluster is represented by its lowest-ID creative passing the filters
+        and sized by the number of creatives passing them, and the page is
+        ordered by representative ID, so ``after`` is the last representative
+        of the previous page. A creative is skipped as soon as a lower-ID
+        member of its cluster passes the filters, which costs one look at
+        that member per creative; sizes are only counted for the clusters
+        returned.
+        """
+
+        publisher_ids = self.category_publishers.get(category_id, {})
+        if publisher_id is not None:
+            publisher_ids = {publisher_id: None} if publisher_id in publisher_ids else {}
+        at = _posix(open_at) if open_at is not None else None
+
+        def visible(member_id: str, member_publisher_id: str) -> bool:
+            if member_publisher_id not in publisher_ids:
+                return False
+            record = self.shards[member_publisher_id].creatives[member_id]
+            if platform is not None and platform not in record.platforms:
+                return False
+            if at is not None and not _running(record, at):
+                return False
+            return predicate is None or predicate(record)
+
+        def represents(record: CreativeRecord) -> bool:
+            if predicate is not None and not predicate(record):
+                return False
+            if record.cluster_id is None:
+                return True
+            for member_id, member_publisher_id in self.clusters.members(record.cluster_id):
+                if member_id >= record.id:
+                    return True
+                if visible(member_id, member_publisher_id):
+                    return False
+            return True
+
+        page, next_after = self._page_records(
+            category_id,
+            limit=limit,
+            after=after,
+            publisher_id=publisher_id,
+            platform=platform,
+            predicate=represents,
+            max_scanned=max_scanned,
+            open_at=open_at,
+        )
+        clusters = []
+        for record in page:
+            size = 1
+            if record.cluster_id is not None:
+                size = sum(visible(*member) for member in self.clusters.members(record.cluster_id))
+            clusters.append(CreativeCluster(cluster_id=record.cluster_id, size=size, creative=record.to_model()))
+        return clusters, next_after
+
+    def search_creatives(
+        self,
+        category_id: str,
+        query: str,
+        *,
+        limit: int,
+        offset: int = 0,
+    ) -> Tuple[List[Creative], int]:
+        """Full-text search over a category's creatives ranked by BM25.
+
+        Returns one page of matching creatives and the total number of matches.
+        """
+
+        records, total = self._search_records(category_id, query, limit=limit, offset=offset)
+        return [record.to_model() for record in records], total
+
+    def search_creative_json(
+        self,
+        category_id: str,
+        query: str,
+        *,
+        limit: int,
+        offset: int = 0,
+    ) -> Tuple[List[bytes], int]:
+        """Like :meth:`search_creatives`, with JSON-encoded creatives."""
+
+        records, total = self._search_records(category_id, query, limit=limit, offset=offset)
+        return [record.to_json() for record in records], total
+
+    def _search_records(
+        self,
+        category_id: str,
+        query: str,
+        *,
+        limit: int,
+        offset: int,
+    ) -> Tuple[List[CreativeRecord], int]:
+        publisher_ids = self.category_publishers.get(category_id)
+        if not publisher_ids:
+            return [], 0
+        hits, total = self.search.search(query, publisher_ids, limit=limit, offset=offset)
+        return [self.shards[partition].creatives[doc_id] for doc_id, partition, _ in hits], total
+
+    def creatives_grouped_by_publisher(self, publisher_ids: Iterable[str]) -> Dict[str, List[Creative]]:
+        grouped: Dict[str, List[Creative]] = {}
+        for creative in self.list_creatives_for_publishers(publisher_ids):
+            grouped.setdefault(creative.publisher_id, []).append(creative)
+        return grouped
+
+    def category_report(
+        self,
+        category_id: str,
+        start: date,
+        end: date,
+        *,
+        publisher_id: Optional[str] = None,
+    ) -> CategoryReport:
+        """Daily activity of a category's active publishers from their aggregates.
+
+        Costs O(aggregate buckets of the publishers), independent of how many
+        creatives they have.
+        """
+
+        publisher_ids = self.category_publishers.get(category_id, {})
+        if publisher_id is not None:
+            publisher_ids = {publisher_id: None} if publisher_id in publisher_ids else {}
+        aggregates = (
+            (member_id, self.shards[member_id].aggregates) for member_id in publisher_ids if member_id in self.shards
+        )
+        return build_report(category_id, aggregates, start, end)
+
+
+class _SnapshotWriter:
+    """Working copy of a snapshot for one write batch.
+
+    Starts out sharing every container with the published snapshot; a
+    container is copied the first time the batch modifies it, and later
+    modifications in the same batch reuse the copy. A write therefore costs
+    O(size of the touched containers): the top-level maps, which hold one
+    entry per category or publisher, one owner map shard per written
+    creative, and in the shards of the publishers whose creatives change the
+    chunks and aggregate day ranges that change (see :class:`ChunkedMap`).
+    """
+
+    def __init__(self, base: RepositorySnapshot) -> None:
+        self.base = base
+        self.categories = base.categories
+        self.publishers = base.publishers
+        self.category_publishers = base.category_publishers
+        self.publisher_categories = base.publisher_categories
+        self.shards = base.shards
+        self.owners = base.owners
+        self.category_creative_counts = base.category_creative_counts
+        self.creative_count = base.creative_count
+        self.summary_version = base.summary_version
+        # (kind, record, category_ids) for the change log, appended on publish.
+        self.changes: List[Tuple[str, CreativeRecord, FrozenSet[str]]] = []
+        self.owned: Set[int] = set()
+
+    def own(self, name: str) -> dict:
+        container = getattr(self, name)
+        if id(container) not in self.owned:
+            container = dict(container)
+            setattr(self, name, container)
+            self.owned.add(id(container))
+        return container
+
+    def replace(self, name: str, container: Any) -> None:
+        """Swap in a container built outside the batch, which the batch then owns."""
+
+        setattr(self, name, container)
+        self.owned.add(id(container))
+
+    def category_members(self, category_id: str) -> Dict[str, None]:
+        category_publishers = self.own("category_publishers")
+        members = category_publishers.get(category_id)
+        if members is None or id(members) not in self.owned:
+            members = category_publishers[category_id] = dict(members or {})
+            self.owned.add(id(members))
+        return members
+
+    def shard(self, publisher_id: str) -> _PublisherShard:
+        shards = self.own("shards")
+        shard = shards.get(publisher_id)
+        if shard is None or id(shard) not in self.owned:
+            shard = shards[publisher_id] = (
+                _PublisherShard(
+                    shard.creatives.copy(), dict(shard.keyset), shard.aggregates.copy(), shard.running.copy()
+                )
+                if shard is not None
+                else _PublisherShard()
+            )
+            self.owned.update((id(shard), id(shard.creatives), id(shard.running)))
+        return shard
+
+    def keyset(self, shard: _PublisherShard, platform: str) -> ChunkedMap[CreativeRecord]:
+        records = shard.keyset.get(platform)
+        if records is None or id(records) not in self.owned:
+            records = shard.keyset[platform] = records.copy() if records is not None else ChunkedMap()
+            self.owned.add(id(records))
+        return records
+
+    def owner_of(self, creative_id: str) -> Optional[str]:
+        return self.owners[_owner_shard(creative_id)].get(creative_id)
+
+    def set_owner(self, creative_id: str, publisher_id: str) -> None:
+        if id(self.owners) not in self.owned:
+            self.owners = list(self.owners)
+            self.owned.add(id(self.owners))
+        index = _owner_shard(creative_id)
+        owners = self.owners[index]
+        if id(owners) not in self.owned:
+            owners = self.owners[index] = dict(owners)
+            self.owned.add(id(owners))
+        owners[creative_id] = publisher_id
+
+    def build(self, search: IndexSnapshot, clusters: ClusterSnapshot) -> RepositorySnapshot:
+        if (
+            not self.owned
+            and self.summary_version == self.base.summary_version
+            and search is self.base.search
+            and clusters is self.base.clusters
+        ):
+            return self.base
+        return RepositorySnapshot(
+            self.categories,
+            self.publishers,
+            self.category_publishers,
+            self.publisher_categories,
+            self.shards,
+            self.owners,
+            self.category_creative_counts,
+            self.creative_count,
+            self.summary_version,
+            search,
+            clusters,
+        )
 
 
 class InMemoryRepository:
-    """Simple in-memory repository backed by JSON seed data."""
+    """Simple in-memory repository backed by JSON seed data.
 
-    def __init__(self, seed_path: Optional[Path] = None):
-        self._categories: Dict[str, Category] = {}
-        self._publishers: Dict[str, Publisher] = {}
-        self._creatives: Dict[str, Creative] = {}
+    Creatives are stored as compact :class:`CreativeRecord` objects and only
+    materialized as pydantic models by the methods that return them.
+
+    All state lives in an immutable :class:`RepositorySnapshot`. Readers use
+    the current snapshot without taking any lock. Writers are serialized by a
+    lock, apply their changes copy-on-write (see :class:`_SnapshotWriter`) and
+    publish the next snapshot with a single reference assignment, so readers
+    never observe a batch while it is being applied. A batch that raises is
+    published up to the failure: the writer-only search and cluster indexes
+    are updated in place and cannot be rolled back, and the snapshot must
+    agree with them. Stored models are treated as immutable: updates replace
+    them instead of mutating them in place.
+    """
+
+    def __init__(self, seed_path: Optional[Path] = None, *, change_log_capacity: int = CHANGE_LOG_CAPACITY):
+        self._snapshot = RepositorySnapshot.empty()
+        self._write_lock = threading.Lock()
+        self._changes = ChangeLog(change_log_capacity)
+        # Writer-only state, never read outside ``_writing``.
+        self._search_index = InvertedIndex()
+        self._cluster_index = ClusterIndex()
+        # publisher_id -> (country, ad_type) -> checkpoint; guarded by the write lock.
+        self._checkpoints: Dict[str, Dict[Tuple[str, str], RefreshCheckpoint]] = {}
         if seed_path and seed_path.exists():
             self.load_seed(seed_path)
 
+    def snapshot(self) -> RepositorySnapshot:
+        """Return the current snapshot for several reads of one consistent state."""
+
+        return self._snapshot
+
+    @contextmanager
+    def _writing(self) -> Iterator[_SnapshotWriter]:
+        with self._write_lock:
+            writer = _SnapshotWriter(self._snapshot)
+            try:
+                yield writer
+            finally:
+                # Published even when the batch fails part-way, so the snapshot
+                # always agrees with the writer-only state and the indexes.
+                self._snapshot = writer.build(self._search_index.commit(), self._cluster_index.commit())
+                self._changes.extend(writer.changes)
+
     # ------------------------------------------------------------------
     # Seed loading
     # ------------------------------------------------------------------
@@ -31,70 +645,583 @@ class InMemoryRepository:
             self.upsert_category(Category(**category))
         for publisher in raw.get("publishers", []):
             self.upsert_publisher(Publisher(**publisher))
-        for creative in raw.get("creatives", []):
-            self.upsert_creative(Creative(**creative))
+        self.upsert_creatives_batch(Creative(**creative) for creative in raw.get("creatives", []))
+
+    def dump_snapshot(self, path: Path) -> int:
+        """Write every category, publisher, creative and checkpoint to ``path``.
+
+        The file format is described in :mod:`app.snapshot`; besides the
+        records it holds the search and cluster indexes and the report
+        aggregates. Only the writer-only index state and the checkpoints are
+        copied under the write lock, so the file holds one consistent state;
+        the published snapshot never changes, so records are encoded after
+        the lock is released. Returns the size of the file in bytes.
+        """
+
+        with self._write_lock:
+            snapshot = self._snapshot
+            search = self._search_index.state()
+            clusters = self._cluster_index.state()
+            change_seq = self._changes.seq
+            checkpoints = [
+                (
+                    checkpoint.publisher_id,
+                    checkpoint.country,
+                    checkpoint.ad_type,
+                    _isoformat(checkpoint.delivery_date_min),
+                    checkpoint.cursor,
+                    _isoformat(checkpoint.full_sweep_at),
+                )
+                for queries in self._checkpoints.values()
+                for checkpoint in queries.values()
+            ]
+        rows = [
+            (
+                record.id,
+                record.publisher_id,
+                record.title,
+                record.body,
+                record.call_to_action,
+                record.platforms,
+                record.spend,
+                record.currency,
+                _isoformat(record.start_time),
+                _isoformat(record.end_time),
+                record.snapshot_url_head,
+                record.snapshot_url_tail,
+                record.ad_library_url_head,
+                record.ad_library_url_tail,
+                record.content_hash,
+                record.updated_at,
+                record.cluster_id,
+            )
+            for shard in snapshot.shards.values()
+            for record in shard.creatives.values()
+        ]
+        columns = list(zip(*rows)) or [()] * len(SNAPSHOT_COLUMNS)
+        data = encode_snapshot(
+            {
+                "categories": [(category.id, category.name) for category in snapshot.categories.values()],
+                "publishers": [
+                    (p.id, p.name, tuple(p.category_ids), p.country, p.status, p.notes)
+                    for p in snapshot.publishers.values()
+                ],
+                "creatives": dict(zip(SNAPSHOT_COLUMNS, map(list, columns))),
+                "aggregates": {
+                    publisher_id: shard.aggregates.state() for publisher_id, shard in snapshot.shards.items()
+                },
+                "search": search,
+                "clusters": clusters,
+                "checkpoints": checkpoints,
+                "change_seq": change_seq,
+            }
+        )
+        return write_snapshot(path, data)
+
+    def load_snapshot(self, path: Path) -> None:
+        """Replace the repository's state with a file written by :meth:`dump_snapshot`.
+
+        Records are built from the stored values and the indexes and report
+        aggregates are taken over as stored, so loading costs little more
+        than decoding the file: nothing is validated, tokenized or hashed
+        again. The new state is assembled before the write lock is taken and
+        published at once. Raises :class:`app.snapshot.SnapshotFormatError`
+        for unreadable files, before anything is changed.
+        """
+
+        with gc_paused():
+            payload = read_snapshot(path)
+            categories = {
+                category_id: Category.model_construct(id=category_id, name=name)
+                for category_id, name in payload["categories"]
+            }
+            publishers = {
+                publisher_id: Publisher.model_construct(
+                    id=publisher_id,
+                    name=name,
+                    category_ids=list(category_ids),
+                    country=country,
+                    status=status,
+                    notes=notes,
+                )
+                for publisher_id, name, category_ids, country, status, notes in payload["publishers"]
+            }
+
+            # Rows come grouped by publisher and ordered by ID within a publisher.
+            columns = payload["creatives"]
+            records = list(map(CreativeRecord.from_row, zip(*(columns[name] for name in SNAPSHOT_COLUMNS))))
+            shards: Dict[str, _PublisherShard] = {}
+            owners: List[Dict[str, str]] = [{} for _ in range(OWNER_SHARDS)]
+            aggregates = payload["aggregates"]
+            for publisher_id, group in itertools.groupby(records, operator.attrgetter("publisher_id")):
+                publisher_records = list(group)
+                platforms: Dict[str, List[CreativeRecord]] = {}
+                running: List[CreativeRecord] = []
+                for record in publisher_records:
+                    owners[_owner_shard(record.id)][record.id] = publisher_id
+                    for platform in record.platforms:
+                        platforms.setdefault(platform, []).append(record)
+                    if _running(record, record.updated_at):
+                        running.append(record)
+                shards[publisher_id] = _PublisherShard(
+                    ChunkedMap.from_sorted([record.id for record in publisher_records], publisher_records),
+                    {
+                        platform: ChunkedMap.from_sorted([record.id for record in members], members)
+                        for platform, members in platforms.items()
+                    },
+                    CreativeAggregates.from_state(aggregates[publisher_id]),
+                    ChunkedMap.from_sorted([record.id for record in running], running),
+                )
+            search_index = InvertedIndex.from_state(payload["search"])
+            cluster_index = ClusterIndex.from_state(payload["clusters"])
+            checkpoints: Dict[str, Dict[Tuple[str, str], RefreshCheckpoint]] = {}
+            for publisher_id, country, ad_type, delivery_date_min, cursor, full_sweep_at in payload["checkpoints"]:
+                checkpoint = RefreshCheckpoint.model_construct(
+                    publisher_id=publisher_id,
+                    country=country,
+                    ad_type=ad_type,
+                    delivery_date_min=date.fromisoformat(delivery_date_min) if delivery_date_min else None,
+                    cursor=cursor,
+                    full_sweep_at=_parse_datetime(full_sweep_at),
+                )
+                checkpoints.setdefault(publisher_id, {})[country, ad_type] = checkpoint
+
+        with self._writing() as writer:
+            self._search_index = search_index
+            self._cluster_index = cluster_index
+            self._checkpoints = checkpoints
+            self._changes.resume(payload["change_seq"])
+            writer.replace("categories", categories)
+            writer.replace("publishers", publishers)
+            writer.replace("shards", shards)
+            writer.replace("owners", owners)
+            writer.creative_count = len(records)
+            # Filled from the publishers below.
+            writer.replace("category_publishers", {})
+            writer.replace("publisher_categories", {})
+            writer.replace("category_creative_counts", {})
+            writer.summary_version += 1
+            for publisher in publishers.values():
+                self._reindex_publisher(writer, publisher)
 
     # ------------------------------------------------------------------
     # Category operations
     # ------------------------------------------------------------------
     def upsert_category(self, category: Category) -> None:
-        self._categories[category.id] = category
+        with self._writing() as writer:
+            writer.own("categories")[category.id] = category
+            writer.summary_version += 1
 
     def list_categories(self) -> List[Category]:
-        return list(self._categories.values())
+        return self._snapshot.list_categories()
+
+    @property
+    def summary_version(self) -> int:
+        """Counter bumped whenever a category summary may have changed."""
+
+        return self._snapshot.summary_version
+
+    def cache_sizes(self) -> Tuple[int, int]:
+        """Return ``(publisher_count, creative_count)`` over everything stored."""
+
+        return self._snapshot.cache_sizes()
+
+    def category_counts(self, category_id: str) -> Tuple[int, int]:
+        """Return ``(publisher_count, creative_count)`` for active publishers."""
+
+        return self._snapshot.category_counts(category_id)
 
     # ------------------------------------------------------------------
     # Publisher operations
     # ------------------------------------------------------------------
     def upsert_publisher(self, publisher: Publisher) -> Publisher:
-        self._publishers[publisher.id] = publisher
+        with self._writing() as writer:
+            writer.own("publishers")[publisher.id] = publisher
+            self._reindex_publisher(writer, publisher)
         return publisher
 
+    def _reindex_publisher(self, writer: _SnapshotWriter, publisher: Publisher) -> None:
+        """Sync the category index with the publisher's current state.
+
+        Only active publishers are indexed; the previously indexed categories
+        are kept alongside so that counts can be moved between categories.
+        """
+
+        previous = writer.publisher_categories.get(publisher.id, frozenset())
+        current = frozenset(publisher.category_ids) if publisher.status == "active" else frozenset()
+        if previous == current:
+            return
+        shard = writer.shards.get(publisher.id)
+        creative_count = len(shard.creatives) if shard is not None else 0
+        counts = writer.own("category_creative_counts")
+        for category_id in previous - current:
+            members = writer.category_members(category_id)
+            members.pop(publisher.id, None)
+            if not members:
+                del writer.category_publishers[category_id]
+            counts[category_id] = counts.get(category_id, 0) - creative_count
+        for category_id in current - previous:
+            writer.category_members(category_id)[publisher.id] = None
+            counts[category_id] = counts.get(category_id, 0) + creative_count
+        writer.summary_version += 1
+        publisher_categories = writer.own("publisher_categories")
+        if current:
+            publisher_categories[publisher.id] = current
+        else:
+            publisher_categories.pop(publisher.id, None)
+
     def generate_publisher_id(self) -> str:
-        return f"pub_{len(self._publishers) + 1:04d}"
+        return f"pub_{len(self._snapshot.publishers) + 1:04d}"
 
     def get_publisher(self, publisher_id: str) -> Optional[Publisher]:
-        return self._publishers.get(publisher_id)
+        return self._snapshot.get_publisher(publisher_id)
 
     def list_publishers(self, *, include_inactive: bool = False) -> List[Publisher]:
-        if include_inactive:
-            return list(self._publishers.values())
-        return [p for p in self._publishers.values() if p.status == "active"]
+        return self._snapshot.list_publishers(include_inactive=include_inactive)
 
     def list_publishers_by_category(self, category_id: str) -> List[Publisher]:
-        return [
-            publisher
-            for publisher in self.list_publishers()
-            if category_id in publisher.category_ids
-        ]
+        return self._snapshot.list_publishers_by_category(category_id)
 
     def archive_publisher(self, publisher_id: str) -> Optional[Publisher]:
-        publisher = self._publishers.get(publisher_id)
-        if publisher:
-            publisher.status = "inactive"
-            self._publishers[publisher_id] = publisher
-        return publisher
+        with self._writing() as writer:
+            publisher = writer.publishers.get(publisher_id)
+            if publisher is None:
+                return None
+            archived = publisher.model_copy(update={"status": "inactive"})
+            writer.own("publishers")[publisher_id] = archived
+            self._reindex_publisher(writer, archived)
+        return archived
 
     # ------------------------------------------------------------------
     # Creative operations
     # ------------------------------------------------------------------
     def upsert_creative(self, creative: Creative) -> None:
-        self._creatives[creative.id] = creative
+        content_hash = creative_content_hash(creative)
+        signature = minhash_signature(_copy(creative))
+        with self._writing() as writer:
+            previous_hash = self._content_hash(writer, creative.id)
+            if previous_hash != content_hash:
+                kind = "inserted" if previous_hash is None else "updated"
+                self._upsert_creative(writer, creative, content_hash, kind, signature)
+
+    def _stored(self, writer: _SnapshotWriter, creative_id: str) -> Optional[CreativeRecord]:
+        owner = writer.owner_of(creative_id)
+        return writer.shards[owner].creatives[creative_id] if owner is not None else None
+
+    def _content_hash(self, writer: _SnapshotWriter, creative_id: str) -> Optional[str]:
+        record = self._stored(writer, creative_id)
+        return record.content_hash if record is not None else None
+
+    def _upsert_creative(
+        self,
+        writer: _SnapshotWriter,
+        creative: Creative,
+        content_hash: str,
+        kind: str,
+        signature: Optional[Signature],
+    ) -> None:
+        """Store ``creative``; ``signature`` is the MinHash of its copy, computed before the write lock."""
+
+        cluster_id = self._cluster_index.add_signature(creative.id, creative.publisher_id, signature)
+        record = CreativeRecord.from_model(creative, content_hash, time.time(), cluster_id)
+        self._store(writer, record)
+        self._search_index.add(creative.id, creative.publisher_id, _copy(creative))
+        categories = writer.publisher_categories.get(record.publisher_id, frozenset())
+        writer.changes.append((kind, record, categories))
+
+    def _store(self, writer: _SnapshotWriter, record: CreativeRecord) -> None:
+        """Place ``record`` in its publisher's shard, replacing the stored version."""
+
+        previous = self._stored(writer, record.id)
+        if previous is not None:
+            writer.shard(previous.publisher_id).aggregates.apply(previous, -1)
+        if previous is not None and previous.publisher_id != record.publisher_id:
+            old_shard = writer.shard(previous.publisher_id)
+            old_shard.creatives.discard(record.id, writer.owned)
+            self._reindex_keyset(writer, old_shard, record.id, previous, None)
+            if not old_shard.creatives:
+                del writer.shards[previous.publisher_id]
+            self._adjust_creative_counts(writer, previous.publisher_id, -1)
+            previous = None
+            moved = True
+        else:
+            moved = False
+        if previous is None:
+            self._adjust_creative_counts(writer, record.publisher_id, 1)
+            if not moved:
+                writer.creative_count += 1
+        shard = writer.shard(record.publisher_id)
+        shard.creatives.set(record.id, record, writer.owned)
+        shard.aggregates.apply(record)
+        self._reindex_keyset(writer, shard, record.id, previous, record)
+        if previous is None:
+            writer.set_owner(record.id, record.publisher_id)
+
+    @staticmethod
+    def _reindex_keyset(
+        writer: _SnapshotWriter,
+        shard: _PublisherShard,
+        creative_id: str,
+        previous: Optional[CreativeRecord],
+        current: Optional[CreativeRecord],
+    ) -> None:
+        """Move the creative between keyset maps; every map holds the stored record."""
+
+        previous_platforms = set(previous.platforms) if previous is not None else set()
+        current_platforms = set(current.platforms) if current is not None else set()
+        for platform in previous_platforms - current_platforms:
+            if platform not in shard.keyset:
+                continue
+            records = writer.keyset(shard, platform)
+            records.discard(creative_id, writer.owned)
+            if not records:
+                del shard.keyset[platform]
+        if current is not None:
+            for platform in current_platforms:
+                writer.keyset(shard, platform).set(creative_id, current, writer.owned)
+        if current is not None and _running(current, current.updated_at):
+            shard.running.set(creative_id, current, writer.owned)
+        elif previous is not None:
+            shard.running.discard(creative_id, writer.owned)
+
+    @timed(REPOSITORY_OPERATION_DURATION, "memory", "upsert_creatives_batch")
+    def upsert_creatives_batch(
+        self,
+        creatives: Iterable[Creative],
+        *,
+        publisher_ids: Optional[Iterable[str]] = None,
+        now: Optional[datetime] = None,
+    ) -> CreativeChangeSummary:
+        """Apply a batch of creatives, writing only what changed.
+
+        Incoming creatives are compared with the cached ones by content hash:
+        new IDs are inserted, changed ones updated and identical ones skipped.
+        When ``publisher_ids`` is given the batch is treated as the complete
+        set of live creatives for those publishers, and their cached creatives
+        that are missing from it and still open are end-dated at ``now``. A
+        batch that completes becomes visible to readers at once; one that
+        raises publishes the changes applied before the failure.
+
+        Content hashes, and MinHash signatures of the creatives that differ
+        from the published snapshot, are computed before the write lock is
+        taken, so concurrent batches only serialize on the index updates.
+        """
+
+        published = self._snapshot
+        prepared: List[Tuple[Creative, str, Any]] = []
+        for creative in creatives:
+            content_hash = creative_content_hash(creative)
+            changed = published.content_hash(creative.id) != content_hash
+            prepared.append((creative, content_hash, minhash_signature(_copy(creative)) if changed else _UNSIGNED))
+
+        summary = CreativeChangeSummary()
+        seen: Set[str] = set()
+        with self._writing() as writer:
+            for creative, content_hash, signature in prepared:
+                seen.add(creative.id)
+                previous_hash = self._content_hash(writer, creative.id)
+                if previous_hash == content_hash:
+                    summary.unchanged += 1
+                    continue
+                if signature is _UNSIGNED:
+                    # Changed by a write that landed after the batch was prepared.
+                    signature = minhash_signature(_copy(creative))
+                kind = "inserted" if previous_hash is None else "updated"
+                getattr(summary, kind).append(creative.id)
+                self._upsert_creative(writer, creative, content_hash, kind, signature)
+
+            if publisher_ids is not None:
+                ended_at = now or datetime.now(timezone.utc)
+                for publisher_id in dict.fromkeys(publisher_ids):
+                    shard = writer.shards.get(publisher_id)
+                    if shard is None:
+                        continue
+                    missing = [r for r in shard.running.values() if r.id not in seen and r.end_time is None]
+                    for record in missing:
+                        ended = record.to_model().model_copy(update={"end_time": ended_at})
+                        # End-dating leaves the copy, and so its signature, as it was.
+                        signature = self._cluster_index.signature(record.id)
+                        self._upsert_creative(writer, ended, creative_content_hash(ended), "ended", signature)
+                        summary.ended.append(record.id)
+        record_upserts("memory", summary)
+        return summary
+
+    def _adjust_creative_counts(self, writer: _SnapshotWriter, publisher_id: str, delta: int) -> None:
+        categories = writer.publisher_categories.get(publisher_id)
+        if not categories:
+            return
+        counts = writer.own("category_creative_counts")
+        for category_id in categories:
+            counts[category_id] = counts.get(category_id, 0) + delta
+        writer.summary_version += 1
+
+    def get_creative(self, creative_id: str) -> Optional[Creative]:
+        return self._snapshot.get_creative(creative_id)
 
     def list_creatives_for_publishers(self, publisher_ids: Iterable[str]) -> List[Creative]:
-        publisher_set = set(publisher_ids)
-        return [
-            creative
-            for creative in self._creatives.values()
-            if creative.publisher_id in publisher_set
-        ]
+        return self._snapshot.list_creatives_for_publishers(publisher_ids)
 
+    @timed(REPOSITORY_OPERATION_DURATION, "memory", "list_creatives_by_category")
     def list_creatives_by_category(self, category_id: str) -> List[Creative]:
-        publisher_ids = [p.id for p in self.list_publishers_by_category(category_id)]
-        return self.list_creatives_for_publishers(publisher_ids)
+        return self._snapshot.list_creatives_by_category(category_id)
+
+    @timed(REPOSITORY_OPERATION_DURATION, "memory", "page_creatives_for_category")
+    def page_creatives_for_category(
+        self,
+        category_id: str,
+        *,
+        limit: int,
+        after: Optional[str] = None,
+        publisher_id: Optional[str] = None,
+        platform: Optional[str] = None,
+        predicate: Optional[Callable[[CreativeRecord], bool]] = None,
+        max_scanned: Optional[int] = None,
+        open_at: Optional[datetime] = None,
+        changed_since: Optional[datetime] = None,
+    ) -> Tuple[List[Creative], Optional[str]]:
+        """See :meth:`RepositorySnapshot.page_creatives_for_category`."""
+
+        return self._snapshot.page_creatives_for_category(
+            category_id,
+            limit=limit,
+            after=after,
+            publisher_id=publisher_id,
+            platform=platform,
+            predicate=predicate,
+            max_scanned=max_scanned,
+            open_at=open_at,
+            changed_since=changed_since,
+        )
+
+    @timed(REPOSITORY_OPERATION_DURATION, "memory", "page_creatives_for_category")
+    def page_creative_json_for_category(
+        self,
+        category_id: str,
+        *,
+        limit: int,
+        after: Optional[str] = None,
+        publisher_id: Optional[str] = None,
+        platform: Optional[str] = None,
+        predicate: Optional[Callable[[CreativeRecord], bool]] = None,
+        max_scanned: Optional[int] = None,
+        open_at: Optional[datetime] = None,
+    ) -> Tuple[List[bytes], Optional[str]]:
+        """See :meth:`RepositorySnapshot.page_creative_json_for_category`."""
+
+        return self._snapshot.page_creative_json_for_category(
+            category_id,
+            limit=limit,
+            after=after,
+            publisher_id=publisher_id,
+            platform=platform,
+            predicate=predicate,
+            max_scanned=max_scanned,
+            open_at=open_at,
+        )
+
+    @timed(REPOSITORY_OPERATION_DURATION, "memory", "page_clusters_for_category")
+    def page_clusters_for_category(
+        self,
+        category_id: str,
+        *,
+        limit: int,
+        after: Optional[str] = None,
+        publisher_id: Optional[str] = None,
+        platform: Optional[str] = None,
+        predicate: Optional[Callable[[CreativeRecord], bool]] = None,
+        max_scanned: Optional[int] = None,
+        open_at: Optional[datetime] = None,
+    ) -> Tuple[List[CreativeCluster], Optional[str]]:
+        """See :meth:`RepositorySnapshot.page_clusters_for_category`."""
+
+        return self._snapshot.page_clusters_for_category(
+            category_id,
+            limit=limit,
+            after=after,
+            publisher_id=publisher_id,
+            platform=platform,
+            predicate=predicate,
+            max_scanned=max_scanned,
+            open_at=open_at,
+        )
+
+    @timed(REPOSITORY_OPERATION_DURATION, "memory", "search_creatives")
+    def search_creatives(
+        self,
+        category_id: str,
+        query: str,
+        *,
+        limit: int,
+        offset: int = 0,
+    ) -> Tuple[List[Creative], int]:
+        """Full-text search over a category's creatives ranked by BM25.
+
+        Returns one page of matching creatives and the total number of matches.
+        """
+
+        return self._snapshot.search_creatives(category_id, query, limit=limit, offset=offset)
+
+    @timed(REPOSITORY_OPERATION_DURATION, "memory", "search_creatives")
+    def search_creative_json(
+        self,
+        category_id: str,
+        query: str,
+        *,
+        limit: int,
+        offset: int = 0,
+    ) -> Tuple[List[bytes], int]:
+        """See :meth:`RepositorySnapshot.search_creative_json`."""
+
+        return self._snapshot.search_creative_json(category_id, query, limit=limit, offset=offset)
 
     def creatives_grouped_by_publisher(self, publisher_ids: Iterable[str]) -> Dict[str, List[Creative]]:
-        grouped: Dict[str, List[Creative]] = defaultdict(list)
-        for creative in self.list_creatives_for_publishers(publisher_ids):
-            grouped[creative.publisher_id].append(creative)
-        return grouped
+        return self._snapshot.creatives_grouped_by_publisher(publisher_ids)
+
+    @timed(REPOSITORY_OPERATION_DURATION, "memory", "category_report")
+    def category_report(
+        self,
+        category_id: str,
+        start: date,
+        end: date,
+        *,
+        publisher_id: Optional[str] = None,
+    ) -> CategoryReport:
+        """See :meth:`RepositorySnapshot.category_report`."""
+
+        return self._snapshot.category_report(category_id, start, end, publisher_id=publisher_id)
+
+    @timed(REPOSITORY_OPERATION_DURATION, "memory", "creative_changes")
+    def creative_changes(
+        self,
+        category_id: str,
+        *,
+        after: Optional[int] = None,
+        limit: int = 100,
+    ) -> Tuple[List[CreativeChange], int]:
+        """Changes of a category's creatives logged after position ``after``.
+
+        Returns up to ``limit`` changes in log order and the position to pass
+        as ``after`` next time; without ``after`` only the current position.
+        Raises :class:`app.changes.ChangesExpiredError` when changes after
+        ``after`` have already been dropped from the bounded log, or when
+        ``after`` is ahead of it (a position handed out before a restart).
+        """
+
+        return self._changes.since(category_id, after, limit)
+
+    # ------------------------------------------------------------------
+    # Refresh checkpoints
+    # ------------------------------------------------------------------
+    def list_refresh_checkpoints(self, publisher_ids: Iterable[str]) -> List[RefreshCheckpoint]:
+        with self._write_lock:
+            return [
+                checkpoint
+                for publisher_id in dict.fromkeys(publisher_ids)
+                for checkpoint in self._checkpoints.get(publisher_id, {}).values()
+            ]
+
+    def save_refresh_checkpoints(self, checkpoints: Iterable[RefreshCheckpoint]) -> None:
+        with self._write_lock:
+            for checkpoint in checkpoints:
+                queries = self._checkpoints.setdefault(checkpoint.publisher_id, {})
+                queries[checkpoint.country, checkpoint.ad_type] = checkpoint
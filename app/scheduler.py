@@ -0,0 +1,270 @@
+"""Background scheduler that keeps cached creatives fresh."""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Set
+
+import httpx
+
+from .config import Settings, get_settings
+from .freshness import OnDemandRefresher
+from .meta_client import MetaAdLibraryClient
+from .models import CreativeChangeSummary, PublisherRefreshStatus, RefreshSchedulerStatus
+from .rate_limit import is_throttle_response
+from .services import CreativeService, Repository
+
+logger = logging.getLogger(__name__)
+
+
+def _to_datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Return True for errors worth retrying with backoff (throttling, 5xx, transport)."""
+
+    if isinstance(exc, httpx.HTTPStatusError):
+        return is_throttle_response(exc.response) or exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+class _PublisherSchedule:
+    __slots__ = (
+        "publisher_id",
+        "next_run",
+        "last_run",
+        "last_success",
+        "last_changed",
+        "consecutive_failures",
+        "total_failures",
+        "last_error",
+    )
+
+    def __init__(self, publisher_id: str, next_run: float) -> None:
+        self.publisher_id = publisher_id
+        self.next_run = next_run
+        self.last_run: Optional[float] = None
+        self.last_success: Optional[float] = None
+        self.last_changed: Optional[float] = None
+        self.consecutive_failures = 0
+        self.total_failures = 0
+        self.last_error: Optional[str] = None
+
+
+class RefreshScheduler:
+    """Periodically refreshes creatives for active publishers.
+
+    Each publisher has its own jittered schedule. Publishers seen for the first
+    time are staggered over ``refresh_stagger_seconds`` so a restart does not
+    fire every refresh at once, publishers whose creatives changed recently use
+    the shorter hot interval and are refreshed first, and throttled or failing
+    upstream calls back off exponentially. Archived publishers are dropped from
+    the schedule on the next tick. Successful refreshes are reported to the
+    ``on_demand`` refresher so ``fresh=true`` requests do not repeat them.
+
+    Due publishers are refreshed in batches of ``meta_batch_size``, so their
+    Ad Library queries are batched too. Batches run as background tasks, at
+    most ``refresh_max_concurrency`` at a time; a tick does not wait for them,
+    so a slow publisher does not hold back publishers due later.
+    """
+
+    def __init__(
+        self,
+        repository: Repository,
+        meta_client: MetaAdLibraryClient,
+        settings: Settings | None = None,
+        *,
+        clock: Callable[[], float] = time.time,
+        rng: random.Random | None = None,
+        on_demand: OnDemandRefresher | None = None,
+    ) -> None:
+        self.repository = repository
+        self.settings = settings or get_settings()
+        self.service = CreativeService(repository, meta_client, self.settings)
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._on_demand = on_demand
+        self._schedules: Dict[str, _PublisherSchedule] = {}
+        self._semaphore = asyncio.Semaphore(self.settings.refresh_max_concurrency)
+        self._task: Optional[asyncio.Task] = None
+        # Batches started by run_pending and the publishers they refresh.
+        self._batches: Set[asyncio.Task] = set()
+        self._refreshing: Set[str] = set()
+        self._last_tick: Optional[float] = None
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        tasks = [*self._batches, *([self._task] if self._task is not None else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    async def wait_idle(self) -> None:
+        """Wait until the refreshes started so far have finished."""
+
+        while self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                await self.run_pending()
+            except Exception:  # pragma: no cover - keep the loop alive
+                logger.exception("Creative refresh tick failed")
+            await asyncio.sleep(self.settings.refresh_tick_seconds)
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+    async def run_pending(self) -> int:
+        """Start refreshing every publisher that is due and return how many started.
+
+        Publishers whose previous refresh is still running are left for a
+        later tick; :meth:`wait_idle` waits for the refreshes to finish.
+        """
+
+        now = self._clock()
+        self._last_tick = now
+        self._sync_publishers(now)
+        due = [
+            schedule
+            for schedule in self._schedules.values()
+            if schedule.next_run <= now and schedule.publisher_id not in self._refreshing
+        ]
+        due.sort(key=lambda schedule: (not self._is_hot(schedule, now), schedule.next_run))
+        batch_size = max(1, self.settings.meta_batch_size)
+        for start in range(0, len(due), batch_size):
+            batch = due[start : start + batch_size]
+            self._refreshing.update(schedule.publisher_id for schedule in batch)
+            task = asyncio.create_task(self._refresh(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+        return len(due)
+
+    def _sync_publishers(self, now: float) -> None:
+        active_ids = {publisher.id for publisher in self.repository.list_publishers()}
+        for publisher_id in list(self._schedules):
+            if publisher_id not in active_ids:
+                del self._schedules[publisher_id]
+        for publisher_id in active_ids - self._schedules.keys():
+            first_run = now + self._rng.uniform(0, self.settings.refresh_stagger_seconds)
+            self._schedules[publisher_id] = _PublisherSchedule(publisher_id, first_run)
+
+    def _is_hot(self, schedule: _PublisherSchedule, now: float) -> bool:
+        return (
+            schedule.last_changed is not None
+            and now - schedule.last_changed <= self.settings.refresh_hot_window_seconds
+        )
+
+    def _jittered(self, interval: float) -> float:
+        ratio = self.settings.refresh_jitter_ratio
+        return interval * self._rng.uniform(1 - ratio, 1 + ratio)
+
+    async def _refresh(self, batch: List[_PublisherSchedule]) -> None:
+        publisher_ids = [schedule.publisher_id for schedule in batch]
+        try:
+            async with self._semaphore:
+                started = self._clock()
+                for schedule in batch:
+                    schedule.last_run = started
+                try:
+                    changes = await self.service.refresh_creatives_for_publishers(publisher_ids)
+                    changed = await asyncio.to_thread(self._changed_publishers, changes, publisher_ids)
+                except Exception as exc:
+                    # The batch shares its upstream queries, so it fails as a whole.
+                    for schedule in batch:
+                        self._record_failure(schedule, exc)
+                    return
+
+                now = self._clock()
+                if self._on_demand is not None:
+                    self._on_demand.mark_refreshed(publisher_ids)
+                for schedule in batch:
+                    schedule.last_success = now
+                    schedule.consecutive_failures = 0
+                    schedule.last_error = None
+                    if schedule.publisher_id in changed:
+                        schedule.last_changed = now
+                    interval = (
+                        self.settings.refresh_hot_interval_seconds
+                        if self._is_hot(schedule, now)
+                        else self.settings.refresh_interval_seconds
+                    )
+                    schedule.next_run = now + self._jittered(interval)
+        finally:
+            self._refreshing.difference_update(publisher_ids)
+
+    def _changed_publishers(self, changes: CreativeChangeSummary, publisher_ids: List[str]) -> Set[str]:
+        """The publishers of ``publisher_ids`` owning a creative ``changes`` lists."""
+
+        if not changes.changed:
+            return set()
+        if len(publisher_ids) == 1:
+            return set(publisher_ids)
+        pending, changed = set(publisher_ids), set()
+        for creative_id in itertools.chain(changes.inserted, changes.updated, changes.ended):
+            creative = self.repository.get_creative(creative_id)
+            if creative is not None and creative.publisher_id in pending:
+                pending.discard(creative.publisher_id)
+                changed.add(creative.publisher_id)
+                if not pending:
+                    break
+        return changed
+
+    def _record_failure(self, schedule: _PublisherSchedule, exc: Exception) -> None:
+        now = self._clock()
+        schedule.consecutive_failures += 1
+        schedule.total_failures += 1
+        schedule.last_error = f"{type(exc).__name__}: {exc}"
+        if is_transient_error(exc):
+            delay = min(
+                self.settings.refresh_backoff_base_seconds * 2 ** (schedule.consecutive_failures - 1),
+                self.settings.refresh_backoff_max_seconds,
+            )
+            # Jitter keeps publishers that failed together from retrying together.
+            delay = self._rng.uniform(delay / 2, delay)
+        else:
+            logger.warning("Refresh of publisher %s failed: %s", schedule.publisher_id, exc)
+            delay = self._jittered(self.settings.refresh_interval_seconds)
+        schedule.next_run = now + delay
+
+    # ------------------------------------------------------------------
+    # Status
+    # ------------------------------------------------------------------
+    def status(self) -> RefreshSchedulerStatus:
+        publishers: List[PublisherRefreshStatus] = [
+            PublisherRefreshStatus(
+                publisher_id=schedule.publisher_id,
+                last_run=_to_datetime(schedule.last_run),
+                last_success=_to_datetime(schedule.last_success),
+                last_changed=_to_datetime(schedule.last_changed),
+                next_run=_to_datetime(schedule.next_run),
+                consecutive_failures=schedule.consecutive_failures,
+                total_failures=schedule.total_failures,
+                last_error=schedule.last_error,
+            )
+            for schedule in sorted(self._schedules.values(), key=lambda item: item.next_run)
+        ]
+        return RefreshSchedulerStatus(
+            running=self.running,
+            last_tick=_to_datetime(self._last_tick),
+            publishers=publishers,
+        )
@@ -0,0 +1,472 @@
+"""In-process full-text search over creative copy."""
+from __future__ import annotations
+
+import heapq
+import math
+import operator
+import re
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import AbstractSet, Any, Collection, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+TOKEN_PATTERN = re.compile(r"[0-9a-z]+")
+
+# Prefix expansion only applies to query tokens of at least this length and is
+# capped so that a short prefix cannot fan out over the whole vocabulary.
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_EXPANSIONS = 64
+# Documents matched only through a prefix expansion rank below exact matches.
+PREFIX_WEIGHT = 0.8
+
+# Impacts are rounded to multiples of (k1 + 1) / IMPACT_LEVELS, so the
+# documents of a term fall into a few levels with identical impacts.
+IMPACT_LEVELS = 64
+# Match counts cached per partition before the cache starts over.
+MAX_CACHED_COUNTS = 256
+# Terms whose levels are kept per set of partitions, see IndexSnapshot.scoped.
+MAX_SCOPED_TERMS = 64
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lower-case ``text`` and split it into alphanumeric tokens."""
+
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class _Partition:
+    """Postings of one partition: term -> doc_id -> impact."""
+
+    __slots__ = ("postings", "levels", "counts")
+
+    def __init__(
+        self,
+        postings: Optional[Dict[str, Dict[str, float]]] = None,
+        levels: Optional[Dict[str, Dict[float, List[str]]]] = None,
+    ) -> None:
+        self.postings = postings if postings is not None else {}
+        # Lazily built by readers; concurrent builds produce the same result.
+        self.levels = levels if levels is not None else {}
+        self.counts: Dict[FrozenSet[str], int] = {}
+
+    def by_level(self, term: str) -> Dict[float, List[str]]:
+        """Documents of ``term`` grouped by impact."""
+
+        levels = self.levels.get(term)
+        if levels is None:
+            levels = {}
+            for doc_id, impact in self.postings[term].items():
+                documents = levels.get(impact)
+                if documents is None:
+                    levels[impact] = [doc_id]
+                else:
+                    documents.append(doc_id)
+            self.levels[term] = levels
+        return levels
+
+    def count(self, terms: FrozenSet[str]) -> int:
+        """Number of documents containing any of ``terms``."""
+
+        count = self.counts.get(terms)
+        if count is None:
+            matched = [self.postings[term] for term in terms if term in self.postings]
+            count = len(matched[0]) if len(matched) == 1 else len(set().union(*matched))
+            if len(self.counts) >= MAX_CACHED_COUNTS:
+                self.counts.clear()
+            self.counts[terms] = count
+        return count
+
+
+class _ScopedTerm:
+    """Documents of one term across a set of partitions, grouped by impact.
+
+    Levels are merged from the partitions the first time a search needs
+    them. ``postings`` are the term's postings the levels were built from.
+    """
+
+    __slots__ = ("term", "postings", "impacts", "levels")
+
+    def __init__(self, term: str, matched: Dict[str, _Partition]) -> None:
+        self.term = term
+        self.postings = [part.postings[term] for part in matched.values()]
+        self.impacts: Set[float] = set().union(*(part.by_level(term) for part in matched.values()))
+        self.levels: Dict[float, Set[str]] = {}
+
+    def level(self, impact: float, matched: Dict[str, _Partition]) -> Set[str]:
+        documents = self.levels.get(impact)
+        if documents is None:
+            documents = set()
+            for part in matched.values():
+                documents.update(part.by_level(self.term).get(impact, ()))
+            self.levels[impact] = documents
+        return documents
+
+
+class IndexSnapshot:
+    """Published, read-only state of an :class:`InvertedIndex`.
+
+    A snapshot is never modified after :meth:`InvertedIndex.commit` returns it,
+    so any number of threads may search it while the index builds the next one.
+    Only the caches searches fill in are shared with later snapshots.
+    """
+
+    __slots__ = ("partitions", "document_frequency", "vocabulary", "document_count", "k1", "scoped_terms")
+
+    def __init__(
+        self,
+        partitions: Dict[str, _Partition],
+        document_frequency: Dict[str, int],
+        vocabulary: List[str],
+        document_count: int,
+        k1: float,
+        scoped_terms: Optional[Dict[Tuple[str, Tuple[str, ...]], _ScopedTerm]] = None,
+    ) -> None:
+        self.partitions = partitions
+        self.document_frequency = document_frequency
+        self.vocabulary = vocabulary
+        self.document_count = document_count
+        self.k1 = k1
+        self.scoped_terms = scoped_terms if scoped_terms is not None else {}
+
+    def scoped(self, term: str, matched: Dict[str, _Partition]) -> _ScopedTerm:
+        """Levels of ``term`` across ``matched``, reused while its postings there are unchanged."""
+
+        key = (term, tuple(matched))
+        scoped = self.scoped_terms.get(key)
+        current = [part.postings[term] for part in matched.values()]
+        if scoped is None or not all(map(operator.is_, scoped.postings, current)):
+            if len(self.scoped_terms) >= MAX_SCOPED_TERMS:
+                self.scoped_terms.clear()
+            scoped = self.scoped_terms[key] = _ScopedTerm(term, matched)
+        return scoped
+
+    def expand(self, token: str) -> List[str]:
+        """Return indexed terms equal to ``token`` or starting with it."""
+
+        if len(token) < MIN_PREFIX_LENGTH:
+            return [token] if token in self.document_frequency else []
+        terms: List[str] = []
+        position = bisect_left(self.vocabulary, token)
+        while position < len(self.vocabulary) and len(terms) < MAX_PREFIX_EXPANSIONS:
+            term = self.vocabulary[position]
+            if not term.startswith(token):
+                break
+            terms.append(term)
+            position += 1
+        return terms
+
+    def search(
+        self,
+        query: str,
+        partitions: Collection[str],
+        *,
+        limit: int,
+        offset: int = 0,
+    ) -> Tuple[List[Tuple[str, str, float]], int]:
+        """Rank documents of ``partitions`` for ``query`` and return one page.
+
+        Each query token scores a document with the best weight among the
+        terms it expands to; token scores are summed. Returns ``(hits, total)``
+        where ``hits`` is a list of ``(doc_id, partition, score)`` triples and
+        ``total`` the number of matching documents.
+        """
+
+        scoped = [(partition, self.partitions[partition]) for partition in partitions if partition in self.partitions]
+        # Per query token: (term, weight, partition -> _Partition) for every expansion.
+        token_terms: List[List[Tuple[str, float, Dict[str, _Partition]]]] = []
+        for token in dict.fromkeys(tokenize(query)):
+            expansions = []
+            for term in self.expand(token):
+                matched = {partition: part for partition, part in scoped if term in part.postings}
+                if not matched:
+                    continue
+                frequency = self.document_frequency[term]
+                weight = math.log(1 + (self.document_count - frequency + 0.5) / (frequency + 0.5))
+                if term != token:
+                    weight *= PREFIX_WEIGHT
+                expansions.append((term, weight, matched))
+            if expansions:
+                token_terms.append(expansions)
+        if not token_terms:
+            return [], 0
+
+        terms = frozenset(term for expansions in token_terms for term, _, _ in expansions)
+        total = sum(part.count(terms) for partition, part in scoped)
+        return self._top_k(token_terms, offset + limit)[offset:], total
+
+    def _top_k(
+        self,
+        token_terms: List[List[Tuple[str, float, Dict[str, _Partition]]]],
+        k: int,
+    ) -> List[Tuple[str, str, float]]:
+        """Visit combinations of impact levels best first until ``k`` documents are found.
+
+        A cell picks, for every query token, one impact level of one of its
+        expansions or no match. Cells are visited in decreasing order of
+        their bound, the sum of weight * impact over their levels; a cell's
+        candidates are the documents in all of its levels, found by
+        intersecting the levels across the scoped partitions. A document's
+        own cell has the highest bound of the cells containing it, so the
+        first cell it is found in gives its exact score and every later cell
+        skips it. Ties are broken by descending document ID.
+        """
+
+        # Per token: (bound, term, impact) best first, then (0.0, None, 0.0) for no match.
+        options: List[List[Tuple[float, Optional[str], float]]] = []
+        scopes: Dict[str, Tuple[Dict[str, _Partition], _ScopedTerm]] = {}
+        for expansions in token_terms:
+            token_options: List[Tuple[float, Optional[str], float]] = []
+            for term, weight, matched in expansions:
+                scoped = self.scoped(term, matched)
+                scopes[term] = (matched, scoped)
+                token_options.extend((weight * impact, term, impact) for impact in scoped.impacts)
+            token_options.sort(reverse=True)
+            token_options.append((0.0, None, 0.0))
+            options.append(token_options)
+        last = [len(token_options) - 1 for token_options in options]
+
+        def bound(cell: Tuple[int, ...]) -> float:
+            return sum([options[token][choice][0] for token, choice in enumerate(cell)])
+
+        # Documents in every level a cell prefix picks, shared by the cells
+        # extending it; None while the prefix picks no level.
+        prefixes: Dict[Tuple[int, ...], Optional[AbstractSet[str]]] = {(): None}
+
+        def matches(prefix: Tuple[int, ...]) -> Optional[AbstractSet[str]]:
+            if prefix in prefixes:
+                return prefixes[prefix]
+            found = parent = matches(prefix[:-1])
+            _, term, impact = options[len(prefix) - 1][prefix[-1]]
+            if term is not None:
+                matched, scoped = scopes[term]
+                documents = scoped.level(impact, matched)
+                found = documents if parent is None else parent & documents
+            prefixes[prefix] = found
+            return found
+
+        top: List[Tuple[float, str, str]] = []
+        seen: Set[str] = set()
+        start = (0,) * len(options)
+        # (negative bound, cell, first token the cell may still advance).
+        cells: List[Tuple[float, Tuple[int, ...], int]] = [(-bound(start), start, 0)]
+        while cells:
+            negative_bound, cell, first = heapq.heappop(cells)
+            score = -negative_bound
+            if len(top) == k and score < top[0][0]:
+                break
+            # Each cell is reached from exactly one parent: advancing tokens in order.
+            for token in range(first, len(cell)):
+                if cell[token] < last[token]:
+                    child = cell[:token] + (cell[token] + 1,) + cell[token + 1 :]
+                    heapq.heappush(cells, (-bound(child), child, token))
+            found = matches(cell)
+            if not found:
+                continue
+            candidates = found - seen
+            if not candidates:
+                continue
+            seen.update(candidates)
+            term = next(options[token][choice][1] for token, choice in enumerate(cell) if choice < last[token])
+            for doc_id in heapq.nlargest(k, candidates):
+                item = (score, doc_id, term)
+                if len(top) < k:
+                    heapq.heappush(top, item)
+                elif item > top[0]:
+                    heapq.heapreplace(top, item)
+                else:
+                    break
+        hits = []
+        for score, doc_id, term in sorted(top, reverse=True):
+            matched, _ = scopes[term]
+            partition = next(partition for partition, part in matched.items() if doc_id in part.postings[term])
+            hits.append((doc_id, partition, score))
+        return hits
+
+
+class InvertedIndex:
+    """Incrementally maintained inverted index with BM25-style ranking.
+
+    Documents are identified by string IDs and belong to one partition (the
+    publisher, for creatives); searches are restricted to a set of partitions
+    and never touch postings outside of it. Documents may be re-added at any
+    time, replacing their previous postings. A sorted vocabulary supports
+    prefix matching of query tokens.
+
+    Postings store the BM25 term-frequency component ("impact") computed with
+    the average document length at index time and rounded to one of
+    ``IMPACT_LEVELS`` levels, so a query multiplies impacts by the current
+    IDF. Postings grouped by impact are built lazily per (term, partition)
+    and merged across the searched partitions on first use; searches visit
+    combinations of levels best first and stop once no unseen document can
+    enter the requested page, without scoring documents one by one.
+
+    Changes are staged copy-on-write: :meth:`add` and :meth:`remove` copy the
+    partitions, postings and statistics they touch the first time in a batch,
+    and :meth:`commit` publishes them as a new :class:`IndexSnapshot`. Writers
+    must be serialized by the caller; readers only ever use snapshots.
+    """
+
+    def __init__(self, *, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        # Writer-only bookkeeping, never read by searches.
+        self._doc_terms: Dict[str, Tuple[str, Dict[str, int]]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self.snapshot = IndexSnapshot({}, {}, [], 0, k1)
+        self._reset_staging()
+
+    def _reset_staging(self) -> None:
+        self._partitions = self.snapshot.partitions
+        self._document_frequency = self.snapshot.document_frequency
+        self._vocabulary = self.snapshot.vocabulary
+        # ids of containers created in the current batch, safe to mutate.
+        self._owned: Set[int] = set()
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "InvertedIndex":
+        """Index over the containers of a :meth:`state` saved earlier; takes ownership of them."""
+
+        index = cls(k1=state["k1"], b=state["b"])
+        index._doc_terms = state["doc_terms"]
+        index._doc_lengths = state["doc_lengths"]
+        index._total_length = state["total_length"]
+        index.snapshot = IndexSnapshot(
+            {partition: _Partition(postings) for partition, postings in state["postings"].items()},
+            state["document_frequency"],
+            state["vocabulary"],
+            len(index._doc_lengths),
+            index.k1,
+        )
+        index._reset_staging()
+        return index
+
+    def state(self) -> Dict[str, Any]:
+        """Committed contents as plain containers, for :mod:`app.snapshot`.
+
+        Call between writes. Published containers are never changed again
+        and are shared; the writer-only maps are copied, so the result stays
+        valid after later writes. Postings grouped by impact are left out and
+        rebuilt lazily.
+        """
+
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "postings": {partition: part.postings for partition, part in self.snapshot.partitions.items()},
+            "document_frequency": self.snapshot.document_frequency,
+            "vocabulary": self.snapshot.vocabulary,
+            "doc_terms": dict(self._doc_terms),
+            "doc_lengths": dict(self._doc_lengths),
+            "total_length": self._total_length,
+        }
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def commit(self) -> IndexSnapshot:
+        """Publish staged changes and return the new snapshot."""
+
+        if self._owned:
+            self.snapshot = IndexSnapshot(
+                self._partitions,
+                self._document_frequency,
+                self._vocabulary,
+                len(self._doc_lengths),
+                self.k1,
+                self.snapshot.scoped_terms,
+            )
+        self._reset_staging()
+        return self.snapshot
+
+    def _own_shared(self) -> None:
+        if id(self._partitions) not in self._owned:
+            self._partitions = dict(self._partitions)
+            self._document_frequency = dict(self._document_frequency)
+            self._owned.update((id(self._partitions), id(self._document_frequency)))
+
+    def _own_vocabulary(self) -> List[str]:
+        if id(self._vocabulary) not in self._owned:
+            self._vocabulary = list(self._vocabulary)
+            self._owned.add(id(self._vocabulary))
+        return self._vocabulary
+
+    def _own_postings(self, partition: str, term: str) -> Dict[str, float]:
+        part = self._partitions.get(partition)
+        if part is None:
+            part = self._partitions[partition] = _Partition()
+            self._owned.add(id(part))
+        elif id(part) not in self._owned:
+            part = self._partitions[partition] = _Partition(dict(part.postings), dict(part.levels))
+            self._owned.add(id(part))
+        part.levels.pop(term, None)
+        postings = part.postings.get(term)
+        if postings is None:
+            postings = part.postings[term] = {}
+            self._owned.add(id(postings))
+        elif id(postings) not in self._owned:
+            postings = part.postings[term] = dict(postings)
+            self._owned.add(id(postings))
+        return postings
+
+    def add(self, doc_id: str, partition: str, fields: Iterable[Optional[str]]) -> None:
+        """Stage ``doc_id`` with the text of ``fields``, replacing earlier text."""
+
+        tokens = [token for field in fields for token in tokenize(field)]
+        terms = dict(Counter(tokens))
+        if self._doc_terms.get(doc_id) == (partition, terms):
+            return
+        self.remove(doc_id)
+        self._own_shared()
+        self._doc_terms[doc_id] = (partition, terms)
+        self._doc_lengths[doc_id] = len(tokens)
+        self._total_length += len(tokens)
+        average_length = self._total_length / len(self._doc_lengths)
+        length_norm = self.k1 * (1 - self.b + self.b * len(tokens) / average_length) if tokens else 0.0
+        for term, frequency in terms.items():
+            if term not in self._document_frequency:
+                self._document_frequency[term] = 0
+                insort(self._own_vocabulary(), term)
+            impact = frequency * (self.k1 + 1) / (frequency + length_norm)
+            quantum = (self.k1 + 1) / IMPACT_LEVELS
+            self._own_postings(partition, term)[doc_id] = max(round(impact / quantum), 1) * quantum
+            self._document_frequency[term] += 1
+
+    def remove(self, doc_id: str) -> None:
+        entry = self._doc_terms.pop(doc_id, None)
+        if entry is None:
+            return
+        self._own_shared()
+        partition, terms = entry
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        for term in terms:
+            postings = self._own_postings(partition, term)
+            del postings[doc_id]
+            self._document_frequency[term] -= 1
+            if not postings:
+                part = self._partitions[partition]
+                del part.postings[term]
+                if not part.postings:
+                    del self._partitions[partition]
+            if not self._document_frequency[term]:
+                del self._document_frequency[term]
+                vocabulary = self._own_vocabulary()
+                del vocabulary[bisect_left(vocabulary, term)]
+
+    def expand(self, token: str) -> List[str]:
+        """Return terms of the published snapshot matching ``token`` as a prefix."""
+
+        return self.snapshot.expand(token)
+
+    def search(
+        self,
+        query: str,
+        partitions: Collection[str],
+        *,
+        limit: int,
+        offset: int = 0,
+    ) -> Tuple[List[Tuple[str, str, float]], int]:
+        """Search the published snapshot; see :meth:`IndexSnapshot.search`."""
+
+        return self.snapshot.search(query, partitions, limit=limit, offset=offset)
@@ -1,37 +1,130 @@
 """Service layer encapsulating business logic."""
 from __future__ import annotations
 
-from typing import Iterable, List
+import asyncio
+import base64
+import binascii
+import hashlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
+from pydantic import TypeAdapter
+
+from .config import Settings, get_settings
 from .meta_client import MetaAdLibraryClient
-from .models import AdminOperationResponse, CategorySummary, Creative, Publisher
-from .repository import InMemoryRepository
+from .metrics import CATEGORY_SUMMARY_CACHE
+from .models import (
+    AdminOperationResponse,
+    CategoryReport,
+    CategorySummary,
+    Creative,
+    CreativeChange,
+    CreativeChangeSummary,
+    CreativeCluster,
+    Publisher,
+    RefreshCheckpoint,
+)
+from .repository import InMemoryRepository, RepositorySnapshot
+from .sqlite_repository import SqliteRepository
+
+Repository = InMemoryRepository | SqliteRepository
+
+
+_category_summaries_adapter = TypeAdapter(List[CategorySummary])
+
+# Default and maximum length of a category report, in days.
+DEFAULT_REPORT_DAYS = 30
+MAX_REPORT_DAYS = 366
+
+
+class CategorySummaryCache:
+    """Serialized category summaries, valid for one repository summary version."""
+
+    def __init__(self) -> None:
+        self.version: Optional[int] = None
+        self.body = b""
+        self.etag = ""
 
 
 class CategoryService:
     """Service for working with categories and related data."""
 
-    def __init__(self, repository: InMemoryRepository) -> None:
+    def __init__(self, repository: Repository, summary_cache: CategorySummaryCache | None = None) -> None:
         self.repository = repository
+        self.summary_cache = summary_cache or CategorySummaryCache()
+
+    def _read_view(self) -> Repository | RepositorySnapshot:
+        """A consistent view for multi-step reads, when the backend offers one."""
 
-    def list_category_summaries(self) -> List[CategorySummary]:
+        if isinstance(self.repository, InMemoryRepository):
+            return self.repository.snapshot()
+        return self.repository
+
+    def list_category_summaries(self, view: Repository | RepositorySnapshot | None = None) -> List[CategorySummary]:
+        if view is None:
+            view = self._read_view()
         summaries: List[CategorySummary] = []
-        for category in self.repository.list_categories():
-            publisher_count = len(self.repository.list_publishers_by_category(category.id))
+        for category in view.list_categories():
+            publisher_count, creative_count = view.category_counts(category.id)
             summaries.append(
                 CategorySummary(
                     id=category.id,
                     name=category.name,
                     publisher_count=publisher_count,
+                    creative_count=creative_count,
                 )
             )
         return summaries
 
+    def category_summaries_payload(self) -> Tuple[bytes, str]:
+        """Return the JSON-encoded summaries and their strong ETag.
+
+        The body is only rebuilt when the repository's summary version moved
+        since the cached copy was serialized.
+        """
+
+        cache = self.summary_cache
+        view = self._read_view()
+        version = view.summary_version
+        if cache.version == version:
+            CATEGORY_SUMMARY_CACHE.labels("hit").inc()
+        else:
+            CATEGORY_SUMMARY_CACHE.labels("miss").inc()
+            cache.body = _category_summaries_adapter.dump_json(self.list_category_summaries(view))
+            cache.etag = f'"{hashlib.blake2b(cache.body, digest_size=16).hexdigest()}"'
+            cache.version = version
+        return cache.body, cache.etag
+
+    def get_report(
+        self,
+        category_id: str,
+        *,
+        start: date | None = None,
+        end: date | None = None,
+        publisher_id: str | None = None,
+    ) -> CategoryReport:
+        """Daily creative activity of a category between ``start`` and ``end``.
+
+        ``end`` defaults to the current UTC day and ``start`` to the
+        ``DEFAULT_REPORT_DAYS`` days ending there. Raises ``ValueError`` for
+        reversed ranges or ranges longer than ``MAX_REPORT_DAYS``.
+        """
+
+        if end is None:
+            end = datetime.now(timezone.utc).date()
+        if start is None:
+            start = end - timedelta(days=DEFAULT_REPORT_DAYS - 1)
+        if start > end:
+            raise ValueError("start must not be after end")
+        if (end - start).days >= MAX_REPORT_DAYS:
+            raise ValueError(f"Reports cover at most {MAX_REPORT_DAYS} days")
+        return self.repository.category_report(category_id, start, end, publisher_id=publisher_id)
+
 
 class AdminService:
     """Service used by administrative endpoints to manage publishers."""
 
-    def __init__(self, repository: InMemoryRepository) -> None:
+    def __init__(self, repository: Repository) -> None:
         self.repository = repository
 
     def create_publisher(self, name: str, category_ids: List[str], country: str = "US", notes: str | None = None) -> AdminOperationResponse:
@@ -59,17 +152,16 @@ class AdminService:
         publisher = self.repository.get_publisher(publisher_id)
         if not publisher:
             raise ValueError("Publisher not found")
-        if name is not None:
-            publisher.name = name
-        if category_ids is not None:
-            publisher.category_ids = category_ids
-        if country is not None:
-            publisher.country = country
-        if status is not None:
-            publisher.status = status
-        if notes is not None:
-            publisher.notes = notes
-        publisher = self.repository.upsert_publisher(publisher)
+        changes = {
+            "name": name,
+            "category_ids": category_ids,
+            "country": country,
+            "status": status,
+            "notes": notes,
+        }
+        # Stored publishers may be shared with readers, so update a copy.
+        updated = publisher.model_copy(update={key: value for key, value in changes.items() if value is not None})
+        publisher = self.repository.upsert_publisher(updated)
         return AdminOperationResponse(publisher=publisher, message="Publisher updated")
 
     def archive_publisher(self, publisher_id: str) -> AdminOperationResponse:
@@ -79,18 +171,371 @@ class AdminService:
         return AdminOperationResponse(publisher=publisher, message="Publisher archived")
 
 
+def encode_cursor(creative_id: str) -> str:
+    """Encode the last creative ID of a page as an opaque cursor."""
+
+    return base64.urlsafe_b64encode(creative_id.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    """Decode a cursor produced by :func:`encode_cursor`.
+
+    Raises ``ValueError`` for malformed cursors.
+    """
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.b64decode(padded, altchars=b"-_", validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def json_array(items: List[bytes]) -> bytes:
+    """Join JSON-encoded values into a JSON array."""
+
+    return b"[" + b",".join(items) + b"]"
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def creative_window_predicate(
+    start_time: datetime | None = None,
+    end_time: datetime | None = None,
+) -> Optional[Callable[[Creative], bool]]:
+    """Build a filter for creatives active within a time window.
+
+    A creative matches the window when its delivery period overlaps
+    ``[start_time, end_time]``; a missing creative ``start_time`` or ``end_time``
+    is treated as unbounded. Naive datetimes are interpreted as UTC.
+    """
+
+    if start_time is None and end_time is None:
+        return None
+    window_start = _as_utc(start_time) if start_time else None
+    window_end = _as_utc(end_time) if end_time else None
+
+    def predicate(creative: Creative) -> bool:
+        creative_end = _as_utc(creative.end_time) if creative.end_time else None
+        if window_end is not None and creative.start_time and _as_utc(creative.start_time) > window_end:
+            return False
+        if window_start is not None and creative_end is not None and creative_end < window_start:
+            return False
+        return True
+
+    return predicate
+
+
 class CreativeService:
     """Service responsible for retrieving creatives for display."""
 
-    def __init__(self, repository: InMemoryRepository, meta_client: MetaAdLibraryClient | None = None) -> None:
+    def __init__(
+        self,
+        repository: Repository,
+        meta_client: MetaAdLibraryClient | None = None,
+        settings: Settings | None = None,
+    ) -> None:
         self.repository = repository
         self.meta_client = meta_client or MetaAdLibraryClient()
+        self.settings = settings or get_settings()
 
     def get_cached_creatives_for_category(self, category_id: str) -> List[Creative]:
         return self.repository.list_creatives_by_category(category_id)
 
-    def refresh_creatives_for_publishers(self, publisher_ids: Iterable[str]) -> List[Creative]:
-        creatives = self.meta_client.fetch_active_creatives(publisher_ids)
-        for creative in creatives:
-            self.repository.upsert_creative(creative)
-        return creatives
+    def get_creative_page(
+        self,
+        category_id: str,
+        *,
+        limit: int,
+        cursor: str | None = None,
+        publisher_id: str | None = None,
+        platform: str | None = None,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        open_slots: bool = False,
+    ) -> Tuple[List[Creative], Optional[str]]:
+        """Return a page of cached creatives and the cursor of the next page.
+
+        ``open_slots`` reads the repository's keyset of running creatives, so
+        its pages cost O(page size). Time-window filters are evaluated on each
+        creative in ID order; a page stops after ``page_scan_limit`` creatives,
+        so it can come back short or empty with a cursor while more matches
+        may follow.
+        """
+
+        creatives, last_id = self.repository.page_creatives_for_category(
+            category_id,
+            limit=limit,
+            after=decode_cursor(cursor) if cursor else None,
+            publisher_id=publisher_id,
+            platform=platform,
+            predicate=creative_window_predicate(start_time, end_time),
+            max_scanned=self.settings.page_scan_limit,
+            open_at=datetime.now(timezone.utc) if open_slots else None,
+        )
+        return creatives, encode_cursor(last_id) if last_id is not None else None
+
+    def get_creative_page_json(
+        self,
+        category_id: str,
+        *,
+        limit: int,
+        cursor: str | None = None,
+        publisher_id: str | None = None,
+        platform: str | None = None,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        open_slots: bool = False,
+    ) -> Tuple[bytes, Optional[str]]:
+        """Like :meth:`get_creative_page`, returning the page as a JSON array.
+
+        The body is joined from per-creative encodings the repository caches,
+        so serving a page does not validate or serialize models.
+        """
+
+        encoded, last_id = self.repository.page_creative_json_for_category(
+            category_id,
+            limit=limit,
+            after=decode_cursor(cursor) if cursor else None,
+            publisher_id=publisher_id,
+            platform=platform,
+            predicate=creative_window_predicate(start_time, end_time),
+            max_scanned=self.settings.page_scan_limit,
+            open_at=datetime.now(timezone.utc) if open_slots else None,
+        )
+        return json_array(encoded), encode_cursor(last_id) if last_id is not None else None
+
+    def get_cluster_page(
+        self,
+        category_id: str,
+        *,
+        limit: int,
+        cursor: str | None = None,
+        publisher_id: str | None = None,
+        platform: str | None = None,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        open_slots: bool = False,
+    ) -> Tuple[List[CreativeCluster], Optional[str]]:
+        """Like :meth:`get_creative_page`, with one entry per near-duplicate cluster."""
+
+        clusters, last_id = self.repository.page_clusters_for_category(
+            category_id,
+            limit=limit,
+            after=decode_cursor(cursor) if cursor else None,
+            publisher_id=publisher_id,
+            platform=platform,
+            predicate=creative_window_predicate(start_time, end_time),
+            max_scanned=self.settings.page_scan_limit,
+            open_at=datetime.now(timezone.utc) if open_slots else None,
+        )
+        return clusters, encode_cursor(last_id) if last_id is not None else None
+
+    def iter_creatives_for_category(
+        self,
+        category_id: str,
+        *,
+        since: datetime | None = None,
+        batch_size: int = 500,
+    ) -> Iterator[List[Creative]]:
+        """Yield a category's creatives in ID order, ``batch_size`` at a time.
+
+        Batches are read lazily with keyset pagination, so memory use does not
+        depend on the category size and concurrent writes cannot invalidate
+        the iteration. ``since`` keeps only creatives changed after it.
+        """
+
+        after: str | None = None
+        while True:
+            creatives, after = self.repository.page_creatives_for_category(
+                category_id,
+                limit=batch_size,
+                after=after,
+                changed_since=_as_utc(since) if since else None,
+            )
+            if creatives:
+                yield creatives
+            if after is None:
+                return
+
+    def search_creatives(
+        self,
+        category_id: str,
+        query: str,
+        *,
+        limit: int,
+        offset: int = 0,
+    ) -> Tuple[List[Creative], int]:
+        """Search cached creative titles, bodies and calls to action."""
+
+        return self.repository.search_creatives(category_id, query, limit=limit, offset=offset)
+
+    def search_creatives_json(
+        self,
+        category_id: str,
+        query: str,
+        *,
+        limit: int,
+        offset: int = 0,
+    ) -> Tuple[bytes, int]:
+        """Like :meth:`search_creatives`, returning the page as a JSON array."""
+
+        encoded, total = self.repository.search_creative_json(category_id, query, limit=limit, offset=offset)
+        return json_array(encoded), total
+
+    def get_changes(
+        self,
+        category_id: str,
+        *,
+        since: int | None = None,
+        limit: int,
+    ) -> Tuple[List[CreativeChange], int]:
+        """Changes of a category's creatives after log position ``since``.
+
+        Returns the changes and the position to pass as ``since`` next time;
+        without ``since`` only the current position, to start following from.
+        Raises :class:`app.changes.ChangesExpiredError` when the log no longer
+        reaches back to ``since``.
+        """
+
+        return self.repository.creative_changes(category_id, after=since, limit=limit)
+
+    async def refresh_creatives_for_publishers(
+        self,
+        publisher_ids: Iterable[str],
+        *,
+        full: bool = False,
+    ) -> CreativeChangeSummary:
+        """Fetch live creatives for ``publisher_ids`` and apply them as a delta.
+
+        Every publisher is queried for each of ``meta_countries`` and
+        ``meta_ad_types``. Queries sharing a country, ad type and checkpoint
+        are batched by ``meta_batch_size`` and all batches run concurrently.
+
+        Each (publisher, country, ad type) query keeps a
+        :class:`RefreshCheckpoint`. A completed run stores a delivery date
+        watermark, so the next run only asks for ads delivered since then, and
+        every page is stored together with the cursor of the next one, so an
+        interrupted run resumes where it stopped. A query sweeps every active
+        creative instead when it has no watermark yet, when its last full
+        sweep is older than ``refresh_full_sweep_seconds`` or when ``full``
+        is set. Creatives of a publisher that its full sweeps no longer return
+        are end-dated once all of that publisher's queries swept fully;
+        incremental runs never end-date anything.
+
+        Nothing is written when the client is not configured, since an empty
+        result would then not mean that every creative ended.
+        """
+
+        publisher_ids = list(dict.fromkeys(publisher_ids))
+        summary = CreativeChangeSummary()
+        if not self.meta_client.enabled or not publisher_ids:
+            return summary
+        started = datetime.now(timezone.utc)
+        stored = {checkpoint.key: checkpoint for checkpoint in self.repository.list_refresh_checkpoints(publisher_ids)}
+
+        groups: Dict[Tuple[str, str, Optional[date], Optional[str]], List[RefreshCheckpoint]] = {}
+        for publisher_id in publisher_ids:
+            for country in self.settings.meta_countries:
+                for ad_type in self.settings.meta_ad_types:
+                    checkpoint = stored.get((publisher_id, country, ad_type)) or RefreshCheckpoint(
+                        publisher_id=publisher_id, country=country, ad_type=ad_type
+                    )
+                    if checkpoint.cursor is None and (full or self._full_sweep_due(checkpoint, started)):
+                        checkpoint = checkpoint.model_copy(update={"delivery_date_min": None})
+                    key = (country, ad_type, checkpoint.delivery_date_min, checkpoint.cursor)
+                    groups.setdefault(key, []).append(checkpoint)
+        batch_size = max(1, self.settings.meta_batch_size)
+        batches = [
+            members[start : start + batch_size]
+            for members in groups.values()
+            for start in range(0, len(members), batch_size)
+        ]
+        outcomes = await asyncio.gather(
+            *(self._run_query(batch, started, summary) for batch in batches),
+            return_exceptions=True,
+        )
+
+        # A publisher is swept fully only if every one of its queries was.
+        swept: Dict[str, List[Creative]] = {publisher_id: [] for publisher_id in publisher_ids}
+        for batch, outcome in zip(batches, outcomes):
+            for checkpoint in batch:
+                if isinstance(outcome, BaseException) or outcome is None:
+                    swept.pop(checkpoint.publisher_id, None)
+            if isinstance(outcome, list):
+                for creative in outcome:
+                    if creative.publisher_id in swept:
+                        swept[creative.publisher_id].append(creative)
+        if swept:
+            live = {creative.id: creative for creatives in swept.values() for creative in creatives}
+            changes = await asyncio.to_thread(
+                self.repository.upsert_creatives_batch, list(live.values()), publisher_ids=list(swept)
+            )
+            summary.ended.extend(changes.ended)
+
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+        return summary
+
+    def _full_sweep_due(self, checkpoint: RefreshCheckpoint, now: datetime) -> bool:
+        if checkpoint.delivery_date_min is None or checkpoint.full_sweep_at is None:
+            return True
+        age = now - _as_utc(checkpoint.full_sweep_at)
+        return age.total_seconds() >= self.settings.refresh_full_sweep_seconds
+
+    async def _run_query(
+        self,
+        batch: List[RefreshCheckpoint],
+        started: datetime,
+        summary: CreativeChangeSummary,
+    ) -> Optional[List[Creative]]:
+        """Run one batched query, storing each page and its checkpoint.
+
+        Returns every creative fetched when the query was a full sweep and
+        ``None`` for incremental or resumed runs.
+        """
+
+        first = batch[0]
+        full_sweep = first.delivery_date_min is None and first.cursor is None
+        fetched: List[Creative] = []
+        pages = self.meta_client.fetch_creative_pages(
+            [checkpoint.publisher_id for checkpoint in batch],
+            country=first.country,
+            ad_type=first.ad_type,
+            delivery_date_min=first.delivery_date_min,
+            after=first.cursor,
+        )
+        # Writes run in worker threads so applying a page does not stall the
+        # event loop; readers keep using the published snapshot meanwhile.
+        async for creatives, cursor in pages:
+            changes = await asyncio.to_thread(self.repository.upsert_creatives_batch, creatives)
+            summary.inserted.extend(changes.inserted)
+            summary.updated.extend(changes.updated)
+            summary.unchanged += changes.unchanged
+            if full_sweep:
+                fetched.extend(creatives)
+            if cursor is not None:
+                await asyncio.to_thread(
+                    self.repository.save_refresh_checkpoints,
+                    [checkpoint.model_copy(update={"cursor": cursor}) for checkpoint in batch],
+                )
+
+        # The watermark trails the run by a day so ads delivered late in time
+        # zones behind UTC are not skipped; re-fetched ads are unchanged.
+        watermark = (started - timedelta(days=1)).date()
+        await asyncio.to_thread(
+            self.repository.save_refresh_checkpoints,
+            [
+                checkpoint.model_copy(
+                    update={
+                        "delivery_date_min": watermark,
+                        "cursor": None,
+                        "full_sweep_at": started if full_sweep else checkpoint.full_sweep_at,
+                    }
+                )
+                for checkpoint in batch
+            ],
+        )
+        return fetched if full_sweep else None
@@ -0,0 +1,139 @@
+"""Binary repository snapshots for fast warm starts.
+
+A snapshot file is a short header followed by one :mod:`marshal` payload.
+Creatives are stored column by column (one list per
+:class:`~app.records.CreativeRecord` field), and the derived state (search
+postings and vocabulary, cluster buckets and members, report aggregates) is
+stored as the plain containers the indexes keep. Loading is therefore a
+single C-level decode followed by a loop that builds records from plain
+values: no JSON parsing, no pydantic validation, no tokenizing and no
+re-hashing.
+
+Snapshots are a cache written by this application, not an exchange format:
+``marshal`` data is only loaded from trusted files, and a snapshot written by
+a different format version is rejected so the caller can fall back to the
+seed data.
+
+Usage::
+
+    python -m app.snapshot data/seed.json data/seed.snapshot
+"""
+from __future__ import annotations
+
+import gc
+import marshal
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+MAGIC = b"LFBADS\x00"
+# Bumped with every change to the payload, including the layout of the index
+# state it holds and the MinHash signatures (app.clustering.SIGNATURE_VERSION).
+FORMAT_VERSION = 5
+_HEADER = MAGIC + bytes([FORMAT_VERSION])
+
+# Column order of the creative table: CreativeRecord fields, with times as
+# ISO 8601 strings.
+CREATIVE_COLUMNS = (
+    "id",
+    "publisher_id",
+    "title",
+    "body",
+    "call_to_action",
+    "platforms",
+    "spend",
+    "currency",
+    "start_time",
+    "end_time",
+    "snapshot_url_head",
+    "snapshot_url_tail",
+    "ad_library_url_head",
+    "ad_library_url_tail",
+    "content_hash",
+    "updated_at",
+    "cluster_id",
+)
+
+Payload = Dict[str, Any]
+
+
+class SnapshotFormatError(ValueError):
+    """Raised for files that are not snapshots of the current format."""
+
+
+@contextmanager
+def gc_paused() -> Iterator[None]:
+    """Suspend cyclic garbage collection while a snapshot is decoded and loaded.
+
+    A payload holds millions of containers but no reference cycles;
+    collections triggered while they are allocated would only rescan them.
+    """
+
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def encode_snapshot(payload: Payload) -> bytes:
+    """Serialize ``payload`` into the bytes of a snapshot file."""
+
+    return _HEADER + marshal.dumps(payload)
+
+
+def write_snapshot(path: Path, data: bytes) -> int:
+    """Atomically write ``data`` from :func:`encode_snapshot` to ``path`` and return its size."""
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write beside the target and rename so readers never see a partial file.
+    handle, temporary = tempfile.mkstemp(dir=path.parent, prefix=".")
+    try:
+        with os.fdopen(handle, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return len(data)
+
+
+def read_snapshot(path: Path) -> Payload:
+    """Read a payload written by :func:`write_snapshot`.
+
+    Raises :class:`SnapshotFormatError` when the file is not a snapshot of
+    the current format.
+    """
+
+    data = Path(path).read_bytes()
+    if not data.startswith(MAGIC):
+        raise SnapshotFormatError(f"{path} is not a repository snapshot")
+    if data[len(MAGIC) : len(_HEADER)] != _HEADER[len(MAGIC) :]:
+        raise SnapshotFormatError(f"{path} was written by an incompatible snapshot format")
+    try:
+        with gc_paused():
+            payload = marshal.loads(memoryview(data)[len(_HEADER) :])
+    except (EOFError, ValueError, TypeError) as exc:
+        raise SnapshotFormatError(f"{path} is truncated or corrupt") from exc
+    if not isinstance(payload, dict):
+        raise SnapshotFormatError(f"{path} is truncated or corrupt")
+    return payload
+
+
+def main(argv: list[str] | None = None) -> None:
+    from .repository import InMemoryRepository
+
+    seed_path, snapshot_path = (argv if argv is not None else sys.argv[1:])[:2]
+    repository = InMemoryRepository(Path(seed_path))
+    size = repository.dump_snapshot(Path(snapshot_path))
+    print(f"wrote {snapshot_path} ({size} bytes, {repository.cache_sizes()[1]} creatives)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1174 @@
+"""SQLite-backed repository sharing the InMemoryRepository interface."""
+from __future__ import annotations
+
+import heapq
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .changes import CHANGE_LOG_CAPACITY, ChangesExpiredError
+from .clustering import MAX_BUCKET_SIZE, SIGNATURE_VERSION, band_keys, best_cluster, minhash_signature, new_cluster_id
+from .metrics import REPOSITORY_OPERATION_DURATION, record_scan, record_upserts, timed
+from .models import (
+    Category,
+    CategoryReport,
+    Creative,
+    CreativeChange,
+    CreativeChangeSummary,
+    CreativeCluster,
+    Publisher,
+    RefreshCheckpoint,
+)
+from .records import creative_json
+from .reports import CreativeAggregates, build_report
+from .repository import creative_content_hash
+from .search import MIN_PREFIX_LENGTH, tokenize
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('summary_version', 0);
+
+CREATE TABLE IF NOT EXISTS categories (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS publishers (
+    pk INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    country TEXT NOT NULL,
+    status TEXT NOT NULL,
+    notes TEXT
+);
+
+CREATE TABLE IF NOT EXISTS publisher_category (
+    category_id TEXT NOT NULL,
+    publisher_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (category_id, publisher_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS publisher_category_by_publisher ON publisher_category (publisher_id);
+
+CREATE TABLE IF NOT EXISTS creatives (
+    pk INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    publisher_id TEXT NOT NULL,
+    snapshot_url TEXT,
+    title TEXT,
+    body TEXT,
+    call_to_action TEXT,
+    platforms TEXT NOT NULL,
+    spend REAL,
+    currency TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    ad_library_url TEXT,
+    content_hash TEXT,
+    updated_at TEXT,
+    cluster_id TEXT,
+    minhash BLOB
+);
+CREATE INDEX IF NOT EXISTS creatives_by_publisher ON creatives (publisher_id, id);
+
+-- LSH buckets of the MinHash signatures, see app.clustering.
+CREATE TABLE IF NOT EXISTS creative_lsh (
+    band_key INTEGER NOT NULL,
+    creative_id TEXT NOT NULL,
+    PRIMARY KEY (band_key, creative_id)
+) WITHOUT ROWID;
+
+-- Keyset index for platform filters, maintained by triggers.
+CREATE TABLE IF NOT EXISTS creative_platforms (
+    publisher_id TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    creative_id TEXT NOT NULL,
+    PRIMARY KEY (publisher_id, platform, creative_id)
+) WITHOUT ROWID;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS creative_search USING fts5(
+    title, body, call_to_action, content='creatives', content_rowid='pk'
+);
+
+-- Per-publisher daily aggregates, see app.reports; day is a date ordinal.
+CREATE TABLE IF NOT EXISTS report_aggregates (
+    publisher_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    key TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (publisher_id, metric, key, day)
+) WITHOUT ROWID;
+
+-- Bounded per-category change logs, see app.changes. The horizon is the
+-- newest position trimmed from a category's log.
+CREATE TABLE IF NOT EXISTS creative_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    category_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    changed_at TEXT NOT NULL,
+    creative TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS creative_changes_by_category ON creative_changes (category_id, seq);
+
+CREATE TABLE IF NOT EXISTS creative_change_horizon (
+    category_id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+) WITHOUT ROWID;
+
+-- Summary counts over each category's active publishers, maintained by the
+-- triggers below; summary_version moves only when a count does.
+CREATE TABLE IF NOT EXISTS category_counts (
+    category_id TEXT PRIMARY KEY,
+    publisher_count INTEGER NOT NULL DEFAULT 0,
+    creative_count INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS refresh_checkpoints (
+    publisher_id TEXT NOT NULL,
+    country TEXT NOT NULL,
+    ad_type TEXT NOT NULL,
+    delivery_date_min TEXT,
+    cursor TEXT,
+    full_sweep_at TEXT,
+    PRIMARY KEY (publisher_id, country, ad_type)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS creatives_after_insert AFTER INSERT ON creatives BEGIN
+    INSERT INTO creative_search (rowid, title, body, call_to_action)
+        VALUES (new.pk, new.title, new.body, new.call_to_action);
+    INSERT INTO creative_platforms (publisher_id, platform, creative_id)
+        SELECT new.publisher_id, value, new.id FROM json_each(new.platforms);
+    UPDATE category_counts SET creative_count = creative_count + 1
+        WHERE category_id IN (
+            SELECT pc.category_id FROM publisher_category pc JOIN publishers p ON p.id = pc.publisher_id
+            WHERE pc.publisher_id = new.publisher_id AND p.status = 'active'
+        );
+END;
+
+CREATE TRIGGER IF NOT EXISTS creatives_after_update_text AFTER UPDATE ON creatives
+WHEN old.title IS NOT new.title OR old.body IS NOT new.body OR old.call_to_action IS NOT new.call_to_action
+BEGIN
+    INSERT INTO creative_search (creative_search, rowid, title, body, call_to_action)
+        VALUES ('delete', old.pk, old.title, old.body, old.call_to_action);
+    INSERT INTO creative_search (rowid, title, body, call_to_action)
+        VALUES (new.pk, new.title, new.body, new.call_to_action);
+END;
+
+CREATE TRIGGER IF NOT EXISTS creatives_after_update_platforms AFTER UPDATE ON creatives
+WHEN old.platforms IS NOT new.platforms OR old.publisher_id IS NOT new.publisher_id
+BEGIN
+    DELETE FROM creative_platforms
+        WHERE publisher_id = old.publisher_id
+          AND creative_id = old.id
+          AND platform IN (SELECT value FROM json_each(old.platforms));
+    INSERT INTO creative_platforms (publisher_id, platform, creative_id)
+        SELECT new.publisher_id, value, new.id FROM json_each(new.platforms);
+END;
+
+CREATE TRIGGER IF NOT EXISTS creatives_after_update_publisher AFTER UPDATE OF publisher_id ON creatives
+WHEN old.publisher_id IS NOT new.publisher_id
+BEGIN
+    UPDATE category_counts SET creative_count = creative_count - 1
+        WHERE category_id IN (
+            SELECT pc.category_id FROM publisher_category pc JOIN publishers p ON p.id = pc.publisher_id
+            WHERE pc.publisher_id = old.publisher_id AND p.status = 'active'
+        );
+    UPDATE category_counts SET creative_count = creative_count + 1
+        WHERE category_id IN (
+            SELECT pc.category_id FROM publisher_category pc JOIN publishers p ON p.id = pc.publisher_id
+            WHERE pc.publisher_id = new.publisher_id AND p.status = 'active'
+        );
+END;
+
+CREATE TRIGGER IF NOT EXISTS publisher_category_after_insert AFTER INSERT ON publisher_category
+WHEN (SELECT status FROM publishers WHERE id = new.publisher_id) = 'active'
+BEGIN
+    INSERT INTO category_counts (category_id)
+        SELECT new.category_id WHERE NOT EXISTS (SELECT 1 FROM category_counts WHERE category_id = new.category_id);
+    UPDATE category_counts SET
+        publisher_count = publisher_count + 1,
+        creative_count = creative_count + (SELECT COUNT(*) FROM creatives WHERE publisher_id = new.publisher_id)
+        WHERE category_id = new.category_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS publisher_category_after_delete AFTER DELETE ON publisher_category
+WHEN (SELECT status FROM publishers WHERE id = old.publisher_id) = 'active'
+BEGIN
+    UPDATE category_counts SET
+        publisher_count = publisher_count - 1,
+        creative_count = creative_count - (SELECT COUNT(*) FROM creatives WHERE publisher_id = old.publisher_id)
+        WHERE category_id = old.category_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS publishers_after_update_status AFTER UPDATE OF status ON publishers
+WHEN (old.status = 'active') IS NOT (new.status = 'active')
+BEGIN
+    -- Not OR IGNORE: a trigger uses the conflict policy of the statement that fired it.
+    INSERT INTO category_counts (category_id)
+        SELECT category_id FROM publisher_category pc WHERE publisher_id = new.id
+          AND NOT EXISTS (SELECT 1 FROM category_counts cc WHERE cc.category_id = pc.category_id);
+    UPDATE category_counts SET
+        publisher_count = publisher_count + iif(new.status = 'active', 1, -1),
+        creative_count = creative_count
+            + iif(new.status = 'active', 1, -1) * (SELECT COUNT(*) FROM creatives WHERE publisher_id = new.id)
+        WHERE category_id IN (SELECT category_id FROM publisher_category WHERE publisher_id = new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS category_counts_after_insert AFTER INSERT ON category_counts BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'summary_version';
+END;
+
+CREATE TRIGGER IF NOT EXISTS category_counts_after_update AFTER UPDATE ON category_counts
+WHEN old.publisher_count IS NOT new.publisher_count OR old.creative_count IS NOT new.creative_count
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'summary_version';
+END;
+"""
+
+CREATIVE_COLUMNS = (
+    "id",
+    "publisher_id",
+    "snapshot_url",
+    "title",
+    "body",
+    "call_to_action",
+    "platforms",
+    "spend",
+    "currency",
+    "start_time",
+    "end_time",
+    "ad_library_url",
+)
+# Columns added after the initial schema: (table, column, definition).
+MIGRATIONS = (
+    ("creatives", "content_hash", "TEXT"),
+    ("creatives", "updated_at", "TEXT"),
+    ("creatives", "cluster_id", "TEXT"),
+    ("creatives", "minhash", "BLOB"),
+)
+# Creatives still running when stored: without an end time or ending after
+# ``updated_at`` (rows from before that column count as running). The same
+# condition, on ``c``, selects them through the ``creatives_running`` index.
+_RUNNING = "(end_time IS NULL OR updated_at IS NULL OR julianday(end_time) > julianday(updated_at))"
+_RUNNING_C = "(c.end_time IS NULL OR c.updated_at IS NULL OR julianday(c.end_time) > julianday(c.updated_at))"
+# Indexes over migrated columns, created once the columns exist.
+MIGRATION_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS creatives_by_cluster ON creatives (cluster_id, id)",
+    f"CREATE INDEX IF NOT EXISTS creatives_running ON creatives (publisher_id, id) WHERE {_RUNNING}",
+)
+# Keep ``IN (...)`` parameter lists well below SQLite's variable limit.
+QUERY_CHUNK_SIZE = 500
+_CREATIVE_SELECT = ", ".join(f"c.{column}" for column in CREATIVE_COLUMNS)
+# Rows whose content hash did not change are left alone, which keeps their
+# ``updated_at`` and skips the index triggers.
+_CREATIVE_UPSERT = (
+    f"INSERT INTO creatives ({', '.join(CREATIVE_COLUMNS)}, content_hash, updated_at) "
+    f"VALUES ({', '.join('?' for _ in CREATIVE_COLUMNS)}, ?, ?) "
+    "ON CONFLICT(id) DO UPDATE SET "
+    + ", ".join(
+        f"{column} = excluded.{column}" for column in (*CREATIVE_COLUMNS[1:], "content_hash", "updated_at")
+    )
+    + " WHERE creatives.content_hash IS NOT excluded.content_hash"
+)
+_ACTIVE_CATEGORY_PUBLISHERS = """
+    SELECT pc.publisher_id FROM publisher_category pc
+    JOIN publishers p ON p.id = pc.publisher_id
+    WHERE pc.category_id = ? AND p.status = 'active'
+"""
+
+
+def _timestamp(value: datetime) -> str:
+    """Format ``value`` as a fixed-width UTC string that sorts chronologically."""
+
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%f")
+
+
+def _creative_row(creative: Creative, content_hash: str) -> Tuple[Any, ...]:
+    return (
+        creative.id,
+        creative.publisher_id,
+        creative.snapshot_url,
+        creative.title,
+        creative.body,
+        creative.call_to_action,
+        json.dumps(creative.platforms),
+        creative.spend,
+        creative.currency,
+        creative.start_time.isoformat() if creative.start_time else None,
+        creative.end_time.isoformat() if creative.end_time else None,
+        creative.ad_library_url,
+        content_hash,
+        _timestamp(datetime.now(timezone.utc)),
+    )
+
+
+def _creative_from_row(row: Sequence[Any]) -> Creative:
+    values = dict(zip(CREATIVE_COLUMNS, row))
+    values["platforms"] = json.loads(values["platforms"])
+    return Creative(**values)
+
+
+def _fts_query(query: str) -> Optional[str]:
+    terms = []
+    for token in dict.fromkeys(tokenize(query)):
+        terms.append(f'"{token}"*' if len(token) >= MIN_PREFIX_LENGTH else f'"{token}"')
+    return " OR ".join(terms) or None
+
+
+class SqliteRepository:
+    """Durable repository stored in a SQLite database file.
+
+    The database runs in WAL mode so several processes can share one file:
+    every thread reads through its own connection while writes go through a
+    single lock-protected connection. Keyset and full-text indexes, category
+    counts and the summary version are maintained by triggers, so bulk
+    upserts stay a single ``executemany``.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        seed_path: Optional[Path] = None,
+        *,
+        change_log_capacity: int = CHANGE_LOG_CAPACITY,
+    ) -> None:
+        self.path = Path(path)
+        self.change_log_capacity = change_log_capacity
+        self._local = threading.local()
+        # Every per-thread reader, so close() reaches those of other threads.
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.executescript(SCHEMA)
+        self._migrate()
+        if seed_path and seed_path.exists() and not self.list_categories():
+            self.load_seed(seed_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    def _migrate(self) -> None:
+        for table, column, definition in MIGRATIONS:
+            columns = {row[1] for row in self._writer.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                self._writer.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        for statement in MIGRATION_INDEXES:
+            self._writer.execute(statement)
+        built = self._writer.execute("SELECT 1 FROM meta WHERE key = 'report_aggregates'").fetchone()
+        if built is None:
+            # Databases created before the aggregates existed are backfilled once.
+            with self._transaction() as connection:
+                rows = connection.execute(f"SELECT {_CREATIVE_SELECT} FROM creatives c").fetchall()
+                self._apply_aggregates(connection, ((None, _creative_from_row(row)) for row in rows))
+                connection.execute("INSERT INTO meta (key, value) VALUES ('report_aggregates', 1)")
+        built = self._writer.execute("SELECT 1 FROM meta WHERE key = 'category_counts'").fetchone()
+        if built is None:
+            # Counts kept by triggers start from the current rows once.
+            with self._transaction() as connection:
+                connection.execute("DELETE FROM category_counts")
+                connection.execute(
+                    "INSERT INTO category_counts (category_id, publisher_count, creative_count) "
+                    "SELECT pc.category_id, COUNT(*), "
+                    "COALESCE(SUM((SELECT COUNT(*) FROM creatives c WHERE c.publisher_id = pc.publisher_id)), 0) "
+                    "FROM publisher_category pc JOIN publishers p ON p.id = pc.publisher_id "
+                    "WHERE p.status = 'active' GROUP BY pc.category_id"
+                )
+                connection.execute("INSERT INTO meta (key, value) VALUES ('category_counts', 1)")
+        row = self._writer.execute("SELECT value FROM meta WHERE key = 'minhash_version'").fetchone()
+        if row is None or row[0] != SIGNATURE_VERSION:
+            # Signatures of an earlier MinHash are recomputed once; creatives keep their clusters.
+            with self._transaction() as connection:
+                self._rebuild_signatures(connection)
+                connection.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('minhash_version', ?)", (SIGNATURE_VERSION,)
+                )
+
+    @property
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+            with self._readers_lock:
+                self._readers.append(connection)
+        return connection
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            self._writer.execute("COMMIT")
+
+    def close(self) -> None:
+        """Close the writer and the reader connections of every thread."""
+
+        self._writer.close()
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+            self._local = threading.local()
+        for connection in readers:
+            connection.close()
+
+    # ------------------------------------------------------------------
+    # Seed loading
+    # ------------------------------------------------------------------
+    def load_seed(self, seed_path: Path) -> None:
+        """Load repository state from the provided JSON seed file."""
+
+        raw = json.loads(seed_path.read_text())
+        for category in raw.get("categories", []):
+            self.upsert_category(Category(**category))
+        for publisher in raw.get("publishers", []):
+            self.upsert_publisher(Publisher(**publisher))
+        self.upsert_creatives_batch(Creative(**creative) for creative in raw.get("creatives", []))
+
+    # ------------------------------------------------------------------
+    # Category operations
+    # ------------------------------------------------------------------
+    def upsert_category(self, category: Category) -> None:
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT INTO categories (id, name) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET name = excluded.name",
+                (category.id, category.name),
+            )
+            connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'summary_version'")
+
+    def list_categories(self) -> List[Category]:
+        rows = self._reader.execute("SELECT id, name FROM categories ORDER BY rowid")
+        return [Category(id=row[0], name=row[1]) for row in rows]
+
+    @property
+    def summary_version(self) -> int:
+        """Counter bumped whenever a category summary may have changed."""
+
+        row = self._reader.execute("SELECT value FROM meta WHERE key = 'summary_version'").fetchone()
+        return row[0]
+
+    def cache_sizes(self) -> Tuple[int, int]:
+        """Return ``(publisher_count, creative_count)`` over everything stored."""
+
+        publishers = self._reader.execute("SELECT COUNT(*) FROM publishers").fetchone()[0]
+        creatives = self._reader.execute("SELECT COUNT(*) FROM creatives").fetchone()[0]
+        return publishers, creatives
+
+    def category_counts(self, category_id: str) -> Tuple[int, int]:
+        """Return ``(publisher_count, creative_count)`` for active publishers."""
+
+        row = self._reader.execute(
+            "SELECT publisher_count, creative_count FROM category_counts WHERE category_id = ?", (category_id,)
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    # ------------------------------------------------------------------
+    # Publisher operations
+    # ------------------------------------------------------------------
+    def upsert_publisher(self, publisher: Publisher) -> Publisher:
+        with self._transaction() as connection:
+            previous_categories = [
+                row[0]
+                for row in connection.execute(
+                    "SELECT category_id FROM publisher_category WHERE publisher_id = ? ORDER BY position",
+                    (publisher.id,),
+                )
+            ]
+            connection.execute(
+                "INSERT INTO publishers (id, name, country, status, notes) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET name = excluded.name, country = excluded.country, "
+                "status = excluded.status, notes = excluded.notes",
+                (publisher.id, publisher.name, publisher.country, publisher.status, publisher.notes),
+            )
+            category_ids = list(dict.fromkeys(publisher.category_ids))
+            if category_ids != previous_categories:
+                connection.execute("DELETE FROM publisher_category WHERE publisher_id = ?", (publisher.id,))
+                connection.executemany(
+                    "INSERT INTO publisher_category (category_id, publisher_id, position) VALUES (?, ?, ?)",
+                    [(category_id, publisher.id, position) for position, category_id in enumerate(category_ids)],
+                )
+        return publisher
+
+    def generate_publisher_id(self) -> str:
+        count = self._reader.execute("SELECT COUNT(*) FROM publishers").fetchone()[0]
+        return f"pub_{count + 1:04d}"
+
+    def _publishers_where(self, where: str = "", parameters: Sequence[Any] = ()) -> List[Publisher]:
+        rows = self._reader.execute(
+            f"SELECT p.id, p.name, p.country, p.status, p.notes, "
+            f"(SELECT json_group_array(category_id) FROM "
+            f"(SELECT category_id FROM publisher_category WHERE publisher_id = p.id ORDER BY position)) "
+            f"FROM publishers p {where} ORDER BY p.pk",
+            parameters,
+        )
+        return [
+            Publisher(
+                id=row[0],
+                name=row[1],
+                country=row[2],
+                status=row[3],
+                notes=row[4],
+                category_ids=json.loads(row[5]),
+            )
+            for row in rows
+        ]
+
+    def get_publisher(self, publisher_id: str) -> Optional[Publisher]:
+        publishers = self._publishers_where("WHERE p.id = ?", (publisher_id,))
+        return publishers[0] if publishers else None
+
+    def list_publishers(self, *, include_inactive: bool = False) -> List[Publisher]:
+        if include_inactive:
+            return self._publishers_where()
+        return self._publishers_where("WHERE p.status = 'active'")
+
+    def list_publishers_by_category(self, category_id: str) -> List[Publisher]:
+        return self._publishers_where(f"WHERE p.id IN ({_ACTIVE_CATEGORY_PUBLISHERS})", (category_id,))
+
+    def _active_publisher_ids(self, category_id: str) -> List[str]:
+        return [row[0] for row in self._reader.execute(_ACTIVE_CATEGORY_PUBLISHERS, (category_id,))]
+
+    def archive_publisher(self, publisher_id: str) -> Optional[Publisher]:
+        publisher = self.get_publisher(publisher_id)
+        if publisher:
+            publisher.status = "inactive"
+            self.upsert_publisher(publisher)
+        return publisher
+
+    # ------------------------------------------------------------------
+    # Creative operations
+    # ------------------------------------------------------------------
+    def upsert_creative(self, creative: Creative) -> None:
+        with self._transaction() as connection:
+            previous = connection.execute(
+                f"SELECT {_CREATIVE_SELECT} FROM creatives c WHERE c.id = ?", (creative.id,)
+            ).fetchone()
+            written = connection.execute(_CREATIVE_UPSERT, _creative_row(creative, creative_content_hash(creative)))
+            if written.rowcount:
+                self._assign_clusters(connection, [creative])
+                self._apply_aggregates(
+                    connection, [(_creative_from_row(previous) if previous is not None else None, creative)]
+                )
+                self._log_changes(connection, [("inserted" if previous is None else "updated", creative)])
+
+    @staticmethod
+    def _apply_aggregates(
+        connection: sqlite3.Connection,
+        changes: Iterable[Tuple[Optional[Creative], Creative]],
+    ) -> None:
+        """Move report aggregates from each previous creative to its replacement."""
+
+        deltas: Dict[str, CreativeAggregates] = {}
+        for previous, current in changes:
+            if previous is not None:
+                deltas.setdefault(previous.publisher_id, CreativeAggregates()).apply(previous, -1)
+            deltas.setdefault(current.publisher_id, CreativeAggregates()).apply(current)
+        rows = [
+            (publisher_id, metric, key, day, value)
+            for publisher_id, aggregates in deltas.items()
+            for (metric, key, day), value in aggregates.items()
+        ]
+        connection.executemany(
+            "INSERT INTO report_aggregates (publisher_id, metric, key, day, value) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (publisher_id, metric, key, day) DO UPDATE SET value = value + excluded.value",
+            rows,
+        )
+        connection.executemany(
+            "DELETE FROM report_aggregates "
+            "WHERE publisher_id = ? AND metric = ? AND key = ? AND day = ? AND value = 0",
+            [row[:4] for row in rows],
+        )
+
+    def _log_changes(self, connection: sqlite3.Connection, changes: Iterable[Tuple[str, Creative]]) -> None:
+        """Append written creatives to the change logs of their publishers' active categories."""
+
+        changed_at = _timestamp(datetime.now(timezone.utc))
+        categories: Dict[str, List[str]] = {}
+        rows = []
+        for kind, creative in changes:
+            if creative.publisher_id not in categories:
+                categories[creative.publisher_id] = [
+                    row[0]
+                    for row in connection.execute(
+                        "SELECT pc.category_id FROM publisher_category pc JOIN publishers p ON p.id = pc.publisher_id "
+                        "WHERE pc.publisher_id = ? AND p.status = 'active'",
+                        (creative.publisher_id,),
+                    )
+                ]
+            encoded = creative_json(creative).decode()
+            rows.extend((category_id, kind, changed_at, encoded) for category_id in categories[creative.publisher_id])
+        connection.executemany(
+            "INSERT INTO creative_changes (category_id, kind, changed_at, creative) VALUES (?, ?, ?, ?)", rows
+        )
+        for category_id in {row[0] for row in rows}:
+            horizon = connection.execute(
+                "SELECT seq FROM creative_changes WHERE category_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?",
+                (category_id, self.change_log_capacity),
+            ).fetchone()
+            if horizon is None:
+                continue
+            connection.execute(
+                "DELETE FROM creative_changes WHERE category_id = ? AND seq <= ?", (category_id, horizon[0])
+            )
+            connection.execute(
+                "INSERT INTO creative_change_horizon (category_id, seq) VALUES (?, ?) "
+                "ON CONFLICT (category_id) DO UPDATE SET seq = excluded.seq",
+                (category_id, horizon[0]),
+            )
+
+    @staticmethod
+    def _rebuild_signatures(connection: sqlite3.Connection) -> None:
+        """Recompute every stored signature and refill the LSH buckets as :meth:`_assign_clusters` would."""
+
+        connection.execute("DELETE FROM creative_lsh")
+        buckets: Dict[int, List[str]] = {}
+        updates, entries = [], []
+        rows = connection.execute(
+            "SELECT id, cluster_id, title, body, call_to_action FROM creatives WHERE minhash IS NOT NULL ORDER BY id"
+        )
+        for creative_id, cluster_id, title, body, call_to_action in rows.fetchall():
+            signature = minhash_signature((title, body, call_to_action))
+            updates.append((cluster_id if signature is not None else None, signature, creative_id))
+            if signature is None:
+                continue
+            for key in band_keys(signature):
+                clusters = buckets.setdefault(key, [])
+                if len(clusters) < MAX_BUCKET_SIZE and cluster_id not in clusters:
+                    clusters.append(cluster_id)
+                    entries.append((key, creative_id))
+        connection.executemany("UPDATE creatives SET cluster_id = ?, minhash = ? WHERE id = ?", updates)
+        connection.executemany("INSERT INTO creative_lsh (band_key, creative_id) VALUES (?, ?)", entries)
+
+    @staticmethod
+    def _assign_clusters(connection: sqlite3.Connection, creatives: Iterable[Creative]) -> None:
+        """Place written creatives into near-duplicate clusters.
+
+        Follows :meth:`app.clustering.ClusterIndex.add` one creative at a
+        time, so creatives of the same batch can join each other's clusters.
+        Creatives whose copy did not change keep their cluster.
+        """
+
+        def in_use(cluster_id: str) -> bool:
+            row = connection.execute("SELECT 1 FROM creatives WHERE cluster_id = ? LIMIT 1", (cluster_id,))
+            return row.fetchone() is not None
+
+        for creative in creatives:
+            signature = minhash_signature((creative.title, creative.body, creative.call_to_action))
+            row = connection.execute("SELECT minhash FROM creatives WHERE id = ?", (creative.id,)).fetchone()
+            previous = row[0] if row is not None else None
+            if signature is not None and previous == signature:
+                continue
+            if previous is not None:
+                connection.executemany(
+                    "DELETE FROM creative_lsh WHERE band_key = ? AND creative_id = ?",
+                    [(key, creative.id) for key in band_keys(previous)],
+                )
+            if signature is None:
+                connection.execute(
+                    "UPDATE creatives SET cluster_id = NULL, minhash = NULL WHERE id = ?", (creative.id,)
+                )
+                continue
+
+            keys = band_keys(signature)
+            buckets = [
+                connection.execute(
+                    "SELECT creative_id FROM creative_lsh WHERE band_key = ? LIMIT ?", (key, MAX_BUCKET_SIZE)
+                ).fetchall()
+                for key in keys
+            ]
+            candidates = list(dict.fromkeys(row[0] for bucket in buckets for row in bucket))
+            neighbours: Dict[str, Tuple[str, bytes]] = {}
+            for start in range(0, len(candidates), QUERY_CHUNK_SIZE):
+                chunk = candidates[start : start + QUERY_CHUNK_SIZE]
+                rows = connection.execute(
+                    f"SELECT id, cluster_id, minhash FROM creatives WHERE id IN ({', '.join('?' for _ in chunk)})",
+                    chunk,
+                )
+                neighbours.update((row[0], (row[1], row[2])) for row in rows)
+            cluster_id = best_cluster(signature, neighbours.values()) or new_cluster_id(creative.id, in_use)
+            connection.execute(
+                "UPDATE creatives SET cluster_id = ?, minhash = ? WHERE id = ?", (cluster_id, signature, creative.id)
+            )
+            connection.executemany(
+                "INSERT INTO creative_lsh (band_key, creative_id) VALUES (?, ?)",
+                [
+                    (key, creative.id)
+                    for key, bucket in zip(keys, buckets)
+                    if len(bucket) < MAX_BUCKET_SIZE and all(neighbours[row[0]][0] != cluster_id for row in bucket)
+                ],
+            )
+
+    @timed(REPOSITORY_OPERATION_DURATION, "sqlite", "upsert_creatives_batch")
+    def upsert_creatives_batch(
+        self,
+        creatives: Iterable[Creative],
+        *,
+        publisher_ids: Optional[Iterable[str]] = None,
+        now: Optional[datetime] = None,
+    ) -> CreativeChangeSummary:
+        """Apply a batch of creatives, writing only what changed.
+
+        See :meth:`InMemoryRepository.upsert_creatives_batch`. Stored content
+        hashes are read in chunks and the changed rows are written with a
+        single ``executemany`` in one transaction.
+        """
+
+        incoming: Dict[str, Tuple[Creative, str]] = {
+            creative.id: (creative, creative_content_hash(creative)) for creative in creatives
+        }
+        summary = CreativeChangeSummary()
+        with self._transaction() as connection:
+            stored: Dict[str, Optional[str]] = {}
+            previous: Dict[str, Creative] = {}
+            ids = list(incoming)
+            for start in range(0, len(ids), QUERY_CHUNK_SIZE):
+                chunk = ids[start : start + QUERY_CHUNK_SIZE]
+                rows = connection.execute(
+                    f"SELECT id, content_hash FROM creatives WHERE id IN ({', '.join('?' for _ in chunk)})",
+                    chunk,
+                )
+                stored.update(rows)
+
+            rows_to_write = []
+            written: List[Creative] = []
+            for creative_id, (creative, content_hash) in incoming.items():
+                if creative_id not in stored:
+                    summary.inserted.append(creative_id)
+                elif stored[creative_id] != content_hash:
+                    summary.updated.append(creative_id)
+                else:
+                    summary.unchanged += 1
+                    continue
+                rows_to_write.append(_creative_row(creative, content_hash))
+                written.append(creative)
+            for start in range(0, len(summary.updated), QUERY_CHUNK_SIZE):
+                chunk = summary.updated[start : start + QUERY_CHUNK_SIZE]
+                rows = connection.execute(
+                    f"SELECT {_CREATIVE_SELECT} FROM creatives c WHERE c.id IN ({', '.join('?' for _ in chunk)})",
+                    chunk,
+                )
+                previous.update((row[0], _creative_from_row(row)) for row in rows)
+
+            if publisher_ids is not None:
+                ended_at = now or datetime.now(timezone.utc)
+                for publisher_id in dict.fromkeys(publisher_ids):
+                    open_rows = connection.execute(
+                        f"SELECT {_CREATIVE_SELECT} FROM creatives c "
+                        f"WHERE c.publisher_id = ? AND {_RUNNING_C} AND c.end_time IS NULL ORDER BY c.pk",
+                        (publisher_id,),
+                    ).fetchall()
+                    for row in open_rows:
+                        if row[0] in incoming:
+                            continue
+                        previous[row[0]] = _creative_from_row(row)
+                        ended = previous[row[0]].model_copy(update={"end_time": ended_at})
+                        rows_to_write.append(_creative_row(ended, creative_content_hash(ended)))
+                        written.append(ended)
+                        summary.ended.append(ended.id)
+
+            if rows_to_write:
+                connection.executemany(_CREATIVE_UPSERT, rows_to_write)
+                self._assign_clusters(connection, written)
+                self._apply_aggregates(connection, ((previous.get(c.id), c) for c in written))
+                kinds = {
+                    **dict.fromkeys(summary.inserted, "inserted"),
+                    **dict.fromkeys(summary.updated, "updated"),
+                    **dict.fromkeys(summary.ended, "ended"),
+                }
+                self._log_changes(connection, ((kinds[c.id], c) for c in written))
+        record_upserts("sqlite", summary)
+        return summary
+
+    def get_creative(self, creative_id: str) -> Optional[Creative]:
+        row = self._reader.execute(
+            f"SELECT {_CREATIVE_SELECT} FROM creatives c WHERE c.id = ?", (creative_id,)
+        ).fetchone()
+        return _creative_from_row(row) if row is not None else None
+
+    def list_creatives_for_publishers(self, publisher_ids: Iterable[str]) -> List[Creative]:
+        creatives: List[Creative] = []
+        for publisher_id in dict.fromkeys(publisher_ids):
+            rows = self._reader.execute(
+                f"SELECT {_CREATIVE_SELECT} FROM creatives c WHERE c.publisher_id = ? ORDER BY c.id",
+                (publisher_id,),
+            )
+            creatives.extend(_creative_from_row(row) for row in rows)
+        return creatives
+
+    @timed(REPOSITORY_OPERATION_DURATION, "sqlite", "list_creatives_by_category")
+    def list_creatives_by_category(self, category_id: str) -> List[Creative]:
+        return self.list_creatives_for_publishers(self._active_publisher_ids(category_id))
+
+    @timed(REPOSITORY_OPERATION_DURATION, "sqlite", "page_creatives_for_category")
+    def page_creatives_for_category(
+        self,
+        category_id: str,
+        *,
+        limit: int,
+        after: Optional[str] = None,
+        publisher_id: Optional[str] = None,
+        platform: Optional[str] = None,
+        predicate: Optional[Callable[[Creative], bool]] = None,
+        max_scanned: Optional[int] = None,
+        open_at: Optional[datetime] = None,
+        changed_since: Optional[datetime] = None,
+    ) -> Tuple[List[Creative], Optional[str]]:
+        """Return one page of a category's creatives ordered by creative ID.
+
+        Mirrors :meth:`InMemoryRepository.page_creatives_for_category`: one
+        index-ordered cursor per publisher is merged lazily, so a page reads
+        O(page size) rows per publisher, and at most ``max_scanned`` rows are
+        read before a short page is returned with a cursor to continue from.
+        ``open_at`` pages read the ``creatives_running`` index.
+        """
+
+        publisher_ids = self._active_publisher_ids(category_id)
+        if publisher_id is not None:
+            publisher_ids = [publisher_id] if publisher_id in publisher_ids else []
+        since = _timestamp(changed_since) if changed_since is not None else None
+        at = _timestamp(open_at) if open_at is not None else None
+        streams = [
+            self._iter_publisher_rows(member_id, platform, after, since, running=at is not None)
+            for member_id in publisher_ids
+        ]
+
+        page: List[Creative] = []
+        next_after: Optional[str] = None
+        scanned = 0
+        for _, row in heapq.merge(*streams, key=lambda item: item[0]):
+            scanned += 1
+            creative = _creative_from_row(row)
+            if (at is not None and creative.end_time is not None and _timestamp(creative.end_time) <= at) or (
+                predicate is not None and not predicate(creative)
+            ):
+                if max_scanned is not None and scanned >= max_scanned:
+                    next_after = creative.id
+                    break
+                continue
+            if len(page) == limit:
+                next_after = page[-1].id
+                break
+            page.append(creative)
+        record_scan("sqlite", "page_creatives_for_category", scanned, len(page))
+        return page, next_after
+
+    def page_creative_json_for_category(
+        self,
+        category_id: str,
+        *,
+        limit: int,
+        after: Optional[str] = None,
+        publisher_id: Optional[str] = None,
+        platform: Optional[str] = None,
+        predicate: Optional[Callable[[Creative], bool]] = None,
+        max_scanned: Optional[int] = None,
+        open_at: Optional[datetime] = None,
+    ) -> Tuple[List[bytes], Optional[str]]:
+        """Like :meth:`page_creatives_for_category`, with JSON-encoded creatives.
+
+        Rows are decoded for every read, so there is no encoding to cache.
+        """
+
+        page, next_after = self.page_creatives_for_category(
+            category_id,
+            limit=limit,
+            after=after,
+            publisher_id=publisher_id,
+            platform=platform,
+            predicate=predicate,
+            max_scanned=max_scanned,
+            open_at=open_at,
+        )
+        return [creative_json(creative) for creative in page], next_after
+
+    @timed(REPOSITORY_OPERATION_DURATION, "sqlite", "page_clusters_for_category")
+    def page_clusters_for_category(
+        self,
+        category_id: str,
+        *,
+        limit: int,
+        after: Optional[str] = None,
+        publisher_id: Optional[str] = None,
+        platform: Optional[str] = None,
+        predicate: Optional[Callable[[Creative], bool]] = None,
+        max_scanned: Optional[int] = None,
+        open_at: Optional[datetime] = None,
+    ) -> Tuple[List[CreativeCluster], Optional[str]]:
+        """Return one page of a category's near-duplicate clusters.
+
+        See :meth:`InMemoryRepository.page_clusters_for_category`; cluster
+        members are read through the ``creatives_by_cluster`` index.
+        """
+
+        publisher_ids = set(self._active_publisher_ids(category_id))
+        if publisher_id is not None:
+            publisher_ids &= {publisher_id}
+        at = _timestamp(open_at) if open_at is not None else None
+
+        def visible(creative: Creative) -> bool:
+            if creative.publisher_id not in publisher_ids:
+                return False
+            if platform is not None and platform not in creative.platforms:
+                return False
+            if at is not None and creative.end_time is not None and _timestamp(creative.end_time) <= at:
+                return False
+            return predicate is None or predicate(creative)
+
+        def members(creative_id: str, *, before: bool) -> Iterator[Creative]:
+            """Creatives sharing ``creative_id``'s cluster, optionally only lower IDs."""
+
+            sql = (
+                f"SELECT {_CREATIVE_SELECT} FROM creatives c "
+                "WHERE c.cluster_id = (SELECT cluster_id FROM creatives WHERE id = ?)"
+            )
+            parameters = [creative_id]
+            if before:
+                sql += " AND c.id < ?"
+                parameters.append(creative_id)
+            for row in self._reader.execute(sql + " ORDER BY c.id", parameters):
+                yield _creative_from_row(row)
+
+        def represents(creative: Creative) -> bool:
+            if predicate is not None and not predicate(creative):
+                return False
+            return not any(visible(member) for member in members(creative.id, before=True))
+
+        page, next_after = self.page_creatives_for_category(
+            category_id,
+            limit=limit,
+            after=after,
+            publisher_id=publisher_id,
+            platform=platform,
+            predicate=represents,
+            max_scanned=max_scanned,
+            open_at=open_at,
+        )
+        clusters = []
+        for creative in page:
+            cluster_id = self._reader.execute(
+                "SELECT cluster_id FROM creatives WHERE id = ?", (creative.id,)
+            ).fetchone()[0]
+            size = sum(visible(member) for member in members(creative.id, before=False)) if cluster_id else 1
+            clusters.append(CreativeCluster(cluster_id=cluster_id, size=size, creative=creative))
+        return clusters, next_after
+
+    def _iter_publisher_rows(
+        self,
+        publisher_id: str,
+        platform: Optional[str],
+        after: Optional[str],
+        since: Optional[str],
+        *,
+        running: bool = False,
+    ) -> Iterator[Tuple[str, Sequence[Any]]]:
+        if running:
+            # Creatives that were running when stored are usually far fewer
+            # than a platform's, so the partial index drives the scan.
+            sql = f"SELECT {_CREATIVE_SELECT} FROM creatives c WHERE c.publisher_id = ? AND c.id > ? AND {_RUNNING_C}"
+            parameters: List[Any] = [publisher_id, after or ""]
+            if platform is not None:
+                sql += (
+                    " AND EXISTS (SELECT 1 FROM creative_platforms cp "
+                    "WHERE cp.publisher_id = c.publisher_id AND cp.platform = ? AND cp.creative_id = c.id)"
+                )
+                parameters.append(platform)
+            order = " ORDER BY c.id"
+        elif platform is None:
+            sql = f"SELECT {_CREATIVE_SELECT} FROM creatives c WHERE c.publisher_id = ? AND c.id > ?"
+            parameters = [publisher_id, after or ""]
+            order = " ORDER BY c.id"
+        else:
+            sql = (
+                f"SELECT {_CREATIVE_SELECT} FROM creative_platforms cp "
+                "JOIN creatives c ON c.id = cp.creative_id "
+                "WHERE cp.publisher_id = ? AND cp.platform = ? AND cp.creative_id > ?"
+            )
+            parameters = [publisher_id, platform, after or ""]
+            order = " ORDER BY cp.creative_id"
+        if since is not None:
+            sql += " AND c.updated_at > ?"
+            parameters.append(since)
+        for row in self._reader.execute(sql + order, parameters):
+            yield row[0], row
+
+    @timed(REPOSITORY_OPERATION_DURATION, "sqlite", "search_creatives")
+    def search_creatives(
+        self,
+        category_id: str,
+        query: str,
+        *,
+        limit: int,
+        offset: int = 0,
+    ) -> Tuple[List[Creative], int]:
+        """Full-text search over a category's creatives using FTS5's BM25."""
+
+        match = _fts_query(query)
+        if match is None:
+            return [], 0
+        scope = (
+            "FROM creative_search JOIN creatives c ON c.pk = creative_search.rowid "
+            f"WHERE creative_search MATCH ? AND c.publisher_id IN ({_ACTIVE_CATEGORY_PUBLISHERS})"
+        )
+        rows = self._reader.execute(
+            f"SELECT {_CREATIVE_SELECT} {scope} ORDER BY bm25(creative_search), c.id LIMIT ? OFFSET ?",
+            (match, category_id, limit, offset),
+        )
+        creatives = [_creative_from_row(row) for row in rows]
+        total = self._reader.execute(f"SELECT COUNT(*) {scope}", (match, category_id)).fetchone()[0]
+        return creatives, total
+
+    def search_creative_json(
+        self,
+        category_id: str,
+        query: str,
+        *,
+        limit: int,
+        offset: int = 0,
+    ) -> Tuple[List[bytes], int]:
+        """Like :meth:`search_creatives`, with JSON-encoded creatives."""
+
+        creatives, total = self.search_creatives(category_id, query, limit=limit, offset=offset)
+        return [creative_json(creative) for creative in creatives], total
+
+    def creatives_grouped_by_publisher(self, publisher_ids: Iterable[str]) -> Dict[str, List[Creative]]:
+        grouped: Dict[str, List[Creative]] = {}
+        for creative in self.list_creatives_for_publishers(publisher_ids):
+            grouped.setdefault(creative.publisher_id, []).append(creative)
+        return grouped
+
+    @timed(REPOSITORY_OPERATION_DURATION, "sqlite", "category_report")
+    def category_report(
+        self,
+        category_id: str,
+        start: date,
+        end: date,
+        *,
+        publisher_id: Optional[str] = None,
+    ) -> CategoryReport:
+        """See :meth:`InMemoryRepository.category_report`; reads the stored aggregates."""
+
+        publisher_ids = self._active_publisher_ids(category_id)
+        if publisher_id is not None:
+            publisher_ids = [publisher_id] if publisher_id in publisher_ids else []
+        aggregates = {member_id: CreativeAggregates() for member_id in publisher_ids}
+        for start_index in range(0, len(publisher_ids), QUERY_CHUNK_SIZE):
+            chunk = publisher_ids[start_index : start_index + QUERY_CHUNK_SIZE]
+            rows = self._reader.execute(
+                "SELECT publisher_id, metric, key, day, value FROM report_aggregates "
+                f"WHERE publisher_id IN ({', '.join('?' for _ in chunk)}) AND day <= ?",
+                [*chunk, end.toordinal()],
+            )
+            for member_id, metric, key, day, value in rows:
+                aggregates[member_id].add((metric, key, day), value)
+        return build_report(category_id, aggregates.items(), start, end)
+
+    @timed(REPOSITORY_OPERATION_DURATION, "sqlite", "creative_changes")
+    def creative_changes(
+        self,
+        category_id: str,
+        *,
+        after: Optional[int] = None,
+        limit: int = 100,
+    ) -> Tuple[List[CreativeChange], int]:
+        """See :meth:`InMemoryRepository.creative_changes`.
+
+        Positions are shared by every process using the database file.
+        """
+
+        connection = self._reader
+        # One read transaction, so the position and the rows agree.
+        connection.execute("BEGIN")
+        try:
+            row = connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'creative_changes'").fetchone()
+            latest = row[0] if row is not None else 0
+            if after is None:
+                return [], latest
+            if after > latest:
+                raise ChangesExpiredError(f"Position {after} is ahead of the change log ({latest})")
+            row = connection.execute(
+                "SELECT seq FROM creative_change_horizon WHERE category_id = ?", (category_id,)
+            ).fetchone()
+            if row is not None and after < row[0]:
+                raise ChangesExpiredError(f"Changes after {after} are no longer available")
+            rows = connection.execute(
+                "SELECT seq, kind, changed_at, creative FROM creative_changes "
+                "WHERE category_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (category_id, after, limit),
+            ).fetchall()
+        finally:
+            connection.execute("COMMIT")
+        changes = [
+            CreativeChange(
+                seq=seq,
+                kind=kind,
+                changed_at=datetime.fromisoformat(changed_at).replace(tzinfo=timezone.utc),
+                creative=Creative.model_validate_json(creative),
+            )
+            for seq, kind, changed_at, creative in rows
+        ]
+        if len(changes) == limit:
+            return changes, changes[-1].seq
+        return changes, max(after, latest)
+
+    # ------------------------------------------------------------------
+    # Refresh checkpoints
+    # ------------------------------------------------------------------
+    def list_refresh_checkpoints(self, publisher_ids: Iterable[str]) -> List[RefreshCheckpoint]:
+        publisher_ids = list(dict.fromkeys(publisher_ids))
+        checkpoints: List[RefreshCheckpoint] = []
+        for start in range(0, len(publisher_ids), QUERY_CHUNK_SIZE):
+            chunk = publisher_ids[start : start + QUERY_CHUNK_SIZE]
+            rows = self._reader.execute(
+                "SELECT publisher_id, country, ad_type, delivery_date_min, cursor, full_sweep_at "
+                f"FROM refresh_checkpoints WHERE publisher_id IN ({', '.join('?' for _ in chunk)})",
+                chunk,
+            )
+            checkpoints.extend(
+                RefreshCheckpoint(
+                    publisher_id=row[0],
+                    country=row[1],
+                    ad_type=row[2],
+                    delivery_date_min=row[3],
+                    cursor=row[4],
+                    full_sweep_at=row[5],
+                )
+                for row in rows
+            )
+        return checkpoints
+
+    def save_refresh_checkpoints(self, checkpoints: Iterable[RefreshCheckpoint]) -> None:
+        rows = [
+            (
+                checkpoint.publisher_id,
+                checkpoint.country,
+                checkpoint.ad_type,
+                checkpoint.delivery_date_min.isoformat() if checkpoint.delivery_date_min else None,
+                checkpoint.cursor,
+                _timestamp(checkpoint.full_sweep_at) if checkpoint.full_sweep_at else None,
+            )
+            for checkpoint in checkpoints
+        ]
+        with self._transaction() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO refresh_checkpoints "
+                "(publisher_id, country, ad_type, delivery_date_min, cursor, full_sweep_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
@@ -0,0 +1,140 @@
+"""Benchmark near-duplicate clustering of creative copy.
+
+Usage::
+
+    python -m benchmarks.bench_clustering 100000 1000000
+
+Creatives of a :mod:`benchmarks.datagen` catalogue are generated as families
+of variants: each family has base copy drawn from the datagen vocabulary with
+a Zipf-like skew, and every member swaps one or two of its words, the way
+advertisers re-run an ad with a new promo code or amount.
+Upserts go through ``InMemoryRepository.upsert_creatives_batch`` with and
+without the clustering stage, so the difference is its ingest cost; the
+memory column is what a :class:`~app.clustering.ClusterIndex` over the same
+copy holds per creative, measured in a separate pass with ``tracemalloc``.
+"Purity" is the share of creatives whose cluster holds mostly their own
+family and "recall" the share of families collapsed into a single cluster.
+"page" and "grouped" time one page of the category ads endpoint's repository
+call without and with ``group_by=cluster``.
+"""
+from __future__ import annotations
+
+import contextlib
+import itertools
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from unittest import mock
+
+from app.clustering import ClusterIndex
+from app.models import Creative
+from app.repository import InMemoryRepository
+
+from . import datagen
+
+CATEGORIES = 4
+PUBLISHERS = 200
+FAMILY_SIZE = 8
+BATCH_SIZE = 5000
+PAGE_SIZE = 100
+
+
+def _unsigned(fields: Iterable[Optional[str]]) -> None:
+    return None
+
+
+def generate(creative_count: int) -> Iterator[Tuple[int, Creative]]:
+    """Yield ``(family, creative)`` pairs."""
+
+    rng = random.Random(7)
+    vocabulary = datagen.vocabulary(rng)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    for family in range((creative_count + FAMILY_SIZE - 1) // FAMILY_SIZE):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=24)
+        for member in range(min(FAMILY_SIZE, creative_count - family * FAMILY_SIZE)):
+            variant = list(words)
+            for _ in range(rng.randint(1, 2)):
+                variant[rng.randrange(4, 24)] = rng.choice(vocabulary)
+            index = family * FAMILY_SIZE + member
+            yield family, Creative.model_construct(
+                id=f"creative_{index:08d}",
+                publisher_id=f"pub_{rng.randrange(PUBLISHERS):05d}",
+                title=" ".join(variant[:4]),
+                body=" ".join(variant[4:23]),
+                call_to_action=variant[23],
+                platforms=["facebook"],
+            )
+
+
+def ingest(creative_count: int, *, clustering: bool) -> Tuple[InMemoryRepository, Dict[str, int], float]:
+    repository = datagen.build_repository(datagen.generate_dataset(CATEGORIES, PUBLISHERS, 0))
+
+    families: Dict[str, int] = {}
+    creatives = generate(creative_count)
+    # Without clustering every creative gets no signature, so it is never clustered.
+    signing = contextlib.nullcontext() if clustering else mock.patch("app.repository.minhash_signature", _unsigned)
+    start = time.perf_counter()
+    with signing:
+        while True:
+            batch: List[Creative] = []
+            for family, creative in itertools.islice(creatives, BATCH_SIZE):
+                families[creative.id] = family
+                batch.append(creative)
+            if not batch:
+                break
+            repository.upsert_creatives_batch(batch)
+    return repository, families, time.perf_counter() - start
+
+
+def index_memory(creative_count: int) -> int:
+    tracemalloc.start()
+    index = ClusterIndex()
+    for _, creative in generate(creative_count):
+        index.add(creative.id, creative.publisher_id, (creative.title, creative.body, creative.call_to_action))
+    index.commit()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+
+def quality(repository: InMemoryRepository, families: Dict[str, int]) -> Tuple[int, float, float]:
+    clusters: Dict[str, Counter] = {}
+    for shard in repository.snapshot().shards.values():
+        for record in shard.creatives.values():
+            clusters.setdefault(record.cluster_id or record.id, Counter())[families[record.id]] += 1
+    pure = sum(counts.most_common(1)[0][1] for counts in clusters.values())
+    clusters_per_family = Counter(family for counts in clusters.values() for family in counts)
+    family_count = len(set(families.values()))
+    whole = sum(1 for count in clusters_per_family.values() if count == 1)
+    return len(clusters), pure / len(families), whole / family_count
+
+
+def main(sizes: List[int]) -> None:
+    print(
+        f"{'creatives':>10} {'plain (/s)':>11} {'clustered (/s)':>15} {'bytes/creative':>15} "
+        f"{'clusters':>9} {'purity':>7} {'recall':>7} {'page (ms)':>10} {'grouped (ms)':>13}"
+    )
+    for size in sizes:
+        _, _, plain_elapsed = ingest(size, clustering=False)
+        repository, families, elapsed = ingest(size, clustering=True)
+        cluster_count, purity, recall = quality(repository, families)
+
+        category_id = repository.list_categories()[0].id
+        start = time.perf_counter()
+        repository.page_creatives_for_category(category_id, limit=PAGE_SIZE)
+        page = time.perf_counter() - start
+        start = time.perf_counter()
+        repository.page_clusters_for_category(category_id, limit=PAGE_SIZE)
+        grouped = time.perf_counter() - start
+        print(
+            f"{size:>10} {size / plain_elapsed:>11.0f} {size / elapsed:>15.0f} "
+            f"{index_memory(size) / size:>15.0f} {cluster_count:>9} {purity:>7.3f} {recall:>7.3f} "
+            f"{page * 1000:>10.2f} {grouped * 1000:>13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,81 @@
+"""Measure the memory cost of cached creatives.
+
+Usage::
+
+    python -m benchmarks.bench_memory 100000 1000000
+
+For each size the creatives of one :mod:`benchmarks.datagen` dataset are held
+three ways, and the traced allocations are reported in bytes per creative:
+
+* ``models``: a dict of pydantic ``Creative`` objects, the previous storage;
+* ``records``: a dict of interned ``CreativeRecord`` objects, the current
+  storage;
+* ``repository``: a whole ``InMemoryRepository`` including its publisher,
+  keyset and search indexes, loaded with ``datagen.build_repository``.
+
+The dataset is decoded from JSON inside each measurement, so every string is
+built per creative as it would be when decoding an upstream response and
+sharing only comes from interning.
+"""
+from __future__ import annotations
+
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from typing import Callable, List
+
+from app.models import Creative
+from app.records import CreativeRecord
+from app.repository import InMemoryRepository, creative_content_hash
+
+from . import datagen
+
+CATEGORIES = 1
+PUBLISHERS = 200
+
+
+def build_models(encoded: str) -> dict:
+    return {row["id"]: Creative(**row) for row in json.loads(encoded)["creatives"]}
+
+
+def build_records(encoded: str) -> dict:
+    now = time.time()
+    return {
+        creative.id: CreativeRecord.from_model(creative, creative_content_hash(creative), now)
+        for creative in (Creative(**row) for row in json.loads(encoded)["creatives"])
+    }
+
+
+def build_repository(encoded: str) -> InMemoryRepository:
+    return datagen.build_repository(json.loads(encoded))
+
+
+def traced_bytes(build: Callable[[str], object], encoded: str) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        held = build(encoded)
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    del held
+    gc.collect()
+    return used
+
+
+def main(sizes: List[int]) -> None:
+    print(f"{'creatives':>10} {'models (B)':>11} {'records (B)':>12} {'repository (B)':>15}")
+    for size in sizes:
+        encoded = json.dumps(datagen.generate_dataset(CATEGORIES, PUBLISHERS, size))
+        models = traced_bytes(build_models, encoded) / size
+        records = traced_bytes(build_records, encoded) / size
+        repository = traced_bytes(build_repository, encoded) / size
+        print(f"{size:>10} {models:>11.0f} {records:>12.0f} {repository:>15.0f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
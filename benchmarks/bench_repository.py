@@ -0,0 +1,74 @@
+"""Benchmark category creative lookups against the pre-index linear scan.
+
+Usage::
+
+    python -m benchmarks.bench_repository 10000 100000 1000000
+
+Each size loads a :mod:`benchmarks.datagen` dataset of 200 publishers over
+four categories; publishers own creatives with a Zipf-like skew, so the
+categories differ in size. The mean latency of ``list_creatives_by_category``
+is reported for the smallest and largest category, with the secondary
+indexes ("after") and with the original full scans ("before").
+"""
+from __future__ import annotations
+
+import sys
+import time
+from typing import Callable, List
+
+from app.models import Creative
+from app.repository import InMemoryRepository
+
+from .datagen import build_repository, generate_dataset
+
+CATEGORIES = 4
+PUBLISHERS = 200
+
+
+def linear_scan(repository: InMemoryRepository, category_id: str) -> List[Creative]:
+    """Original implementation: scan every publisher, then every creative."""
+
+    publisher_ids = {
+        publisher.id
+        for publisher in repository.list_publishers()
+        if category_id in publisher.category_ids
+    }
+    return [
+        record.to_model()
+        for shard in repository.snapshot().shards.values()
+        for record in shard.creatives.values()
+        if record.publisher_id in publisher_ids
+    ]
+
+
+def time_call(func: Callable[[], object], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main(sizes: List[int]) -> None:
+    print(f"{'creatives':>10} {'category':>18} {'result size':>12} {'before (ms)':>12} {'after (ms)':>11}")
+    for size in sizes:
+        dataset = generate_dataset(CATEGORIES, PUBLISHERS, size)
+        repository = build_repository(dataset)
+        del dataset
+        repeat = max(3, 1_000_000 // max(size, 1))
+        by_size = sorted(
+            (category.id for category in repository.list_categories()),
+            key=lambda category_id: repository.category_counts(category_id)[1],
+        )
+        for category_id in (by_size[0], by_size[-1]):
+            expected = len(linear_scan(repository, category_id))
+            assert len(repository.list_creatives_by_category(category_id)) == expected
+            before = time_call(lambda: linear_scan(repository, category_id), repeat)
+            after = time_call(lambda: repository.list_creatives_by_category(category_id), repeat)
+            print(
+                f"{size:>10} {category_id:>18} {expected:>12} "
+                f"{before * 1000:>12.2f} {after * 1000:>11.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
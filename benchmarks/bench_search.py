@@ -0,0 +1,68 @@
+"""Benchmark category search against a linear scan of the category's creatives.
+
+Usage::
+
+    python -m benchmarks.bench_search 100000 1000000
+
+Each size loads a :mod:`benchmarks.datagen` dataset of four categories and 200
+publishers, whose copy is drawn from a Zipf-like vocabulary so common terms
+have long posting lists; "zeta" and the prefix "w5" match nothing. "before" greps every creative of the category the way a client
+would after downloading ``/api/categories/{id}/ads``; "after" queries the
+inverted index through ``InMemoryRepository.search_creatives``. "cold" is the
+first query for a term, which also groups that term's postings by impact;
+"after" is a repeated query.
+"""
+from __future__ import annotations
+
+import sys
+import time
+from typing import List
+
+from app.models import Creative
+from app.repository import InMemoryRepository
+
+from .datagen import build_repository, generate_dataset
+
+CATEGORIES = 4
+PUBLISHERS = 200
+QUERIES = ["deposit bonus", "free spins", "wager", "jackpot", "lineup", "zeta", "w5"]
+
+
+def linear_scan(repository: InMemoryRepository, category_id: str, query: str) -> List[Creative]:
+    terms = query.lower().split()
+    matches = []
+    for creative in repository.list_creatives_by_category(category_id):
+        text = " ".join(filter(None, (creative.title, creative.body, creative.call_to_action))).lower()
+        if any(term in text for term in terms):
+            matches.append(creative)
+    return matches
+
+
+def main(sizes: List[int]) -> None:
+    print(
+        f"{'creatives':>10} {'query':>14} {'matches':>8} {'before (ms)':>12} "
+        f"{'cold (ms)':>10} {'after (ms)':>11}"
+    )
+    for size in sizes:
+        start = time.perf_counter()
+        repository = build_repository(generate_dataset(CATEGORIES, PUBLISHERS, size))
+        print(f"# built {size} creatives in {time.perf_counter() - start:.1f}s")
+        category_id = repository.list_categories()[0].id
+        for query in QUERIES:
+            start = time.perf_counter()
+            linear_scan(repository, category_id, query)
+            before = time.perf_counter() - start
+            start = time.perf_counter()
+            repository.search_creatives(category_id, query, limit=20)
+            cold = time.perf_counter() - start
+            start = time.perf_counter()
+            _, total = repository.search_creatives(category_id, query, limit=20)
+            after = time.perf_counter() - start
+            print(
+                f"{size:>10} {query:>14} {total:>8} {before * 1000:>12.2f} "
+                f"{cold * 1000:>10.2f} {after * 1000:>11.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,66 @@
+"""Benchmark cold starts from seed JSON against binary snapshots.
+
+Usage::
+
+    python -m benchmarks.bench_snapshot 100000 1000000
+
+For each size a synthetic dataset from :mod:`benchmarks.datagen` is written
+as seed JSON and loaded with ``InMemoryRepository(seed_path)``, which parses
+and validates every record and computes hashes, clusters and the search
+index. The result is dumped with ``dump_snapshot`` and loaded back with
+``load_snapshot``. "import" is the wall time of a fresh interpreter running
+``import app.main``.
+"""
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from app.repository import InMemoryRepository
+
+from .datagen import generate_dataset
+
+
+def import_seconds() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import app.main"], check=True)
+    return time.perf_counter() - start
+
+
+def main(sizes: List[int]) -> None:
+    print(f"import app.main: {import_seconds() * 1000:.0f} ms")
+    print(
+        f"{'creatives':>10} {'seed (MB)':>10} {'seed load (s)':>14} "
+        f"{'snapshot (MB)':>14} {'dump (s)':>9} {'snapshot load (s)':>18}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        seed_path = Path(directory) / "seed.json"
+        snapshot_path = Path(directory) / "seed.snapshot"
+        for size in sizes:
+            seed_path.write_text(json.dumps(generate_dataset(4, 200, size)))
+
+            start = time.perf_counter()
+            repository = InMemoryRepository(seed_path)
+            seed_load = time.perf_counter() - start
+
+            start = time.perf_counter()
+            snapshot_size = repository.dump_snapshot(snapshot_path)
+            dump = time.perf_counter() - start
+            del repository
+
+            start = time.perf_counter()
+            InMemoryRepository().load_snapshot(snapshot_path)
+            snapshot_load = time.perf_counter() - start
+            print(
+                f"{size:>10} {seed_path.stat().st_size / 1e6:>10.1f} {seed_load:>14.2f} "
+                f"{snapshot_size / 1e6:>14.1f} {dump:>9.2f} {snapshot_load:>18.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
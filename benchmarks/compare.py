@@ -0,0 +1,58 @@
+"""Compare two benchmark suite results.
+
+Usage::
+
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 0.1]
+
+Prints every shared latency (``*_ms``) and throughput (``rps``,
+``creatives_per_second``) metric with its relative change and exits with
+status 1 when any of them regressed by more than ``threshold``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, Sequence, Tuple
+
+LOWER_IS_BETTER = ("mean_ms", "p50_ms", "p95_ms", "p99_ms", "seconds")
+HIGHER_IS_BETTER = ("rps", "creatives_per_second")
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in results.items():
+        if key == "meta":
+            continue
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, path)
+        elif isinstance(value, (int, float)) and key in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            yield path, float(value)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark suite JSON files.")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed relative regression.")
+    args = parser.parse_args(argv)
+
+    baseline = dict(flatten(json.loads(args.baseline.read_text())))
+    candidate = dict(flatten(json.loads(args.candidate.read_text())))
+    regressions = 0
+    print(f"{'metric':<55} {'baseline':>12} {'candidate':>12} {'change':>8}")
+    for metric in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[metric], candidate[metric]
+        change = (after - before) / before if before else 0.0
+        worse = -change if metric.rsplit(".", 1)[1] in HIGHER_IS_BETTER else change
+        flag = ""
+        if worse > args.threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{metric:<55} {before:>12.3f} {after:>12.3f} {change:>+8.1%}{flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Synthetic data shaped like ``data/seed.json``, scaled to any size.
+
+Usage::
+
+    python -m benchmarks.datagen --categories 4 --publishers 200 --creatives 100000 -o /tmp/seed.json
+
+Publishers are assigned to categories round-robin (every tenth one to two
+categories), and creatives to publishers with a Zipf-like skew so a few
+publishers own most creatives, as in the live Ad Library. Creative copy is
+drawn from a vocabulary where a handful of gambling terms are common.
+Generation is deterministic for a given ``seed``.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.models import Category, Creative, Publisher
+from app.repository import InMemoryRepository
+
+Dataset = Dict[str, List[Dict[str, Any]]]
+
+COMMON_WORDS = [
+    "deposit", "bonus", "free", "spins", "bet", "casino", "match", "odds", "jackpot", "wager",
+    "play", "win", "today", "offer", "new", "players", "parlay", "boost", "picks", "lineup",
+]
+CALLS_TO_ACTION = ["Sign Up", "Bet Now", "Play Now", "Learn More", "Download", "Claim Offer"]
+PLATFORM_SETS = [["facebook"], ["instagram"], ["facebook", "instagram"], ["facebook", "instagram", "messenger"]]
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def vocabulary(rng: random.Random, size: int = 3000) -> List[str]:
+    """``COMMON_WORDS`` followed by random words, ``size`` in all, most common first."""
+
+    words = list(COMMON_WORDS)
+    while len(words) < size:
+        words.append("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9))))
+    return words
+
+
+def generate_dataset(categories: int, publishers: int, creatives: int, *, seed: int = 42) -> Dataset:
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    word_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    publisher_weights = list(itertools.accumulate(1 / (rank + 1) ** 0.8 for rank in range(publishers)))
+
+    category_rows = [{"id": f"category_{index:03d}", "name": f"Category {index}"} for index in range(categories)]
+    publisher_rows = []
+    for index in range(publishers):
+        category_ids = [category_rows[index % categories]["id"]]
+        if categories > 1 and index % 10 == 9:
+            category_ids.append(category_rows[(index + 1) % categories]["id"])
+        publisher_rows.append(
+            {
+                "id": f"pub_{index:05d}",
+                "name": f"Publisher {index}",
+                "category_ids": category_ids,
+                "country": "US",
+                "status": "active",
+            }
+        )
+
+    creative_rows = []
+    owners = rng.choices(range(publishers), cum_weights=publisher_weights, k=creatives) if publishers else []
+    for index, owner in enumerate(owners):
+        creative_id = f"creative_{index:08d}"
+        copy = rng.choices(words, cum_weights=word_weights, k=16)
+        start = EPOCH + timedelta(minutes=rng.randrange(500_000))
+        ended = rng.random() < 0.3
+        creative_rows.append(
+            {
+                "id": creative_id,
+                "publisher_id": publisher_rows[owner]["id"],
+                "title": " ".join(copy[:3]).title(),
+                "body": " ".join(copy[3:16]).capitalize() + ".",
+                "call_to_action": rng.choice(CALLS_TO_ACTION),
+                "snapshot_url": f"https://example.com/{creative_id}.png",
+                "ad_library_url": f"https://www.facebook.com/ads/library/?id={creative_id}",
+                "platforms": rng.choice(PLATFORM_SETS),
+                "spend": float(rng.randrange(100, 50_000)),
+                "currency": "USD",
+                "start_time": start.isoformat(),
+                "end_time": (start + timedelta(days=rng.randint(1, 60))).isoformat() if ended else None,
+            }
+        )
+    return {"categories": category_rows, "publishers": publisher_rows, "creatives": creative_rows}
+
+
+def build_repository(dataset: Dataset) -> InMemoryRepository:
+    """Load ``dataset`` into a fresh repository, as ``load_seed`` would."""
+
+    repository = InMemoryRepository()
+    for category in dataset["categories"]:
+        repository.upsert_category(Category(**category))
+    for publisher in dataset["publishers"]:
+        repository.upsert_publisher(Publisher(**publisher))
+    repository.upsert_creatives_batch(Creative(**creative) for creative in dataset["creatives"])
+    return repository
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--categories", type=int, default=4)
+    parser.add_argument("--publishers", type=int, default=200)
+    parser.add_argument("--creatives", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", type=Path, required=True)
+    args = parser.parse_args()
+    dataset = generate_dataset(args.categories, args.publishers, args.creatives, seed=args.seed)
+    args.output.write_text(json.dumps(dataset))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""Benchmark suite writing machine-readable results.
+
+Usage::
+
+    python -m benchmarks.suite --creatives 100000 -o bench.json
+    python -m benchmarks.compare before.json after.json
+
+Three groups of measurements run against a synthetic dataset from
+:mod:`benchmarks.datagen`:
+
+* ``micro``: mean and percentile latencies of ``InMemoryRepository`` methods and of
+  ``CategoryService.list_category_summaries``;
+* ``load``: an in-process ASGI load driver (``httpx.ASGITransport``, no
+  sockets) issuing concurrent requests against the public endpoints and
+  reporting p50/p95/p99 latency and requests per second;
+* ``refresh``: ``CreativeService.refresh_creatives_for_publishers`` against a
+  stubbed Meta ``ads_archive`` endpoint that serves paged creatives, reporting
+  creatives applied per second.
+
+Every latency is in milliseconds. The JSON output also records the commit,
+Python version and parameters so runs can be compared across commits.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence
+
+import httpx
+
+from app.config import Settings
+from app.main import create_app
+from app.meta_client import MetaAdLibraryClient
+from app.repository import InMemoryRepository
+from app.services import CategoryService, CreativeService
+
+from .datagen import build_repository, generate_dataset
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``samples``."""
+
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    milliseconds = [sample * 1000 for sample in samples]
+    return {
+        "runs": len(milliseconds),
+        "mean_ms": round(sum(milliseconds) / len(milliseconds), 4),
+        "p50_ms": round(percentile(milliseconds, 0.50), 4),
+        "p95_ms": round(percentile(milliseconds, 0.95), 4),
+        "p99_ms": round(percentile(milliseconds, 0.99), 4),
+    }
+
+
+def time_repeatedly(func: Callable[[], object], repeat: int) -> Dict[str, float]:
+    func()  # warm caches such as postings grouped by impact
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+# ----------------------------------------------------------------------
+# Micro-benchmarks
+# ----------------------------------------------------------------------
+def run_micro(repository: InMemoryRepository, category_id: str, repeat: int) -> Dict[str, Any]:
+    service = CategoryService(repository)
+    first_page, after = repository.page_creatives_for_category(category_id, limit=100)
+    unchanged = first_page[:100]
+    _, position = repository.creative_changes(category_id)
+    return {
+        "list_creatives_by_category": time_repeatedly(
+            lambda: repository.list_creatives_by_category(category_id), max(3, repeat // 20)
+        ),
+        "page_creatives_first": time_repeatedly(
+            lambda: repository.page_creatives_for_category(category_id, limit=100), repeat
+        ),
+        "page_creatives_next": time_repeatedly(
+            lambda: repository.page_creatives_for_category(category_id, limit=100, after=after), repeat
+        ),
+        "page_creatives_platform": time_repeatedly(
+            lambda: repository.page_creatives_for_category(category_id, limit=100, platform="messenger"), repeat
+        ),
+        "search_creatives": time_repeatedly(
+            lambda: repository.search_creatives(category_id, "deposit bonus", limit=20), repeat
+        ),
+        "category_counts": time_repeatedly(lambda: repository.category_counts(category_id), repeat),
+        "upsert_creatives_batch_unchanged": time_repeatedly(
+            lambda: repository.upsert_creatives_batch(unchanged), max(3, repeat // 10)
+        ),
+        "list_category_summaries": time_repeatedly(service.list_category_summaries, repeat),
+        "category_summaries_payload": time_repeatedly(service.category_summaries_payload, repeat),
+        "creative_changes_catch_up": time_repeatedly(
+            lambda: repository.creative_changes(category_id, after=max(position - 500, 0), limit=100), repeat
+        ),
+        "category_report_90d": time_repeatedly(
+            lambda: service.get_report(category_id, start=date(2024, 6, 1), end=date(2024, 8, 29)), repeat
+        ),
+    }
+
+
+# ----------------------------------------------------------------------
+# ASGI load driver
+# ----------------------------------------------------------------------
+async def drive(client: httpx.AsyncClient, path: str, requests: int, concurrency: int) -> Dict[str, Any]:
+    samples: List[float] = []
+    statuses: Dict[int, int] = {}
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.get(path)
+            await response.aread()
+            samples.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    result = summarize(samples)
+    result["rps"] = round(len(samples) / elapsed, 1)
+    result["statuses"] = {str(code): count for code, count in sorted(statuses.items())}
+    return result
+
+
+async def run_load(
+    repository: InMemoryRepository, category_id: str, requests: int, concurrency: int
+) -> Dict[str, Any]:
+    app = create_app(Settings(meta_access_token=None, refresh_enabled=False), repository=repository)
+    transport = httpx.ASGITransport(app=app)
+    endpoints = {
+        "categories": "/api/categories",
+        "publishers": f"/api/categories/{category_id}/publishers",
+        "ads_page": f"/api/categories/{category_id}/ads?limit=100",
+        "ads_filtered": f"/api/categories/{category_id}/ads?limit=100&platform=messenger&open_slots=true",
+        "ads_search": f"/api/categories/{category_id}/ads/search?q=deposit%20bonus",
+    }
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, path in endpoints.items():
+            await drive(client, path, min(requests, 20), concurrency)  # warm-up
+            results[name] = await drive(client, path, requests, concurrency)
+    return results
+
+
+# ----------------------------------------------------------------------
+# Refresh throughput against a stubbed Meta endpoint
+# ----------------------------------------------------------------------
+def meta_stub(ads_per_publisher: int, page_size: int) -> httpx.MockTransport:
+    """Local ``ads_archive`` stand-in serving ``ads_per_publisher`` ads per page ID."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        page_ids = request.url.params["search_page_ids"].split(",")
+        offset = int(request.url.params.get("after", "0"))
+        ads = [
+            {
+                "id": f"{page_id}_ad_{position}",
+                "page_id": page_id,
+                "ad_creative_link_title": f"Offer {position}",
+                "ad_creative_body": "Get a deposit bonus today",
+                "publisher_platforms": ["facebook", "instagram"],
+            }
+            for position in range(offset, min(offset + page_size, ads_per_publisher))
+            for page_id in page_ids
+        ]
+        payload: Dict[str, Any] = {"data": ads}
+        if offset + page_size < ads_per_publisher:
+            next_url = request.url.copy_merge_params({"after": str(offset + page_size)})
+            payload["paging"] = {"next": str(next_url)}
+        return httpx.Response(200, json=payload)
+
+    return httpx.MockTransport(handler)
+
+
+async def run_refresh(publisher_count: int, ads_per_publisher: int) -> Dict[str, Any]:
+    settings = Settings(
+        meta_access_token="bench",
+        meta_page_size=100,
+        meta_rate_limit_per_second=1e9,
+        meta_rate_limit_burst=1e9,
+    )
+    client = MetaAdLibraryClient(settings, transport=meta_stub(ads_per_publisher, settings.meta_page_size))
+    repository = InMemoryRepository()
+    service = CreativeService(repository, client, settings)
+    publisher_ids = [f"page_{index}" for index in range(publisher_count)]
+    results = {}
+    try:
+        for run in ("initial", "unchanged"):
+            requests_before = client.metrics.requests
+            start = time.perf_counter()
+            summary = await service.refresh_creatives_for_publishers(publisher_ids)
+            elapsed = time.perf_counter() - start
+            applied = len(summary.inserted) + len(summary.updated) + summary.unchanged
+            results[run] = {
+                "seconds": round(elapsed, 4),
+                "creatives": applied,
+                "creatives_per_second": round(applied / elapsed, 1),
+                "upstream_requests": client.metrics.requests - requests_before,
+            }
+    finally:
+        await client.aclose()
+    return results
+
+
+# ----------------------------------------------------------------------
+# Entry point
+# ----------------------------------------------------------------------
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Sequence[str] | None = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Run the LiveFBAds benchmark suite.")
+    parser.add_argument("--categories", type=int, default=4)
+    parser.add_argument("--publishers", type=int, default=200)
+    parser.add_argument("--creatives", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=200, help="Iterations per micro-benchmark.")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per load-tested endpoint.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--refresh-publishers", type=int, default=50)
+    parser.add_argument("--refresh-ads", type=int, default=200, help="Stubbed ads per refreshed publisher.")
+    parser.add_argument("--only", choices=("micro", "load", "refresh"), action="append")
+    parser.add_argument("-o", "--output", type=Path, help="Write JSON here instead of stdout.")
+    args = parser.parse_args(argv)
+    groups = args.only or ["micro", "load", "refresh"]
+
+    parameters = {key: value for key, value in vars(args).items() if key not in ("output", "only")}
+    results: Dict[str, Any] = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": parameters,
+        }
+    }
+    if "micro" in groups or "load" in groups:
+        start = time.perf_counter()
+        dataset = generate_dataset(args.categories, args.publishers, args.creatives)
+        repository = build_repository(dataset)
+        results["meta"]["build_seconds"] = round(time.perf_counter() - start, 2)
+        category_id = dataset["categories"][0]["id"]
+        if "micro" in groups:
+            results["micro"] = run_micro(repository, category_id, args.repeat)
+        if "load" in groups:
+            results["load"] = asyncio.run(run_load(repository, category_id, args.requests, args.concurrency))
+    if "refresh" in groups:
+        results["refresh"] = asyncio.run(run_refresh(args.refresh_publishers, args.refresh_ads))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+    return results
+
+
+if __name__ == "__main__":
+    main()
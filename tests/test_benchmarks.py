@@ -0,0 +1,24 @@
+from benchmarks import compare, suite
+from benchmarks.datagen import build_repository, generate_dataset
+
+
+def test_generated_dataset_loads_into_the_repository():
+    dataset = generate_dataset(3, 20, 500, seed=1)
+    repository = build_repository(dataset)
+
+    assert len(repository.list_categories()) == 3
+    assert sum(repository.category_counts(c["id"])[1] for c in dataset["categories"]) >= 500
+    assert generate_dataset(3, 20, 500, seed=1) == dataset
+
+
+def test_suite_writes_comparable_json(tmp_path):
+    output = tmp_path / "bench.json"
+    arguments = ["--creatives", "300", "--publishers", "10", "--repeat", "3", "--requests", "5",
+                 "--concurrency", "2", "--refresh-publishers", "3", "--refresh-ads", "150", "-o", str(output)]
+    results = suite.main(arguments)
+
+    assert set(results) == {"meta", "micro", "load", "refresh"}
+    assert results["load"]["ads_page"]["statuses"] == {"200": 5}
+    assert results["refresh"]["initial"]["creatives"] == 450
+    assert results["refresh"]["unchanged"]["upstream_requests"] == 2
+    assert compare.main([str(output), str(output)]) == 0
@@ -0,0 +1,150 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.changes import ChangesExpiredError
+from app.config import Settings
+from app.feed import ChangeFeed
+from app.main import create_app
+from app.models import Category, Creative, Publisher
+from app.repository import InMemoryRepository
+from app.sqlite_repository import SqliteRepository
+
+ENDED_AT = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def _populate(repository):
+    repository.upsert_category(Category(id="casino", name="Casino"))
+    repository.upsert_category(Category(id="sports", name="Sports"))
+    repository.upsert_publisher(Publisher(id="pub_a", name="A", category_ids=["casino"]))
+    repository.upsert_publisher(Publisher(id="pub_b", name="B", category_ids=["sports"]))
+
+
+def _kinds(changes):
+    return [(change.kind, change.creative.id) for change in changes]
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_changes_are_logged_per_category(tmp_path, backend):
+    if backend == "memory":
+        repository = InMemoryRepository(change_log_capacity=4)
+    else:
+        repository = SqliteRepository(tmp_path / "ads.sqlite3", change_log_capacity=4)
+    _populate(repository)
+    changes, start = repository.creative_changes("casino")
+    assert changes == []
+
+    repository.upsert_creative(Creative(id="c1", publisher_id="pub_a", title="Spin"))
+    repository.upsert_creative(Creative(id="s1", publisher_id="pub_b", title="Bet"))
+    repository.upsert_creatives_batch(
+        [Creative(id="c1", publisher_id="pub_a", title="Spin more"), Creative(id="c2", publisher_id="pub_a")],
+        publisher_ids=["pub_a"],
+    )
+    repository.upsert_creatives_batch([Creative(id="c2", publisher_id="pub_a")], publisher_ids=["pub_a"], now=ENDED_AT)
+
+    changes, position = repository.creative_changes("casino", after=start)
+    assert _kinds(changes) == [("inserted", "c1"), ("updated", "c1"), ("inserted", "c2"), ("ended", "c1")]
+    assert changes[1].creative.title == "Spin more"
+    assert changes[3].creative.end_time == ENDED_AT
+    assert [change.seq for change in changes] == sorted({change.seq for change in changes})
+    assert position == changes[-1].seq
+    assert _kinds(repository.creative_changes("sports", after=start)[0]) == [("inserted", "s1")]
+
+    first, resume = repository.creative_changes("casino", after=start, limit=3)
+    rest, _ = repository.creative_changes("casino", after=resume)
+    assert first + rest == changes
+    assert repository.creative_changes("casino", after=position) == ([], position)
+
+    # Only the last four changes of a category are kept.
+    repository.upsert_creative(Creative(id="c3", publisher_id="pub_a"))
+    with pytest.raises(ChangesExpiredError):
+        repository.creative_changes("casino", after=start)
+    assert _kinds(repository.creative_changes("casino", after=changes[0].seq)[0])[-1] == ("inserted", "c3")
+
+    # Positions the log never handed out, e.g. from before a restart, are expired too.
+    latest = repository.creative_changes("casino")[1]
+    with pytest.raises(ChangesExpiredError):
+        repository.creative_changes("casino", after=latest + 1)
+
+
+def test_changes_endpoint_catches_up_from_a_position():
+    app = create_app(repository=InMemoryRepository(change_log_capacity=2))
+    repository = app.state.repository
+    _populate(repository)
+    client = TestClient(app)
+
+    response = client.get("/api/categories/casino/ads/changes")
+    assert response.json() == []
+    since = response.headers["X-Change-Seq"]
+    repository.upsert_creative(Creative(id="c1", publisher_id="pub_a"))
+
+    response = client.get("/api/categories/casino/ads/changes", params={"since": since})
+    assert [(change["kind"], change["creative"]["id"]) for change in response.json()] == [("inserted", "c1")]
+    assert int(response.headers["X-Change-Seq"]) == response.json()[0]["seq"]
+
+    for index in range(2, 5):
+        repository.upsert_creative(Creative(id=f"c{index}", publisher_id="pub_a"))
+    assert client.get("/api/categories/casino/ads/changes", params={"since": since}).status_code == 410
+
+
+def _events(chunks):
+    events = []
+    for chunk in chunks:
+        fields = dict(line.split(": ", 1) for line in chunk.decode().splitlines() if line[:1] not in ("", ":"))
+        if fields:
+            events.append((fields["event"], json.loads(fields["data"]).get("creative", {}).get("id")))
+    return events
+
+
+def test_feed_fans_out_to_fast_and_slow_subscribers():
+    repository = InMemoryRepository()
+    _populate(repository)
+    settings = Settings(change_stream_poll_seconds=0.001, change_stream_buffer=2, change_stream_keepalive_seconds=0.01)
+
+    async def read(stream, count, delay):
+        chunks = []
+        async for chunk in stream:
+            chunks.append(chunk)
+            if len(_events(chunks)) == count:
+                break
+            await asyncio.sleep(delay)
+        await stream.aclose()
+        return _events(chunks)
+
+    async def scenario():
+        feed = ChangeFeed(repository, settings)
+        _, start = repository.creative_changes("casino")
+        streams = [feed.stream("casino") for _ in range(3)] + [feed.stream("casino", since=start)]
+        for stream in streams:
+            await stream.__anext__()
+        assert len(feed._channels) == 1
+
+        repository.upsert_creatives_batch(Creative(id=f"c{index}", publisher_id="pub_a") for index in range(6))
+        repository.upsert_creative(Creative(id="s1", publisher_id="pub_b"))
+        repository.upsert_creatives_batch([], publisher_ids=["pub_a"], now=ENDED_AT)
+        results = await asyncio.gather(
+            *(read(stream, 12, delay) for stream, delay in zip(streams, (0, 0, 0.005, 0)))
+        )
+        await feed.aclose()
+        return results
+
+    expected = [("inserted", f"c{index}") for index in range(6)] + [("ended", f"c{index}") for index in range(6)]
+    assert asyncio.run(scenario()) == [expected] * 4
+
+
+def test_feed_resets_subscribers_behind_the_log():
+    repository = InMemoryRepository(change_log_capacity=1)
+    _populate(repository)
+    for index in range(3):
+        repository.upsert_creative(Creative(id=f"c{index}", publisher_id="pub_a"))
+
+    async def scenario():
+        feed = ChangeFeed(repository, Settings(change_stream_poll_seconds=0.001))
+        chunks = [chunk async for chunk in feed.stream("casino", since=0)]
+        await feed.aclose()
+        return chunks
+
+    assert asyncio.run(scenario())[-1].startswith(b"event: reset")
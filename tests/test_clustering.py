@@ -0,0 +1,117 @@
+from fastapi.testclient import TestClient
+
+from app.clustering import ClusterIndex, minhash_signature, similarity
+from app.main import create_app
+from app.models import Category, Creative, Publisher
+from app.sqlite_repository import SqliteRepository
+
+BASE_COPY = "Claim your 200% welcome bonus up to $500 plus 50 free spins on your first deposit today"
+OTHER_COPY = "Watch every live game this season with no blackouts and cancel anytime"
+
+
+def _variant(index: int) -> str:
+    return BASE_COPY.replace("today", f"today code{index}")
+
+
+def test_near_duplicates_share_a_cluster_and_unrelated_copy_does_not():
+    assert minhash_signature([None, ""]) is None
+    assert similarity(minhash_signature([BASE_COPY]), minhash_signature([_variant(1)])) > 0.6
+    assert similarity(minhash_signature([BASE_COPY]), minhash_signature([OTHER_COPY])) < 0.2
+
+    index = ClusterIndex()
+    assert index.add("ad_1", "p1", ["Welcome", BASE_COPY, "Sign up"]) == "ad_1"
+    assert index.add("ad_2", "p2", ["Welcome", _variant(2), "Sign up"]) == "ad_1"
+    assert index.add("ad_3", "p1", [None, OTHER_COPY, None]) == "ad_3"
+    assert index.add("ad_4", "p1", [None, None, None]) is None
+    assert index.snapshot.members("ad_1") == []
+    snapshot = index.commit()
+    assert snapshot.members("ad_1") == [("ad_1", "p1"), ("ad_2", "p2")]
+
+    # Rewriting the founder moves it; the cluster keeps its label, and a new
+    # cluster founded by the same creative gets a fresh one.
+    assert index.add("ad_1", "p1", [OTHER_COPY.replace("anytime", "any time")]) == "ad_3"
+    assert index.add("ad_1", "p1", ["Brand new slot machines landing every single week"]) == "ad_1.1"
+    index.commit()
+    assert index.snapshot.members("ad_1") == [("ad_2", "p2")]
+    assert snapshot.members("ad_1") == [("ad_1", "p1"), ("ad_2", "p2")]
+    assert len(index) == 3
+
+
+def test_category_ads_can_be_grouped_by_cluster():
+    app = create_app()
+    repository = app.state.repository
+    repository.upsert_creatives_batch(
+        [
+            Creative(id="cluster_a1", publisher_id="pub_0001", body=BASE_COPY, platforms=["facebook"]),
+            Creative(id="cluster_a2", publisher_id="pub_0001", body=_variant(2), platforms=["instagram"]),
+            Creative(id="cluster_a3", publisher_id="pub_0001", body=_variant(3), platforms=["instagram"]),
+            Creative(id="cluster_b1", publisher_id="pub_0001", body=OTHER_COPY, platforms=["instagram"]),
+        ]
+    )
+    client = TestClient(app)
+    params = {"group_by": "cluster", "publisher_id": "pub_0001"}
+
+    clusters = client.get("/api/categories/online_casino/ads", params=params).json()
+    grouped = {item["creative"]["id"]: (item["cluster_id"], item["size"]) for item in clusters}
+    assert grouped["cluster_a1"] == ("cluster_a1", 3)
+    assert grouped["cluster_b1"] == ("cluster_b1", 1)
+    assert not {"cluster_a2", "cluster_a3"} & grouped.keys()
+
+    # Filters apply before grouping: the representative is the first visible member.
+    response = client.get(
+        "/api/categories/online_casino/ads", params={**params, "platform": "instagram", "fields": "id", "limit": 1}
+    )
+    assert response.json() == [{"cluster_id": "cluster_a1", "size": 2, "creative": {"id": "cluster_a2"}}]
+    following = client.get(
+        "/api/categories/online_casino/ads",
+        params={**params, "platform": "instagram", "cursor": response.headers["x-next-cursor"]},
+    ).json()
+    assert [item["creative"]["id"] for item in following if item["creative"]["id"].startswith("cluster")] == [
+        "cluster_b1"
+    ]
+    assert client.get("/api/categories/online_casino/ads", params={"group_by": "brand"}).status_code == 422
+
+
+def test_sqlite_clusters_match_in_memory(tmp_path):
+    creatives = [
+        Creative(id="c1", publisher_id="pub_a", body=BASE_COPY),
+        Creative(id="c2", publisher_id="pub_b", body=_variant(2)),
+        Creative(id="c3", publisher_id="pub_a", body=OTHER_COPY),
+        Creative(id="c4", publisher_id="pub_a"),
+    ]
+    repository = SqliteRepository(tmp_path / "ads.sqlite3")
+    repository.upsert_category(Category(id="casino", name="Casino"))
+    repository.upsert_publisher(Publisher(id="pub_a", name="A", category_ids=["casino"]))
+    repository.upsert_publisher(Publisher(id="pub_b", name="B", category_ids=["casino"]))
+    repository.upsert_creatives_batch(creatives)
+
+    clusters, next_after = repository.page_clusters_for_category("casino", limit=10)
+    assert [(c.cluster_id, c.size, c.creative.id) for c in clusters] == [
+        ("c1", 2, "c1"),
+        ("c3", 1, "c3"),
+        (None, 1, "c4"),
+    ]
+    assert next_after is None
+    clusters, _ = repository.page_clusters_for_category("casino", limit=10, publisher_id="pub_b")
+    assert [(c.cluster_id, c.size, c.creative.id) for c in clusters] == [("c1", 1, "c2")]
+
+    repository.upsert_creative(creatives[0].model_copy(update={"body": OTHER_COPY}))
+    clusters, _ = repository.page_clusters_for_category("casino", limit=10)
+    assert [(c.cluster_id, c.size, c.creative.id) for c in clusters] == [
+        ("c3", 2, "c1"),
+        ("c1", 1, "c2"),
+        (None, 1, "c4"),
+    ]
+
+    # Signatures written by an earlier MinHash are recomputed once on open;
+    # creatives keep their clusters and later ones still find them.
+    repository._writer.execute("UPDATE creatives SET minhash = zeroblob(128) WHERE minhash IS NOT NULL")
+    repository._writer.execute("UPDATE meta SET value = 1 WHERE key = 'minhash_version'")
+    repository.close()
+    repository = SqliteRepository(tmp_path / "ads.sqlite3")
+    assert repository._writer.execute("SELECT minhash FROM creatives WHERE id = 'c2'").fetchone()[0] == (
+        minhash_signature([None, _variant(2), None])
+    )
+    repository.upsert_creative(Creative(id="c5", publisher_id="pub_b", body=_variant(5)))
+    clusters, _ = repository.page_clusters_for_category("casino", limit=10, publisher_id="pub_b")
+    assert [(c.cluster_id, c.size, c.creative.id) for c in clusters] == [("c1", 2, "c2")]
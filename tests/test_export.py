@@ -0,0 +1,33 @@
+import csv
+import io
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.models import Creative
+
+
+def test_export_streams_ndjson_and_supports_incremental_pulls():
+    app = create_app()
+    client = TestClient(app)
+
+    full = client.get("/api/categories/online_casino/ads/export")
+    assert full.status_code == 200
+    assert full.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in full.text.splitlines()]
+    assert [line["id"] for line in lines] == ["creative_100"]
+
+    watermark = full.headers["x-export-watermark"]
+    app.state.repository.upsert_creative(Creative(id="creative_500", publisher_id="pub_0001", title="New"))
+    incremental = client.get("/api/categories/online_casino/ads/export", params={"since": watermark})
+    assert [json.loads(line)["id"] for line in incremental.text.splitlines()] == ["creative_500"]
+
+
+def test_export_streams_csv():
+    client = TestClient(create_app())
+    response = client.get("/api/categories/online_casino/ads/export", params={"format": "csv"})
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert rows[0]["id"] == "creative_100"
+    assert rows[0]["platforms"] == "facebook,instagram"
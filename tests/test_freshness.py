@@ -0,0 +1,94 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.config import Settings
+from app.freshness import OnDemandRefresher
+from app.main import create_app
+from app.models import Creative, Publisher
+from app.repository import InMemoryRepository
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class SlowMetaClient:
+    enabled = True
+
+    def __init__(self) -> None:
+        self.calls: list = []
+        self.release = asyncio.Event()
+
+    async def fetch_creative_pages(self, publisher_ids, **query):
+        publisher_ids = list(publisher_ids)
+        self.calls.append(publisher_ids)
+        await self.release.wait()
+        yield [Creative(id=f"{p}_live_{len(self.calls)}", publisher_id=p) for p in publisher_ids], None
+
+
+def _refresher(client, clock):
+    repository = InMemoryRepository()
+    for publisher_id in ("pub_a", "pub_b"):
+        repository.upsert_publisher(Publisher(id=publisher_id, name=publisher_id, category_ids=["casino"]))
+    settings = Settings(fresh_ttl_seconds=60, fresh_stale_seconds=600, fresh_wait_seconds=5)
+    return repository, OnDemandRefresher(repository, client, settings, clock=clock)
+
+
+def test_concurrent_requests_share_one_upstream_fetch():
+    client = SlowMetaClient()
+    repository, refresher = _refresher(client, FakeClock())
+
+    async def scenario():
+        requests = [asyncio.create_task(refresher.ensure_fresh(["pub_a", "pub_b"])) for _ in range(5)]
+        await asyncio.sleep(0)
+        client.release.set()
+        await asyncio.gather(*requests)
+
+    asyncio.run(scenario())
+    assert client.calls == [["pub_a", "pub_b"]]
+    assert [c.id for c in repository.list_creatives_by_category("casino")] == ["pub_a_live_1", "pub_b_live_1"]
+
+
+def test_ttl_and_stale_while_revalidate():
+    client = SlowMetaClient()
+    client.release.set()
+    clock = FakeClock()
+    repository, refresher = _refresher(client, clock)
+
+    async def scenario():
+        await refresher.ensure_fresh(["pub_a"])
+        assert len(client.calls) == 1
+
+        clock.now += 30
+        await refresher.ensure_fresh(["pub_a"])
+        assert len(client.calls) == 1
+
+        # Past the TTL: answered from the cache while the refresh runs behind it.
+        clock.now += 60
+        client.release.clear()
+        await refresher.ensure_fresh(["pub_a"])
+        await asyncio.sleep(0.001)
+        assert len(client.calls) == 2
+        assert [c.id for c in repository.list_creatives_by_category("casino")] == ["pub_a_live_1"]
+        client.release.set()
+        await asyncio.sleep(0.01)
+        assert "pub_a_live_2" in [c.id for c in repository.list_creatives_by_category("casino")]
+
+        # Past the stale window: the request waits for the refresh.
+        clock.now += 1_000
+        await refresher.ensure_fresh(["pub_a"])
+        assert "pub_a_live_3" in [c.id for c in repository.list_creatives_by_category("casino")]
+
+    asyncio.run(scenario())
+
+
+def test_fresh_query_parameter_is_a_no_op_without_a_token():
+    client = TestClient(create_app(Settings(meta_access_token=None)))
+    response = client.get("/api/categories/online_casino/ads", params={"fresh": "true"})
+    assert response.status_code == 200
+    assert response.json()
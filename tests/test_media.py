@@ -0,0 +1,145 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import Settings
+from app.main import create_app
+from app.media import MediaCache, MediaFetchError
+from app.models import Creative
+
+
+class SnapshotHost:
+    """Local stand-in for the snapshot CDN."""
+
+    def __init__(self, files: dict) -> None:
+        self.files = files
+        self.requests: list = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request.url.path)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        content = self.files.get(request.url.path)
+        if content is None:
+            return httpx.Response(404)
+        return httpx.Response(200, content=content, headers={"Content-Type": "image/png"})
+
+
+def _cache(tmp_path, host, **overrides) -> MediaCache:
+    settings = Settings(media_cache_dir=str(tmp_path / "media"), **overrides)
+    return MediaCache(settings, transport=httpx.MockTransport(host))
+
+
+def test_snapshots_are_served_from_a_content_addressed_cache(tmp_path):
+    host = SnapshotHost({"/a.png": b"same-image", "/b.png": b"same-image"})
+    app = create_app(Settings(meta_access_token=None, refresh_enabled=False))
+    app.state.media_cache = _cache(tmp_path, host)
+    repository = app.state.repository
+    repository.upsert_creative(Creative(id="ad_a", publisher_id="pub_0001", snapshot_url="https://cdn.test/a.png"))
+    repository.upsert_creative(Creative(id="ad_b", publisher_id="pub_0002", snapshot_url="https://cdn.test/b.png"))
+    client = TestClient(app)
+
+    first = client.get("/api/creatives/ad_a/snapshot", follow_redirects=False)
+    assert first.status_code == 302
+    assert first.headers["cache-control"] == "public, max-age=300"
+    second = client.get("/api/creatives/ad_b/snapshot", follow_redirects=False)
+    assert second.headers["location"] == first.headers["location"]
+    assert len(list((tmp_path / "media").glob("*/*.png"))) == 1
+
+    media = client.get(first.headers["location"])
+    assert media.content == b"same-image"
+    assert media.headers["content-type"] == "image/png"
+    assert media.headers["cache-control"] == "public, max-age=31536000, immutable"
+    # Upstream content types are not trusted to be inert.
+    assert media.headers["x-content-type-options"] == "nosniff"
+    assert media.headers["content-security-policy"] == "sandbox"
+    revalidated = client.get(first.headers["location"], headers={"If-None-Match": media.headers["etag"]})
+    assert revalidated.status_code == 304
+
+    client.get("/api/creatives/ad_a/snapshot", follow_redirects=False)
+    assert host.requests == ["/a.png", "/b.png"]
+    assert client.get("/api/creatives/missing/snapshot").status_code == 404
+    assert client.get("/api/media/0000").status_code == 404
+
+
+def test_fetches_are_bounded_coalesced_and_evicted_least_recently_used(tmp_path):
+    host = SnapshotHost({f"/{index}.png": bytes([index]) * 100 for index in range(6)})
+    cache = _cache(tmp_path, host, media_fetch_concurrency=2, media_cache_max_bytes=350)
+
+    async def scenario():
+        urls = [f"https://cdn.test/{index}.png" for index in range(3)]
+        digests = await asyncio.gather(*(cache.fetch(url) for url in urls + urls))
+        assert digests[:3] == digests[3:]
+        assert host.max_in_flight == 2 and len(host.requests) == 3
+        # Touching the first blob makes the second the least recently used.
+        assert cache.get(digests[0]) is not None
+        digests.append(await cache.fetch("https://cdn.test/3.png"))
+        with pytest.raises(MediaFetchError):
+            await cache.fetch("https://cdn.test/missing.png")
+        await cache.aclose()
+        return digests
+
+    digests = asyncio.run(scenario())
+    assert cache.size == 300
+    assert cache.get(digests[1]) is None
+    assert all(cache.get(digest) is not None for digest in (digests[0], digests[2], digests[-1]))
+    assert len(list((tmp_path / "media").glob("*/*"))) == 3
+
+    reopened = _cache(tmp_path, host, media_cache_max_bytes=350)
+    assert len(reopened) == 3 and reopened.size == 300
+
+
+def test_concurrent_downloads_of_the_same_content_are_counted_once(tmp_path):
+    host = SnapshotHost({"/a.png": b"same-image", "/b.png": b"same-image"})
+    cache = _cache(tmp_path, host)
+
+    async def scenario():
+        digests = await asyncio.gather(cache.fetch("https://cdn.test/a.png"), cache.fetch("https://cdn.test/b.png"))
+        await cache.aclose()
+        return digests
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert len(cache) == 1 and cache.size == len(b"same-image")
+
+
+def test_oversized_fetches_are_abandoned_and_served_blobs_outlive_eviction(tmp_path):
+    async def chunks():
+        for _ in range(4):
+            yield b"x" * 100
+
+    def host(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/streamed.png":
+            # No Content-Length: the limit applies while reading.
+            return httpx.Response(200, content=chunks())
+        return httpx.Response(200, content=request.url.path.encode() * 20)
+
+    cache = _cache(tmp_path, host, media_fetch_max_bytes=300, media_cache_max_bytes=300)
+
+    async def scenario():
+        with pytest.raises(MediaFetchError):
+            await cache.fetch("https://cdn.test/streamed.png")
+        first = await cache.fetch("https://cdn.test/a.png")
+        path, _ = cache.pin(first)
+        await cache.fetch("https://cdn.test/b.png")
+        last = await cache.fetch("https://cdn.test/c.png")
+        await cache.aclose()
+        return first, path, last
+
+    first, path, last = asyncio.run(scenario())
+    assert cache.get(first) is None and path.is_file()
+    cache.unpin(first)
+    assert not path.exists()
+    assert not list((tmp_path / "media").glob("*/.*"))
+
+    app = create_app(Settings(meta_access_token=None, refresh_enabled=False))
+    app.state.media_cache = cache
+    cache.get(last)[0].unlink()
+    assert TestClient(app).get(f"/api/media/{last}").status_code == 404
+    assert cache.get(last) is None
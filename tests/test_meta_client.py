@@ -0,0 +1,326 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from app.config import Settings
+from app.meta_client import MetaAdLibraryClient
+from app.models import Publisher
+from app.rate_limit import AdaptiveTokenBucket, parse_usage
+from app.repository import InMemoryRepository
+from app.services import CreativeService
+
+
+def _ads_archive_stub(pages_per_batch: int, seen: list, in_flight: list):
+    """Local stand-in for the ``ads_archive`` endpoint with cursor paging."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/v18.0/ads_archive"
+        page_ids = request.url.params["search_page_ids"].split(",")
+        page = int(request.url.params.get("after", "0"))
+        seen.append((tuple(page_ids), page))
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight[1], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+
+        payload = {
+            "data": [
+                {"id": f"{page_id}_ad_{page}", "page_id": page_id, "publisher_platforms": ["facebook"]}
+                for page_id in page_ids
+            ]
+        }
+        if page + 1 < pages_per_batch:
+            next_url = request.url.copy_merge_params({"after": str(page + 1)})
+            payload["paging"] = {"cursors": {"after": str(page + 1)}, "next": str(next_url)}
+        return httpx.Response(200, json=payload)
+
+    return handler
+
+
+def test_fetch_batches_publishers_and_follows_every_cursor():
+    seen: list = []
+    in_flight = [0, 0]
+    settings = Settings(meta_access_token="token", meta_batch_size=2, meta_max_concurrency=2)
+    client = MetaAdLibraryClient(
+        settings, transport=httpx.MockTransport(_ads_archive_stub(3, seen, in_flight))
+    )
+
+    async def run():
+        try:
+            return await client.fetch_active_creatives(["p1", "p2", "p3", "p4", "p5", "p1"])
+        finally:
+            await client.aclose()
+
+    creatives = asyncio.run(run())
+
+    assert {batch for batch, _ in seen} == {("p1", "p2"), ("p3", "p4"), ("p5",)}
+    assert len(seen) == 9
+    assert len(creatives) == 15
+    assert {c.id for c in creatives if c.publisher_id == "p5"} == {"p5_ad_0", "p5_ad_1", "p5_ad_2"}
+    assert in_flight[1] == 2
+
+
+def test_fetch_without_token_makes_no_requests():
+    def handler(request: httpx.Request) -> httpx.Response:  # pragma: no cover - must not be called
+        raise AssertionError("unexpected request")
+
+    client = MetaAdLibraryClient(Settings(), transport=httpx.MockTransport(handler))
+    assert asyncio.run(client.fetch_active_creatives(["p1"])) == []
+
+
+def _fast_retry_settings(**overrides) -> Settings:
+    values = dict(
+        meta_access_token="token",
+        meta_rate_limit_per_second=1000,
+        meta_retry_backoff_base_seconds=0.001,
+    )
+    values.update(overrides)
+    return Settings(**values)
+
+
+def _scripted(responses: list, seen: list):
+    """Mock transport replaying ``responses`` in order, then empty pages."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        if responses:
+            return responses.pop(0)
+        return httpx.Response(200, json={"data": []})
+
+    return httpx.MockTransport(handler)
+
+
+def test_throttled_requests_are_retried_and_slow_the_limiter():
+    seen: list = []
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0", "X-App-Usage": json.dumps({"call_count": 100})}),
+        httpx.Response(
+            400,
+            json={"error": {"code": 80004, "message": "too many calls"}},
+            headers={
+                "X-Business-Use-Case-Usage": json.dumps(
+                    {"123": [{"type": "ads_archive", "call_count": 99, "estimated_time_to_regain_access": 0}]}
+                )
+            },
+        ),
+        httpx.Response(
+            200,
+            json={"data": [{"id": "ad_1", "page_id": "p1"}]},
+            headers={"X-App-Usage": json.dumps({"call_count": 80, "total_time": 10, "total_cputime": 5})},
+        ),
+    ]
+    client = MetaAdLibraryClient(_fast_retry_settings(), transport=_scripted(responses, seen))
+
+    creatives = asyncio.run(client.fetch_active_creatives(["p1"]))
+
+    assert [c.id for c in creatives] == ["ad_1"]
+    assert len(seen) == 3
+    status = client.rate_limit_status()
+    assert (status.requests, status.throttled, status.retries) == (3, 2, 2)
+    assert status.usage_percent == 80
+    assert status.current_rate == pytest.approx(400)
+
+
+def test_retry_budget_caps_retries_across_requests():
+    seen: list = []
+    client = MetaAdLibraryClient(
+        _fast_retry_settings(meta_retry_budget_ratio=0.0, meta_retry_budget_reserve=1),
+        transport=_scripted([httpx.Response(503) for _ in range(10)], seen),
+    )
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(client.fetch_active_creatives(["p1"]))
+
+    assert len(seen) == 2
+    status = client.rate_limit_status()
+    assert (status.server_errors, status.retries, status.retries_denied) == (2, 1, 1)
+
+
+def test_client_errors_are_not_retried():
+    seen: list = []
+    client = MetaAdLibraryClient(
+        _fast_retry_settings(),
+        transport=_scripted([httpx.Response(400, json={"error": {"code": 100}})], seen),
+    )
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(client.fetch_active_creatives(["p1"]))
+    assert len(seen) == 1
+
+
+def test_delivery_dates_and_spend_are_requested_and_parsed():
+    requested: list = []
+    ads = [
+        {
+            "id": "ad_1",
+            "page_id": "p1",
+            "ad_delivery_start_time": "2024-03-01",
+            "ad_delivery_stop_time": "2024-03-15",
+            "spend": {"lower_bound": "100", "upper_bound": "199"},
+            "currency": "EUR",
+        },
+        {"id": "ad_2", "page_id": "p1", "spend": {"lower_bound": "1000000"}, "currency": "USD"},
+        {"id": "ad_3", "page_id": "p1"},
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.extend(request.url.params["fields"].split(","))
+        return httpx.Response(200, json={"data": ads})
+
+    client = MetaAdLibraryClient(Settings(meta_access_token="token"), transport=httpx.MockTransport(handler))
+    first, top_range, unreported = asyncio.run(client.fetch_active_creatives(["p1"]))
+
+    assert {"ad_delivery_start_time", "ad_delivery_stop_time", "spend", "currency"} <= set(requested)
+    assert first.start_time == datetime(2024, 3, 1, tzinfo=timezone.utc)
+    assert first.end_time == datetime(2024, 3, 15, tzinfo=timezone.utc)
+    assert (first.spend, first.currency) == (149.5, "EUR")
+    assert (top_range.spend, top_range.currency, top_range.end_time) == (1000000.0, "USD", None)
+    assert (unreported.spend, unreported.currency, unreported.start_time) == (None, None, None)
+
+    repository = InMemoryRepository()
+    repository.upsert_publisher(Publisher(id="p1", name="P1"))
+    repository.upsert_creative(first)
+    assert repository.get_creative("ad_1") == first
+
+
+def test_refresh_sweeps_the_query_matrix_and_resumes_from_checkpoints():
+    # Two pages per query: one ad per (publisher, country, ad type, page).
+    ad_types = ("ALL", "POLITICAL_AND_ISSUE_ADS")
+    live = {(p, c, t, n) for p in ("p1", "p2") for c in ("US", "GB") for t in ad_types for n in (0, 1)}
+    seen: list = []
+    fail_once: set = set()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        query = (params["ad_reached_countries"], params["ad_type"], params.get("ad_delivery_date_min"))
+        page = int(params.get("after", "0"))
+        seen.append((params["search_page_ids"], *query, page))
+        if (query[:2], page) in fail_once:
+            fail_once.discard((query[:2], page))
+            return httpx.Response(400, json={"error": {"code": 100}})
+        data = [
+            {"id": f"{p}_{c}_{t}_{n}", "page_id": p}
+            for p, c, t, n in sorted(live)
+            if p in params["search_page_ids"].split(",") and (c, t, n) == (query[0], query[1], page)
+        ]
+        payload: dict = {"data": data}
+        if page == 0:
+            payload["paging"] = {"next": str(request.url.copy_merge_params({"after": "1"}))}
+        return httpx.Response(200, json=payload)
+
+    settings = _fast_retry_settings(meta_countries=["US", "GB"], meta_ad_types=list(ad_types))
+    repository = InMemoryRepository()
+    for publisher_id in ("p1", "p2"):
+        repository.upsert_publisher(Publisher(id=publisher_id, name=publisher_id, category_ids=["casino"]))
+    client = MetaAdLibraryClient(settings, transport=httpx.MockTransport(handler))
+    service = CreativeService(repository, client, settings)
+
+    def refresh(**kwargs):
+        return asyncio.run(service.refresh_creatives_for_publishers(["p1", "p2"], **kwargs))
+
+    first = refresh()
+    assert len(first.inserted) == 16 and not first.ended
+    assert len(seen) == 8 and {entry[0] for entry in seen} == {"p1,p2"}
+    assert all(entry[3] is None for entry in seen)
+    checkpoints = repository.list_refresh_checkpoints(["p1"])
+    watermark = (datetime.now(timezone.utc) - timedelta(days=1)).date()
+    assert len(checkpoints) == 4
+    assert {(c.delivery_date_min, c.cursor) for c in checkpoints} == {(watermark, None)}
+
+    # Incremental runs only ask for recent deliveries and never end-date.
+    live.discard(("p1", "US", "ALL", 0))
+    seen.clear()
+    fail_once.add((("GB", "ALL"), 1))
+    with pytest.raises(httpx.HTTPStatusError):
+        refresh()
+    assert {entry[3] for entry in seen} == {watermark.isoformat()}
+    interrupted = {c.key: c for c in repository.list_refresh_checkpoints(["p2"])}
+    assert interrupted["p2", "GB", "ALL"].cursor == "1"
+    assert interrupted["p2", "US", "ALL"].cursor is None
+
+    seen.clear()
+    second = refresh()
+    assert ("p1,p2", "GB", "ALL", watermark.isoformat(), 1) in seen
+    assert ("p1,p2", "GB", "ALL", watermark.isoformat(), 0) not in seen
+    assert not second.ended and not second.inserted
+
+    # A full sweep detects the creative Meta stopped returning.
+    swept = refresh(full=True)
+    assert swept.ended == ["p1_US_ALL_0"]
+
+
+def test_refresh_writes_off_the_event_loop():
+    threads: list = []
+
+    class RecordingRepository(InMemoryRepository):
+        def upsert_creatives_batch(self, *args, **kwargs):
+            threads.append(threading.get_ident())
+            return super().upsert_creatives_batch(*args, **kwargs)
+
+        def save_refresh_checkpoints(self, checkpoints):
+            threads.append(threading.get_ident())
+            super().save_refresh_checkpoints(checkpoints)
+
+    seen: list = []
+    repository = RecordingRepository()
+    repository.upsert_publisher(Publisher(id="p1", name="p1", category_ids=["casino"]))
+    settings = Settings(meta_access_token="token")
+    client = MetaAdLibraryClient(settings, transport=httpx.MockTransport(_ads_archive_stub(2, seen, [0, 0])))
+    service = CreativeService(repository, client, settings)
+
+    asyncio.run(service.refresh_creatives_for_publishers(["p1"]))
+    assert len(repository.list_creatives_for_publishers(["p1"])) == 2
+    assert threads and threading.get_ident() not in threads
+
+
+def test_token_bucket_adapts_to_usage_and_blocks_while_throttled():
+    clock = [0.0]
+    sleeps: list = []
+
+    async def sleep(delay: float) -> None:
+        sleeps.append(delay)
+        clock[0] += delay
+
+    bucket = AdaptiveTokenBucket(10, 1, slowdown_percent=50, clock=lambda: clock[0], sleep=sleep)
+
+    async def scenario():
+        assert await bucket.acquire() == 0
+        assert await bucket.acquire() == pytest.approx(0.1)
+        bucket.observe_usage(*parse_usage({"x-app-usage": json.dumps({"call_count": 75})}))
+        assert bucket.rate == pytest.approx(5)
+        bucket.throttled(retry_after=30)
+        assert bucket.rate == pytest.approx(2.5)
+        assert await bucket.acquire() >= 30
+        bucket.observe_usage(10)
+        assert bucket.rate == 10
+
+    asyncio.run(scenario())
+
+
+def test_token_bucket_recovers_additively_without_usage_headers():
+    clock = [0.0]
+    bucket = AdaptiveTokenBucket(8, 1, recovery_seconds=4, clock=lambda: clock[0])
+
+    bucket.throttled(retry_after=10)
+    bucket.throttled(retry_after=0)
+    assert bucket.rate == pytest.approx(2)
+    clock[0] = 5
+    bucket.succeeded()
+    assert bucket.rate == pytest.approx(2)  # Still inside the retry window.
+    clock[0] = 11
+    bucket.succeeded()
+    assert bucket.rate == pytest.approx(4)
+    clock[0] = 30
+    bucket.succeeded()
+    assert bucket.rate == pytest.approx(8)
+
+    # Recovery stops at the rate the last reported usage allows.
+    bucket.observe_usage(75)
+    bucket.throttled(retry_after=0)
+    clock[0] = 60
+    bucket.succeeded()
+    assert bucket.rate == pytest.approx(4)
@@ -0,0 +1,48 @@
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.metrics import Histogram
+
+
+def _sample(body: str, prefix: str) -> float:
+    for line in body.splitlines():
+        if line.startswith(prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{prefix} not found")
+
+
+def test_metrics_endpoint_exports_route_latency_and_cache_sizes():
+    client = TestClient(create_app())
+    client.get("/api/categories/online_casino/ads", params={"limit": 1})
+    client.get("/api/categories/dfs/ads")
+    client.get("/does-not-exist")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+
+    route = 'method="GET",route="/api/categories/{category_id}/ads"'
+    assert _sample(body, f"livefbads_http_request_duration_seconds_count{{{route}}}") >= 2
+    assert _sample(body, f'livefbads_http_requests_total{{{route},status="200"}}') >= 2
+    assert 'route="unmatched"' in body
+    assert "/api/categories/online_casino/ads" not in body
+    assert _sample(body, "livefbads_cached_creatives") > 0
+    assert _sample(body, "livefbads_cached_publishers") > 0
+    operation = 'backend="memory",operation="page_creatives_for_category"'
+    assert _sample(body, f"livefbads_repository_scanned_creatives_total{{{operation}}}") >= 1
+    assert "# TYPE livefbads_meta_request_duration_seconds histogram" in body
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.labels("/x").observe(value)
+
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{route="/x",le="0.1"} 2',
+        'latency_seconds_bucket{route="/x",le="1"} 3',
+        'latency_seconds_bucket{route="/x",le="+Inf"} 4',
+        'latency_seconds_sum{route="/x"} 3.65',
+        'latency_seconds_count{route="/x"} 4',
+    ]
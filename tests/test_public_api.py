@@ -1,6 +1,13 @@
+from datetime import datetime, timezone
+
+import pytest
 from fastapi.testclient import TestClient
 
+from app.config import Settings
 from app.main import create_app
+from app.models import Creative, Publisher
+from app.repository import InMemoryRepository
+from app.sqlite_repository import SqliteRepository
 
 
 def test_list_categories_returns_seed_data():
@@ -20,3 +27,127 @@ def test_list_creatives_for_category_returns_cached_entries():
     data = response.json()
     assert isinstance(data, list)
     assert data[0]["publisher_id"] == "pub_0001"
+
+
+def test_list_categories_supports_conditional_requests():
+    client = TestClient(create_app())
+    response = client.get("/api/categories")
+    etag = response.headers["etag"]
+    online_casino = next(category for category in response.json() if category["id"] == "online_casino")
+    assert online_casino["creative_count"] == 1
+
+    not_modified = client.get("/api/categories", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    client.post("/api/admin/publishers", json={"name": "New Casino", "category_ids": ["online_casino"]})
+    changed = client.get("/api/categories", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    online_casino = next(category for category in changed.json() if category["id"] == "online_casino")
+    assert online_casino["publisher_count"] == 2
+
+
+def test_list_creatives_paginates_projects_and_filters():
+    app = create_app()
+    repository = app.state.repository
+    for index in range(5):
+        repository.upsert_creative(
+            Creative(
+                id=f"creative_2{index:02d}",
+                publisher_id="pub_0001",
+                title=f"Offer {index}",
+                platforms=["instagram"] if index % 2 else ["facebook"],
+                end_time=datetime(2020, 1, 1, tzinfo=timezone.utc) if index == 4 else None,
+            )
+        )
+    client = TestClient(app)
+
+    first = client.get("/api/categories/online_casino/ads", params={"limit": 4, "fields": "id,title"})
+    assert first.status_code == 200
+    assert [item["id"] for item in first.json()] == ["creative_100", "creative_200", "creative_201", "creative_202"]
+    assert set(first.json()[0]) == {"id", "title"}
+    cursor = first.headers["x-next-cursor"]
+    assert 'rel="next"' in first.headers["link"]
+
+    second = client.get("/api/categories/online_casino/ads", params={"limit": 4, "cursor": cursor})
+    assert [item["id"] for item in second.json()] == ["creative_203", "creative_204"]
+    assert "x-next-cursor" not in second.headers
+
+    instagram = client.get("/api/categories/online_casino/ads", params={"platform": "instagram"})
+    assert [item["id"] for item in instagram.json()] == ["creative_100", "creative_201", "creative_203"]
+
+    running = client.get("/api/categories/online_casino/ads", params={"open_slots": "true", "fields": "id"})
+    assert "creative_204" not in {item["id"] for item in running.json()}
+
+    assert client.get("/api/categories/online_casino/ads", params={"fields": "nope"}).status_code == 400
+    assert client.get("/api/categories/online_casino/ads", params={"cursor": "%%%"}).status_code == 400
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_time_windows_return_short_pages_while_open_slots_use_a_keyset(tmp_path, backend):
+    repository = InMemoryRepository() if backend == "memory" else SqliteRepository(tmp_path / "ads.sqlite3")
+    repository.upsert_publisher(Publisher(id="pub_a", name="A", category_ids=["casino"]))
+    ended = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    scheduled = datetime(2999, 1, 1, tzinfo=timezone.utc)
+    repository.upsert_creatives_batch(
+        Creative(
+            id=f"c{index:02d}",
+            publisher_id="pub_a",
+            platforms=["instagram"] if index % 2 else ["facebook"],
+            end_time={7: None, 8: None, 9: scheduled}.get(index, ended),
+        )
+        for index in range(10)
+    )
+    client = TestClient(create_app(Settings(page_scan_limit=3, refresh_enabled=False), repository=repository))
+
+    def pages(**filters):
+        result, cursor = [], None
+        while True:
+            params = {**filters, "limit": 5, **({"cursor": cursor} if cursor else {})}
+            response = client.get("/api/categories/casino/ads", params=params)
+            result.append([item["id"] for item in response.json()])
+            cursor = response.headers.get("x-next-cursor")
+            if cursor is None:
+                return result
+
+    # Every page stops after three creatives outside the window.
+    assert pages(start_time="2021-01-01T00:00:00Z") == [[], [], ["c07", "c08", "c09"]]
+    # Running creatives are read from their own keyset.
+    assert pages(open_slots="true") == [["c07", "c08", "c09"]]
+    assert pages(open_slots="true", platform="instagram") == [["c07", "c09"]]
+
+    # End-dating drops creatives from the keyset; scheduled end times are kept.
+    repository.upsert_creatives_batch([], publisher_ids=["pub_a"])
+    assert pages(open_slots="true") == [["c09"]]
+
+
+def test_creative_responses_are_served_from_cached_encodings():
+    app = create_app()
+    repository = app.state.repository
+    creative = Creative(
+        id="creative_300",
+        publisher_id="pub_0001",
+        title="Café bonus",
+        spend=12.5,
+        start_time=datetime(2024, 3, 1, 12, tzinfo=timezone.utc),
+    )
+    repository.upsert_creative(creative)
+    client = TestClient(app)
+
+    page = client.get("/api/categories/online_casino/ads", params={"publisher_id": "pub_0001"})
+    expected = [item.model_dump(mode="json") for item in repository.list_creatives_by_category("online_casino")]
+    assert page.json() == sorted(expected, key=lambda item: item["id"])
+    assert page.headers["content-type"] == "application/json"
+    record = repository.snapshot().shards["pub_0001"].creatives["creative_300"]
+    assert record.to_json() == creative.model_dump_json().encode()
+    assert record.to_json() is record.to_json()
+
+    repository.upsert_creative(creative.model_copy(update={"title": "Café jackpot"}))
+    search = client.get("/api/categories/online_casino/ads/search", params={"q": "jackpot"})
+    assert [item["title"] for item in search.json()] == ["Café jackpot"]
+    assert search.headers["x-total-count"] == "1"
+
+    schema = app.openapi()["paths"]["/api/categories/{category_id}/ads"]["get"]["responses"]["200"]
+    variants = schema["content"]["application/json"]["schema"]["anyOf"]
+    assert variants[0]["items"] == {"$ref": "#/components/schemas/Creative"}
@@ -0,0 +1,110 @@
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.models import Category, Creative, Publisher
+from app.reports import CreativeAggregates
+from app.repository import InMemoryRepository
+from app.sqlite_repository import SqliteRepository
+
+DAY = datetime(2024, 3, 1, 15, tzinfo=timezone.utc)
+
+
+def _creatives():
+    return [
+        Creative(id="c1", publisher_id="pub_a", platforms=["facebook"], start_time=DAY, spend=10.5, currency="USD"),
+        Creative(
+            id="c2",
+            publisher_id="pub_a",
+            platforms=["facebook", "instagram"],
+            start_time=DAY + timedelta(days=1),
+            end_time=DAY + timedelta(days=2),
+        ),
+        Creative(id="c3", publisher_id="pub_b", platforms=["instagram"], start_time=DAY - timedelta(days=10)),
+        Creative(id="c4", publisher_id="pub_b", spend=3.0),
+    ]
+
+
+def _populate(repository):
+    repository.upsert_category(Category(id="casino", name="Casino"))
+    repository.upsert_publisher(Publisher(id="pub_a", name="A", category_ids=["casino"]))
+    repository.upsert_publisher(Publisher(id="pub_b", name="B", category_ids=["casino"]))
+    repository.upsert_creatives_batch(_creatives())
+
+
+def _summary(report):
+    return [
+        (day.date.day, day.active_creatives, day.new_creatives, day.ended_creatives, day.platforms, day.spend)
+        for day in report.days
+    ]
+
+
+EXPECTED = [
+    (1, 2, 1, 0, {"facebook": 1, "instagram": 1}, {"USD": 10.5}),
+    (2, 3, 1, 0, {"facebook": 2, "instagram": 2}, {}),
+    (3, 3, 0, 1, {"facebook": 2, "instagram": 2}, {}),
+    (4, 2, 0, 0, {"facebook": 1, "instagram": 1}, {}),
+]
+
+
+def _check(repository):
+    report = repository.category_report("casino", date(2024, 3, 1), date(2024, 3, 4))
+    assert _summary(report) == EXPECTED
+    assert report.undated_creatives == 1
+    totals = [(p.publisher_id, p.active_creatives, p.new_creatives, p.ended_creatives, p.spend) for p in report.publishers]
+    assert totals == [("pub_a", 1, 2, 1, {"USD": 10.5}), ("pub_b", 1, 0, 0, {})]
+
+    # Moving, end-dating and editing creatives updates the aggregates in place.
+    repository.upsert_creatives_batch(
+        [_creatives()[0].model_copy(update={"publisher_id": "pub_b", "spend": 12.0})],
+        publisher_ids=["pub_a"],
+        now=DAY + timedelta(days=2),
+    )
+    report = repository.category_report("casino", date(2024, 3, 1), date(2024, 3, 4), publisher_id="pub_b")
+    assert [(day.active_creatives, day.spend) for day in report.days] == [
+        (2, {"USD": 12.0}), (2, {}), (2, {}), (2, {}),
+    ]
+    report = repository.category_report("casino", date(2024, 3, 1), date(2024, 3, 4), publisher_id="pub_a")
+    assert [day.active_creatives for day in report.days] == [0, 1, 1, 0]
+
+
+def test_category_report_is_maintained_incrementally():
+    repository = InMemoryRepository()
+    _populate(repository)
+    _check(repository)
+
+    aggregates = CreativeAggregates()
+    for creative in _creatives():
+        aggregates.apply(creative)
+    for creative in _creatives():
+        aggregates.apply(creative, -1)
+    assert not aggregates
+
+
+def test_sqlite_category_report_matches_in_memory(tmp_path):
+    repository = SqliteRepository(tmp_path / "ads.sqlite3")
+    _populate(repository)
+    # Aggregates of existing databases are rebuilt once on open.
+    repository._writer.execute("DELETE FROM report_aggregates")
+    repository._writer.execute("DELETE FROM meta WHERE key = 'report_aggregates'")
+    repository.close()
+    _check(SqliteRepository(tmp_path / "ads.sqlite3"))
+
+
+def test_report_endpoint():
+    app = create_app()
+    app.state.repository.upsert_creative(
+        Creative(id="creative_report", publisher_id="pub_0001", platforms=["facebook"], start_time=DAY)
+    )
+    client = TestClient(app)
+
+    response = client.get("/api/categories/online_casino/report", params={"start": "2024-03-01", "end": "2024-03-02"})
+    assert response.status_code == 200
+    body = response.json()
+    assert [day["date"] for day in body["days"]] == ["2024-03-01", "2024-03-02"]
+    assert body["days"][0]["new_creatives"] >= 1
+    assert len(client.get("/api/categories/online_casino/report").json()["days"]) == 30
+    for start, end in (("2024-03-02", "2024-03-01"), ("2020-01-01", "2024-03-01")):
+        response = client.get("/api/categories/online_casino/report", params={"start": start, "end": end})
+        assert response.status_code == 400
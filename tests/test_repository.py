@@ -0,0 +1,230 @@
+import random
+import threading
+from datetime import datetime, timezone
+
+from app.chunked import MAX_CHUNK_SIZE, ChunkedMap
+from app.models import Creative, Publisher
+from app.repository import InMemoryRepository
+from app.services import AdminService
+
+
+def _repository() -> InMemoryRepository:
+    repository = InMemoryRepository()
+    repository.upsert_publisher(Publisher(id="pub_a", name="A", category_ids=["casino", "dfs"]))
+    repository.upsert_publisher(Publisher(id="pub_b", name="B", category_ids=["casino"]))
+    repository.upsert_creative(Creative(id="c1", publisher_id="pub_a"))
+    repository.upsert_creative(Creative(id="c2", publisher_id="pub_b"))
+    repository.upsert_creative(Creative(id="c3", publisher_id="pub_a"))
+    return repository
+
+
+def test_category_index_tracks_publisher_changes():
+    repository = _repository()
+    assert [p.id for p in repository.list_publishers_by_category("casino")] == ["pub_a", "pub_b"]
+
+    AdminService(repository).update_publisher("pub_a", category_ids=["dfs"])
+    assert [p.id for p in repository.list_publishers_by_category("casino")] == ["pub_b"]
+    assert [p.id for p in repository.list_publishers_by_category("dfs")] == ["pub_a"]
+
+    repository.archive_publisher("pub_b")
+    assert repository.list_publishers_by_category("casino") == []
+
+    AdminService(repository).update_publisher("pub_b", status="active")
+    assert [p.id for p in repository.list_publishers_by_category("casino")] == ["pub_b"]
+
+
+def test_creative_index_follows_publisher_reassignment():
+    repository = _repository()
+    assert [c.id for c in repository.list_creatives_by_category("dfs")] == ["c1", "c3"]
+
+    repository.upsert_creative(Creative(id="c1", publisher_id="pub_b", title="moved"))
+    assert [c.id for c in repository.list_creatives_for_publishers(["pub_a"])] == ["c3"]
+    grouped = repository.creatives_grouped_by_publisher(["pub_a", "pub_b"])
+    assert [c.id for c in grouped["pub_b"]] == ["c1", "c2"]
+    assert grouped["pub_b"][0].title == "moved"
+
+
+def test_category_counts_are_maintained_incrementally():
+    repository = _repository()
+    assert repository.category_counts("casino") == (2, 3)
+    assert repository.category_counts("dfs") == (1, 2)
+
+    version = repository.summary_version
+    repository.upsert_creative(Creative(id="c1", publisher_id="pub_a", title="unchanged counts"))
+    assert repository.summary_version == version
+
+    repository.archive_publisher("pub_a")
+    assert repository.category_counts("casino") == (1, 1)
+    assert repository.category_counts("dfs") == (0, 0)
+    assert repository.summary_version > version
+
+    repository.upsert_creative(Creative(id="c4", publisher_id="pub_b"))
+    assert repository.category_counts("casino") == (1, 2)
+
+
+def test_page_creatives_merges_publishers_in_id_order():
+    repository = _repository()
+    repository.upsert_creative(Creative(id="c0", publisher_id="pub_b", platforms=["instagram"]))
+    repository.upsert_creative(Creative(id="c3", publisher_id="pub_a", platforms=["instagram"]))
+
+    page, after = repository.page_creatives_for_category("casino", limit=2)
+    assert [c.id for c in page] == ["c0", "c1"] and after == "c1"
+    page, after = repository.page_creatives_for_category("casino", limit=2, after=after)
+    assert [c.id for c in page] == ["c2", "c3"] and after is None
+
+    page, _ = repository.page_creatives_for_category("casino", limit=10, platform="instagram")
+    assert [c.id for c in page] == ["c0", "c3"]
+    page, _ = repository.page_creatives_for_category("casino", limit=10, publisher_id="pub_a")
+    assert [c.id for c in page] == ["c1", "c3"]
+
+    repository.upsert_creative(Creative(id="c3", publisher_id="pub_a", platforms=[]))
+    page, _ = repository.page_creatives_for_category("casino", limit=10, platform="instagram")
+    assert [c.id for c in page] == ["c0"]
+
+
+def test_upsert_creatives_batch_applies_only_the_delta():
+    repository = _repository()
+    ended_at = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    summary = repository.upsert_creatives_batch(
+        [
+            Creative(id="c1", publisher_id="pub_a"),
+            Creative(id="c3", publisher_id="pub_a", title="new copy"),
+            Creative(id="c4", publisher_id="pub_a"),
+        ],
+        publisher_ids=["pub_a"],
+        now=ended_at,
+    )
+    assert summary.inserted == ["c4"]
+    assert summary.updated == ["c3"]
+    assert summary.ended == []
+    assert summary.unchanged == 1
+
+    summary = repository.upsert_creatives_batch(
+        [Creative(id="c4", publisher_id="pub_a")], publisher_ids=["pub_a"], now=ended_at
+    )
+    assert summary.ended == ["c1", "c3"] and summary.unchanged == 1
+    creatives = {c.id: c for c in repository.list_creatives_for_publishers(["pub_a"])}
+    assert creatives["c1"].end_time == ended_at and creatives["c4"].end_time is None
+    # Other publishers are untouched and ended creatives are not ended twice.
+    summary = repository.upsert_creatives_batch([], publisher_ids=["pub_a"], now=ended_at)
+    assert summary.ended == ["c4"] and not summary.updated
+    assert repository.list_creatives_for_publishers(["pub_b"])[0].end_time is None
+
+
+def test_creatives_are_stored_compactly_and_round_trip():
+    repository = InMemoryRepository()
+    repository.upsert_publisher(Publisher(id="pub_a", name="A", category_ids=["casino"]))
+    creatives = [
+        Creative(
+            id=f"{index}",
+            publisher_id="pub_a",
+            snapshot_url=f"https://www.facebook.com/ads/archive/render_ad/?id={index}&access_token=t",
+            ad_library_url=f"https://www.facebook.com/ads/library/?id={index}",
+            title="Deposit Bonus",
+            platforms=["facebook", "instagram"],
+            spend=12.5,
+            currency="USD",
+            start_time=datetime(2024, 1, index, tzinfo=timezone.utc),
+        )
+        for index in (1, 2)
+    ]
+    repository.upsert_creatives_batch(creatives)
+
+    stored = repository.snapshot().shards["pub_a"].creatives
+    first, second = (stored[creative.id] for creative in creatives)
+    assert first.platforms is second.platforms
+    assert first.snapshot_url_tail is second.snapshot_url_tail
+    assert first.ad_library_url_head is second.ad_library_url_head
+    assert repository.list_creatives_by_category("casino") == creatives
+    assert repository.upsert_creatives_batch(creatives).unchanged == 2
+
+
+def test_snapshots_stay_consistent_under_concurrent_writes():
+    repository = _repository()
+    before = repository.snapshot()
+    publisher = repository.get_publisher("pub_a")
+    AdminService(repository).update_publisher("pub_a", name="Renamed", category_ids=["dfs"])
+    repository.upsert_creative(Creative(id="c9", publisher_id="pub_b"))
+
+    # Published snapshots and returned models are never modified.
+    assert publisher.name == "A" and publisher.category_ids == ["casino", "dfs"]
+    assert before.category_counts("casino") == (2, 3)
+    assert [c.id for c in before.list_creatives_by_category("casino")] == ["c1", "c3", "c2"]
+    assert repository.category_counts("casino") == (1, 2)
+
+    errors: list = []
+    stop = threading.Event()
+
+    def write() -> None:
+        for round_number in range(200):
+            batch = [
+                Creative(id=f"w{index}", publisher_id=("pub_a", "pub_b")[(index + round_number) % 2], title=f"r{round_number}")
+                for index in range(20)
+            ]
+            repository.upsert_creatives_batch(batch)
+            if round_number % 10 == 0:
+                repository.archive_publisher("pub_b")
+                AdminService(repository).update_publisher("pub_b", status="active")
+        stop.set()
+
+    def read() -> None:
+        try:
+            while not stop.is_set():
+                snapshot = repository.snapshot()
+                for category_id in ("casino", "dfs"):
+                    publishers, creatives = snapshot.category_counts(category_id)
+                    assert len(snapshot.list_publishers_by_category(category_id)) == publishers
+                    assert len(snapshot.list_creatives_by_category(category_id)) == creatives
+                titles = {c.title for c in snapshot.list_creatives_for_publishers(["pub_a", "pub_b"]) if c.id.startswith("w")}
+                assert len(titles) <= 1
+        except Exception as exc:  # pragma: no cover - reported below
+            errors.append(exc)
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for thread in readers:
+        thread.start()
+    write()
+    for thread in readers:
+        thread.join()
+    assert errors == []
+
+
+def test_chunked_map_copies_only_the_chunks_it_changes():
+    rng = random.Random(7)
+    shared: ChunkedMap = ChunkedMap()
+    expected: dict = {}
+    owned: set = set()
+    for _ in range(5000):
+        key = f"k{rng.randrange(3000):05d}"
+        if rng.random() < 0.2:
+            assert shared.discard(key, owned) == (expected.pop(key, None) is not None)
+        else:
+            shared.set(key, key.upper(), owned)
+            expected[key] = key.upper()
+    assert list(shared.items()) == sorted(expected.items())
+    assert len(shared) == len(expected) and "missing" not in shared
+    assert [key for key, _ in shared.items(after="k01500")] == sorted(k for k in expected if k > "k01500")
+    assert all(len(keys) <= MAX_CHUNK_SIZE for keys in shared._keys)
+
+    copy = shared.copy()
+    copy.set("k00000x", "new", set())
+    assert "k00000x" not in shared and copy["k00000x"] == "new"
+    assert sum(a is not b for a, b in zip(shared._keys, copy._keys)) == 1
+
+
+def test_single_upserts_share_untouched_state_with_earlier_snapshots():
+    repository = InMemoryRepository()
+    repository.upsert_publisher(Publisher(id="pub_a", name="A", category_ids=["casino"]))
+    repository.upsert_creatives_batch(
+        Creative(id=f"c{index:05d}", publisher_id="pub_a", platforms=["facebook"]) for index in range(5000)
+    )
+    before = repository.snapshot()
+    repository.upsert_creative(Creative(id="c00001", publisher_id="pub_a", title="changed", platforms=["facebook"]))
+    after = repository.snapshot()
+
+    assert before.get_creative("c00001").title is None and after.get_creative("c00001").title == "changed"
+    old, new = before.shards["pub_a"], after.shards["pub_a"]
+    for old_map, new_map in ((old.creatives, new.creatives), (old.keyset["facebook"], new.keyset["facebook"])):
+        assert sum(a is not b for a, b in zip(old_map._keys, new_map._keys)) == 1
+    assert sum(a is not b for a, b in zip(before.owners, after.owners)) == 0
+    assert after.get_creative("missing") is None
@@ -0,0 +1,157 @@
+import asyncio
+import random
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.config import Settings
+from app.main import create_app
+from app.models import Creative, Publisher
+from app.repository import InMemoryRepository
+from app.scheduler import RefreshScheduler
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class StubMetaClient:
+    enabled = True
+
+    def __init__(self) -> None:
+        self.calls: list = []
+        self.errors: dict = {}
+        self.creatives: dict = {}
+
+    async def fetch_creative_pages(self, publisher_ids, **query):
+        publisher_ids = list(publisher_ids)
+        self.calls.append(publisher_ids)
+        for publisher_id in publisher_ids:
+            if publisher_id in self.errors:
+                raise self.errors[publisher_id]
+        yield [c for p in publisher_ids for c in self.creatives.get(p, [])], None
+
+
+def _throttled() -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://graph.facebook.com/v18.0/ads_archive")
+    response = httpx.Response(429, request=request)
+    return httpx.HTTPStatusError("throttled", request=request, response=response)
+
+
+def _scheduler(repository, client, clock):
+    settings = Settings(
+        refresh_interval_seconds=3600,
+        refresh_hot_interval_seconds=600,
+        refresh_stagger_seconds=60,
+        refresh_jitter_ratio=0.0,
+        refresh_backoff_base_seconds=30,
+    )
+    return RefreshScheduler(repository, client, settings, clock=clock, rng=random.Random(7))
+
+
+def _tick(scheduler) -> int:
+    async def tick():
+        started = await scheduler.run_pending()
+        await scheduler.wait_idle()
+        return started
+
+    return asyncio.run(tick())
+
+
+def test_scheduler_staggers_refreshes_and_skips_archived_publishers():
+    repository = InMemoryRepository()
+    for publisher_id in ("pub_a", "pub_b", "pub_c"):
+        repository.upsert_publisher(Publisher(id=publisher_id, name=publisher_id, category_ids=["casino"]))
+    repository.archive_publisher("pub_c")
+    client = StubMetaClient()
+    client.creatives["pub_a"] = [Creative(id="c1", publisher_id="pub_a")]
+    clock = FakeClock()
+    scheduler = _scheduler(repository, client, clock)
+
+    assert _tick(scheduler) == 0
+    first_runs = {p.publisher_id: p.next_run for p in scheduler.status().publishers}
+    assert set(first_runs) == {"pub_a", "pub_b"}
+    assert len(set(first_runs.values())) == 2
+
+    clock.now += 60
+    assert _tick(scheduler) == 2
+    # Due publishers share one batched query.
+    assert [sorted(call) for call in client.calls] == [["pub_a", "pub_b"]]
+    assert [c.id for c in repository.list_creatives_for_publishers(["pub_a"])] == ["c1"]
+
+    statuses = {p.publisher_id: p for p in scheduler.status().publishers}
+    assert statuses["pub_a"].last_changed is not None
+    # pub_a changed, so it is scheduled on the hot interval.
+    assert (statuses["pub_a"].next_run - statuses["pub_a"].last_success).total_seconds() == 600
+    assert (statuses["pub_b"].next_run - statuses["pub_b"].last_success).total_seconds() == 3600
+
+
+def test_scheduler_backs_off_on_throttling():
+    repository = InMemoryRepository()
+    repository.upsert_publisher(Publisher(id="pub_a", name="A", category_ids=["casino"]))
+    client = StubMetaClient()
+    client.errors["pub_a"] = _throttled()
+    clock = FakeClock()
+    scheduler = _scheduler(repository, client, clock)
+    _tick(scheduler)
+
+    delays = []
+    for _ in range(3):
+        clock.now = scheduler._schedules["pub_a"].next_run
+        _tick(scheduler)
+        status = scheduler.status().publishers[0]
+        delays.append(scheduler._schedules["pub_a"].next_run - clock.now)
+
+    assert status.consecutive_failures == 3
+    assert status.total_failures == 3
+    assert "HTTPStatusError" in status.last_error
+    assert 15 <= delays[0] <= 30 and 30 <= delays[1] <= 60 and 60 <= delays[2] <= 120
+
+
+def test_scheduler_ticks_do_not_wait_for_slow_refreshes():
+    repository = InMemoryRepository()
+    for publisher_id in ("pub_slow", "pub_next"):
+        repository.upsert_publisher(Publisher(id=publisher_id, name=publisher_id, category_ids=["casino"]))
+    release = asyncio.Event()
+
+    class SlowMetaClient(StubMetaClient):
+        async def fetch_creative_pages(self, publisher_ids, **query):
+            publisher_ids = list(publisher_ids)
+            self.calls.append(publisher_ids)
+            if "pub_slow" in publisher_ids:
+                await release.wait()
+            yield [], None
+
+    client = SlowMetaClient()
+    clock = FakeClock()
+    scheduler = _scheduler(repository, client, clock)
+
+    async def scenario():
+        await scheduler.run_pending()
+        scheduler._schedules["pub_next"].next_run = clock.now + 120
+        clock.now += 60
+        assert await scheduler.run_pending() == 1
+        await asyncio.sleep(0)
+        # The slow refresh is still running: it is not started again and the
+        # next publisher's refresh goes ahead without it.
+        clock.now += 60
+        assert await scheduler.run_pending() == 1
+        await asyncio.sleep(0.01)
+        assert client.calls == [["pub_slow"], ["pub_next"]]
+        assert scheduler._schedules["pub_next"].last_success is not None
+        release.set()
+        await scheduler.wait_idle()
+
+    asyncio.run(scenario())
+    assert all(schedule.last_success is not None for schedule in scheduler._schedules.values())
+
+
+def test_admin_refresh_status_endpoint():
+    client = TestClient(create_app())
+    response = client.get("/api/admin/refresh/status")
+    assert response.status_code == 200
+    assert response.json()["running"] is False
@@ -0,0 +1,72 @@
+import random
+
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.models import Creative
+from app.search import InvertedIndex
+
+
+def test_index_ranks_with_bm25_and_matches_prefixes():
+    index = InvertedIndex()
+    index.add("a", "p1", ["Deposit bonus", "Claim your deposit bonus now"])
+    index.add("b", "p2", ["Free spins", "Bonus spins every day"])
+    index.add("c", "p1", ["Bet now", None])
+    assert index.search("bonus", ["p1", "p2"], limit=10) == ([], 0)
+    index.commit()
+
+    hits, total = index.search("bonus", ["p1", "p2"], limit=10)
+    assert [doc_id for doc_id, _, _ in hits] == ["a", "b"]
+    assert total == 2
+    assert [doc_id for doc_id, _, _ in index.search("bonus", ["p2"], limit=10)[0]] == ["b"]
+
+    hits, _ = index.search("spi", ["p1", "p2"], limit=10)
+    assert [doc_id for doc_id, _, _ in hits] == ["b"]
+
+    index.add("a", "p1", ["Bet big", None])
+    index.commit()
+    hits, total = index.search("bonus", ["p1", "p2"], limit=10)
+    assert [doc_id for doc_id, _, _ in hits] == ["b"]
+    hits, _ = index.search("bet", ["p1"], limit=1, offset=1)
+    assert len(hits) == 1
+
+    index.remove("b")
+    index.commit()
+    assert index.search("spins", ["p1", "p2"], limit=10) == ([], 0)
+    assert index.expand("sp") == []
+
+
+def test_search_pages_match_exhaustive_ranking():
+    rng = random.Random(7)
+    words = ["bonus", "bonuses", "bet", "bets", "better", "spin", "spins", "free", "deposit", "odds"]
+    index = InvertedIndex()
+    partitions = {}
+    for number in range(300):
+        doc_id, partition = f"d{number:03d}", f"p{rng.randint(0, 4)}"
+        partitions[doc_id] = partition
+        index.add(doc_id, partition, [" ".join(rng.choices(words, k=rng.randint(1, 12)))])
+    index.commit()
+
+    for query in ["bonus", "bet spins", "be", "free deposit odds"]:
+        hits, total = index.search(query, ["p0", "p1", "p2", "p3"], limit=300)
+        ranked = [(score, doc_id) for doc_id, _, score in hits]
+        assert ranked == sorted(ranked, reverse=True)
+        assert total == len(hits)
+        assert all(partitions[doc_id] == partition != "p4" for doc_id, partition, _ in hits)
+        for offset in (0, 7, 40):
+            page, _ = index.search(query, ["p0", "p1", "p2", "p3"], limit=10, offset=offset)
+            assert page == hits[offset : offset + 10]
+
+
+def test_search_endpoint_is_scoped_to_the_category():
+    app = create_app()
+    repository = app.state.repository
+    repository.upsert_creative(Creative(id="creative_900", publisher_id="pub_0001", title="Casino deposit match"))
+    repository.upsert_creative(Creative(id="creative_901", publisher_id="pub_0002", title="Deposit and bet"))
+    client = TestClient(app)
+
+    response = client.get("/api/categories/online_casino/ads/search", params={"q": "depo"})
+    assert response.status_code == 200
+    # creative_100 mentions "deposit" twice, so it outranks creative_900.
+    assert [item["id"] for item in response.json()] == ["creative_100", "creative_900"]
+    assert response.headers["x-total-count"] == "2"
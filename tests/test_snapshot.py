@@ -0,0 +1,114 @@
+import subprocess
+import sys
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.changes import ChangesExpiredError
+from app.config import Settings
+from app.clustering import ClusterIndex
+from app.main import SEED_PATH, build_repository
+from app.models import Creative, RefreshCheckpoint
+from app.reports import CreativeAggregates
+from app.repository import InMemoryRepository
+from app.search import InvertedIndex
+from app.snapshot import SnapshotFormatError
+
+COPY = "Claim your 200% welcome bonus up to $500 plus 50 free spins on your first deposit today"
+
+
+def _state(repository):
+    creatives = sorted(
+        (creative.model_dump() for creative in repository.list_creatives_by_category("online_casino")),
+        key=lambda creative: creative["id"],
+    )
+    clusters, _ = repository.page_clusters_for_category("online_casino", limit=100)
+    running, _ = repository.page_creatives_for_category("online_casino", limit=100, open_at=datetime.now(timezone.utc))
+    return (
+        repository.list_categories(),
+        repository.list_publishers(include_inactive=True),
+        creatives,
+        [creative.id for creative in running],
+        [(cluster.cluster_id, cluster.size, cluster.creative.id) for cluster in clusters],
+        repository.search_creatives("online_casino", "bonus", limit=100),
+        repository.category_report("online_casino", date(2024, 2, 25), date(2024, 3, 5)),
+        repository.list_refresh_checkpoints(["pub_0001"]),
+        repository.cache_sizes(),
+    )
+
+
+def test_snapshot_round_trips_repository_state(tmp_path, monkeypatch):
+    repository = InMemoryRepository(SEED_PATH)
+    start = datetime(2024, 3, 1, 15, tzinfo=timezone.utc)
+    repository.upsert_creatives_batch(
+        Creative(
+            id=f"snap_{index}",
+            publisher_id="pub_0001",
+            body=COPY.replace("today", f"today code{index}"),
+            platforms=["facebook", "instagram"],
+            spend=12.5,
+            currency="USD",
+            start_time=start,
+            snapshot_url=f"https://example.com/ads/snap_{index}?token=abc",
+        )
+        for index in range(3)
+    )
+    repository.save_refresh_checkpoints(
+        [RefreshCheckpoint(publisher_id="pub_0001", country="US", ad_type="ALL", delivery_date_min=date(2024, 3, 1))]
+    )
+    path = tmp_path / "repository.snapshot"
+    assert repository.dump_snapshot(path) == path.stat().st_size
+
+    # Loading takes the indexes over as stored instead of rebuilding them.
+    def rebuild(*args, **kwargs):
+        raise AssertionError("rebuilt while loading a snapshot")
+
+    restored = InMemoryRepository()
+    with monkeypatch.context() as patch:
+        patch.setattr(InvertedIndex, "add", rebuild)
+        patch.setattr(ClusterIndex, "add_signature", rebuild)
+        patch.setattr(CreativeAggregates, "apply", rebuild)
+        restored.load_snapshot(path)
+    assert _state(restored) == _state(repository)
+
+    # The change log continues the snapshot's numbering; its changes are gone.
+    _, position = repository.creative_changes("online_casino")
+    assert restored.creative_changes("online_casino") == ([], position)
+    with pytest.raises(ChangesExpiredError):
+        restored.creative_changes("online_casino", after=position - 1)
+
+    # Restored records are kept up to date like freshly ingested ones.
+    updated = restored.get_creative("snap_0").model_copy(update={"body": "Completely different copy for spring"})
+    restored.upsert_creative(updated)
+    assert restored.get_creative("snap_0").body == updated.body
+    clusters, _ = restored.page_clusters_for_category("online_casino", limit=100)
+    assert ("snap_1", 2) in [(cluster.creative.id, cluster.size) for cluster in clusters]
+    assert restored.get_creative("snap_1").start_time == start
+    hits, total = restored.search_creatives("online_casino", "spring", limit=10)
+    assert ([hit.id for hit in hits], total) == (["snap_0"], 1)
+
+
+def test_app_starts_from_snapshot_and_falls_back_to_seed(tmp_path):
+    path = tmp_path / "repository.snapshot"
+    settings = Settings(snapshot_path=str(path))
+    assert build_repository(settings).cache_sizes() == InMemoryRepository(SEED_PATH).cache_sizes()
+
+    InMemoryRepository().dump_snapshot(path)
+    assert build_repository(settings).cache_sizes() == (0, 0)
+
+    path.write_bytes(b"not a snapshot")
+    with pytest.raises(SnapshotFormatError):
+        InMemoryRepository().load_snapshot(path)
+    assert build_repository(settings).cache_sizes() == InMemoryRepository(SEED_PATH).cache_sizes()
+
+
+def test_importing_main_does_not_build_the_app():
+    script = (
+        "import app.main, app.repository as r\n"
+        "calls = []\n"
+        "r.InMemoryRepository.load_seed = lambda self, path: calls.append(path)\n"
+        "assert 'app' not in vars(app.main)\n"
+        "assert app.main.app is app.main.app\n"
+        "assert len(calls) == 1\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True)
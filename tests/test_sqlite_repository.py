@@ -0,0 +1,192 @@
+import json
+import sqlite3
+import threading
+from datetime import date, datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import Settings
+from app.main import SEED_PATH, create_app
+from app.models import Category, Creative, Publisher, RefreshCheckpoint
+from app.services import AdminService
+from app.sqlite_repository import SqliteRepository
+
+
+def _repository(path) -> SqliteRepository:
+    repository = SqliteRepository(path)
+    repository.upsert_category(Category(id="casino", name="Casino"))
+    repository.upsert_publisher(Publisher(id="pub_a", name="A", category_ids=["casino", "dfs"]))
+    repository.upsert_publisher(Publisher(id="pub_b", name="B", category_ids=["casino"]))
+    repository.upsert_creatives_batch(
+        [
+            Creative(id="c1", publisher_id="pub_a", title="Deposit bonus", platforms=["facebook"]),
+            Creative(id="c2", publisher_id="pub_b", title="Free spins", platforms=["instagram"]),
+            Creative(
+                id="c3",
+                publisher_id="pub_a",
+                body="Deposit match",
+                platforms=["instagram"],
+                start_time=datetime(2024, 1, 1, tzinfo=timezone.utc),
+            ),
+        ]
+    )
+    return repository
+
+
+def test_sqlite_repository_matches_in_memory_behaviour(tmp_path):
+    repository = _repository(tmp_path / "ads.sqlite3")
+
+    assert [p.id for p in repository.list_publishers_by_category("casino")] == ["pub_a", "pub_b"]
+    assert repository.category_counts("casino") == (2, 3)
+    assert [c.id for c in repository.list_creatives_by_category("dfs")] == ["c1", "c3"]
+    assert repository.list_creatives_for_publishers(["pub_a"])[1].start_time == datetime(
+        2024, 1, 1, tzinfo=timezone.utc
+    )
+
+    page, after = repository.page_creatives_for_category("casino", limit=2)
+    assert [c.id for c in page] == ["c1", "c2"] and after == "c2"
+    page, _ = repository.page_creatives_for_category("casino", limit=10, platform="instagram")
+    assert [c.id for c in page] == ["c2", "c3"]
+
+    creatives, total = repository.search_creatives("casino", "depo", limit=10)
+    assert {c.id for c in creatives} == {"c1", "c3"} and total == 2
+    encoded, total = repository.search_creative_json("casino", "depo", limit=10)
+    assert encoded == [c.model_dump_json().encode() for c in creatives] and total == 2
+    encoded, after = repository.page_creative_json_for_category("casino", limit=2)
+    assert [json.loads(item)["id"] for item in encoded] == ["c1", "c2"] and after == "c2"
+
+    version = repository.summary_version
+    AdminService(repository).update_publisher("pub_a", category_ids=["dfs"])
+    assert repository.summary_version > version
+    assert repository.category_counts("casino") == (1, 1)
+    repository.archive_publisher("pub_b")
+    assert repository.list_publishers_by_category("casino") == []
+
+    repository.upsert_creative(Creative(id="c2", publisher_id="pub_a", title="Moved", platforms=[]))
+    assert [c.id for c in repository.list_creatives_for_publishers(["pub_a"])] == ["c1", "c2", "c3"]
+    page, _ = repository.page_creatives_for_category("dfs", limit=10, platform="instagram")
+    assert [c.id for c in page] == ["c3"]
+
+
+def test_sqlite_repository_persists_and_reads_from_threads(tmp_path):
+    path = tmp_path / "ads.sqlite3"
+    _repository(path).close()
+
+    reopened = SqliteRepository(path, seed_path=SEED_PATH)
+    # Existing databases are not re-seeded.
+    assert [c.id for c in reopened.list_categories()] == ["casino"]
+
+    results = []
+
+    def read():
+        results.append(len(reopened.list_creatives_by_category("casino")))
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [3, 3, 3, 3]
+
+    # Closing reaches the connections the reading threads opened.
+    readers = list(reopened._readers)
+    assert len(readers) == 5
+    reopened.close()
+    for connection in readers:
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute("SELECT 1")
+
+
+def test_app_uses_sqlite_backend_from_settings(tmp_path):
+    settings = Settings(repository_backend="sqlite", sqlite_path=str(tmp_path / "app.sqlite3"))
+    client = TestClient(create_app(settings))
+    created = client.post("/api/admin/publishers", json={"name": "Durable", "category_ids": ["dfs"]})
+    assert created.status_code == 201
+
+    restarted = TestClient(create_app(settings))
+    publishers = restarted.get("/api/categories/dfs/publishers").json()
+    assert "Durable" in {publisher["name"] for publisher in publishers}
+    assert restarted.get("/api/categories/online_casino/ads").json()[0]["publisher_id"] == "pub_0001"
+
+
+def test_sqlite_batch_upsert_detects_changes_and_removals(tmp_path):
+    repository = _repository(tmp_path / "ads.sqlite3")
+    ended_at = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    unchanged = repository.list_creatives_for_publishers(["pub_a"])[0]
+    before_batch = datetime.now(timezone.utc)
+
+    summary = repository.upsert_creatives_batch(
+        [unchanged, Creative(id="c4", publisher_id="pub_a", title="Jackpot")],
+        publisher_ids=["pub_a"],
+        now=ended_at,
+    )
+    assert (summary.inserted, summary.updated, summary.ended, summary.unchanged) == (["c4"], [], ["c3"], 1)
+    ended = {c.id: c.end_time for c in repository.list_creatives_for_publishers(["pub_a"])}
+    assert ended == {"c1": None, "c3": ended_at, "c4": None}
+    assert repository.search_creatives("casino", "jackpot", limit=5)[1] == 1
+    changed, _ = repository.page_creatives_for_category("casino", limit=10, changed_since=before_batch)
+    assert [c.id for c in changed] == ["c3", "c4"]
+
+
+def test_sqlite_refresh_checkpoints_survive_reopening(tmp_path):
+    path = tmp_path / "ads.sqlite3"
+    repository = _repository(path)
+    swept_at = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+    repository.save_refresh_checkpoints(
+        [
+            RefreshCheckpoint(publisher_id="pub_a", country="US", ad_type="ALL", cursor="abc"),
+            RefreshCheckpoint(
+                publisher_id="pub_b",
+                country="GB",
+                ad_type="ALL",
+                delivery_date_min=date(2024, 4, 30),
+                full_sweep_at=swept_at,
+            ),
+        ]
+    )
+    repository.save_refresh_checkpoints(
+        [RefreshCheckpoint(publisher_id="pub_a", country="US", ad_type="ALL", delivery_date_min=date(2024, 5, 1))]
+    )
+    repository.close()
+
+    reopened = SqliteRepository(path)
+    checkpoints = {c.key: c for c in reopened.list_refresh_checkpoints(["pub_a", "pub_b", "pub_c"])}
+    assert checkpoints["pub_a", "US", "ALL"].cursor is None
+    assert checkpoints["pub_a", "US", "ALL"].delivery_date_min == date(2024, 5, 1)
+    assert checkpoints["pub_b", "GB", "ALL"].full_sweep_at.replace(tzinfo=timezone.utc) == swept_at
+    reopened.close()
+
+
+def test_sqlite_category_counts_are_kept_by_triggers(tmp_path):
+    path = tmp_path / "ads.sqlite3"
+    repository = _repository(path)
+
+    def recount(category_id):
+        publishers = [p.id for p in repository.list_publishers_by_category(category_id)]
+        return len(publishers), len(repository.list_creatives_for_publishers(publishers))
+
+    version = repository.summary_version
+    # Creatives of publishers outside any category leave summaries alone.
+    repository.upsert_publisher(Publisher(id="pub_c", name="C"))
+    repository.upsert_creatives_batch(Creative(id=f"x{index}", publisher_id="pub_c") for index in range(3))
+    repository.upsert_creative(Creative(id="c1", publisher_id="pub_a", title="Edited"))
+    assert repository.summary_version == version
+
+    repository.upsert_creative(Creative(id="c4", publisher_id="pub_b"))
+    repository.upsert_publisher(Publisher(id="pub_c", name="C", category_ids=["dfs"]))
+    repository.archive_publisher("pub_a")
+    repository.upsert_creative(Creative(id="c2", publisher_id="pub_c"))
+    assert repository.summary_version > version
+    assert [recount(category) for category in ("casino", "dfs")] == [(1, 1), (1, 4)]
+    assert [repository.category_counts(category) for category in ("casino", "dfs", "missing")] == [
+        (1, 1),
+        (1, 4),
+        (0, 0),
+    ]
+
+    # Databases from before the table existed are backfilled on open.
+    repository._writer.execute("DELETE FROM category_counts")
+    repository._writer.execute("DELETE FROM meta WHERE key = 'category_counts'")
+    repository.close()
+    assert SqliteRepository(path).category_counts("dfs") == (1, 4)